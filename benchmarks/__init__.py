@@ -0,0 +1,30 @@
+"""Benchmarks, run from project root with e.g. `python -m benchmarks.client_download_memory`.
+"""
+import contextlib
+import os
+import shutil
+import tempfile
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'precioussecret.settings')
+    import django
+    django.setup()
+
+
+@contextlib.contextmanager
+def test_environment():
+    """Runs benchmark against a fresh test database and a temporary media directory.
+    """
+    from django.db import connection
+    from django.test.utils import override_settings
+
+    media_root = tempfile.mkdtemp()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        with override_settings(MEDIA_ROOT=media_root):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(media_root, ignore_errors=True)
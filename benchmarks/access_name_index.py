@@ -0,0 +1,85 @@
+"""Size of the unique index of access names and latency of looking secrets up by them.
+Compares the unique index of the previous string column, kept as `legacy_access_name`, with the one of the
+UUID column of `access_name`.
+Number of secrets can be given as argument, e.g. `python -m benchmarks.access_name_index 3000000`.
+"""
+import random
+import sys
+import time
+
+from benchmarks import setup_django
+from benchmarks import test_environment
+
+setup_django()
+
+from django.db import connection  # noqa: E402
+
+from precioussecret.service.models import Resource  # noqa: E402
+from precioussecret.service.models import Secret  # noqa: E402
+
+ROWS = 2000000
+BATCH_SIZE = 10000
+LOOKUPS = 10000
+
+
+def create_secrets(rows):
+    resource = Resource.objects.create(url='https://www.google.com/')
+    for start in range(0, rows, BATCH_SIZE):
+        Secret.objects.bulk_create([Secret(resource=resource) for _ in range(min(BATCH_SIZE, rows - start))])
+
+
+def index_size(column):
+    """Returns size in bytes of the unique index of `column` of secrets, or None if it cannot be measured.
+    Fails when the column has no unique index, its lookups would measure a table scan instead.
+    """
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, Secret._meta.db_table)
+        names = [
+            name for name, constraint in constraints.items()
+            if constraint['columns'] == [column] and constraint['unique']
+        ]
+        if connection.vendor == 'sqlite':  # implicit indexes of UNIQUE columns are not introspected
+            cursor.execute('PRAGMA index_list({0})'.format(Secret._meta.db_table))
+            for name in [row[1] for row in cursor.fetchall() if row[2]]:
+                cursor.execute('PRAGMA index_info({0})'.format(connection.ops.quote_name(name)))
+                if [row[2] for row in cursor.fetchall()] == [column] and name not in names:
+                    names.append(name)
+        if not names:
+            raise RuntimeError('Column {0} has no unique index'.format(column))
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT SUM(pg_relation_size(c.oid)) FROM pg_class c WHERE c.relname = ANY(%s)', [names])
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                'SELECT SUM(pgsize) FROM dbstat WHERE name IN ({0})'.format(', '.join(['%s'] * len(names))), names
+            )
+        else:
+            return None
+        return cursor.fetchone()[0]
+
+
+def lookup_latency(field, access_names):
+    secrets = Secret.objects.values_list('pk', flat=True)
+    start = time.perf_counter()
+    for access_name in access_names:
+        assert secrets.get(**{field: access_name})
+    return (time.perf_counter() - start) / len(access_names)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    with test_environment():
+        create_secrets(rows)
+        access_names = random.sample(list(Secret.objects.values_list('access_name', flat=True)), min(LOOKUPS, rows))
+        print('{0} secrets on {1}'.format(rows, connection.vendor))
+        print('{0:>20} {1:>12} {2:>12}'.format('column', 'index MB', 'lookup us'))
+        for field, column in [('legacy_access_name', 'access_name'), ('access_name', 'access_uuid')]:
+            size = index_size(column)
+            print('{0:>20} {1:>12} {2:>12.1f}'.format(
+                column,
+                '{0:.1f}'.format(size / 2 ** 20) if size is not None else 'n/a',
+                lookup_latency(field, access_names) * 1e6,
+            ))
+
+
+if __name__ == '__main__':
+    main()
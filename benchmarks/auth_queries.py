@@ -0,0 +1,45 @@
+"""Database queries per request of an endpoint authenticated with an API token.
+Compares DRF `TokenAuthentication` with `CachedTokenAuthentication`.
+"""
+from benchmarks import setup_django
+from benchmarks import test_environment
+
+setup_django()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+
+from rest_framework.authentication import TokenAuthentication  # noqa: E402
+from rest_framework.authtoken.models import Token  # noqa: E402
+
+from precioussecret.service.authentication import CachedTokenAuthentication  # noqa: E402
+from precioussecret.service.views import StatisticsView  # noqa: E402
+
+REQUESTS = 100
+
+
+def queries_per_request(authentication_class, key):
+    view = StatisticsView.as_view(authentication_classes=[authentication_class])
+    factory = RequestFactory()
+    with CaptureQueriesContext(connection) as queries:
+        for _ in range(REQUESTS):
+            response = view(factory.get('N/A', HTTP_AUTHORIZATION='Token {0}'.format(key)))
+            assert response.status_code == 200, response.status_code
+    return len(queries) / REQUESTS
+
+
+def main():
+    cache = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    with test_environment(), override_settings(CACHES=cache, AUTH_TOKEN_CACHE='default'):
+        user = User.objects.create_user(username='benchmark')
+        key = Token.objects.create(user=user).key
+        print('{0:>28} {1:>8}'.format('authentication', 'queries'))
+        for authentication_class in [TokenAuthentication, CachedTokenAuthentication]:
+            print('{0:>28} {1:>8.2f}'.format(authentication_class.__name__, queries_per_request(authentication_class, key)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Peak Python memory of downloading a file secret through the web client.
+Compares the streamed response with the previous base64 round trip that kept the whole file in memory.
+"""
+import base64
+import io
+import os
+import tracemalloc
+
+from benchmarks import setup_django
+from benchmarks import test_environment
+
+setup_django()
+
+from django.core.files.base import ContentFile  # noqa: E402
+from django.http import HttpResponse  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+from django.urls import resolve  # noqa: E402
+
+from precioussecret.client.views import AccessSecretView  # noqa: E402
+from precioussecret.service.models import Resource  # noqa: E402
+from precioussecret.service.models import Secret  # noqa: E402
+
+SIZES_MB = [1, 8, 32]
+
+
+def create_secret(size):
+    return Secret.objects.create(
+        resource=Resource.objects.create(file=ContentFile(b'\0' * size, name='benchmark.txt'))
+    )
+
+
+def download_streamed(secret):
+    """Accesses the secret and follows the redirect to the download with token, as browsers do.
+    """
+    factory = RequestFactory()
+    request = factory.post('N/A', data={'access_code': secret.access_code})
+    response = AccessSecretView.as_view()(request, access_name=secret.access_name)
+    assert response.status_code == 303, response.status_code
+    request = factory.get(response.url)
+    match = resolve(request.path_info)
+    response = match.func(request, *match.args, **match.kwargs)
+    assert response.status_code == 200, response.status_code
+    for _ in response.streaming_content:
+        pass
+    response.close()
+
+
+def download_legacy(secret):
+    """Previous implementation: base64 in service response, decoded and buffered by the client.
+    """
+    encoded = base64.b64encode(secret.resource.file.open('rb').read()).decode('utf-8')
+    decoded = base64.b64decode(encoded)
+    HttpResponse(io.BytesIO(decoded).read(), content_type='text/plain')
+
+
+def peak_memory(function, *args):
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    with test_environment():
+        print('{0:>8} {1:>14} {2:>14}'.format('size', 'legacy peak', 'streamed peak'))
+        for size_mb in SIZES_MB:
+            secret = create_secret(size_mb * 1024 * 1024)
+            streamed = peak_memory(download_streamed, secret)
+            Secret.objects.filter(pk=secret.pk).update(number_of_accesses=0)
+            legacy = peak_memory(download_legacy, secret)
+            os.remove(secret.resource.file.path)
+            print('{0:>6}MB {1:>12.1f}MB {2:>12.2f}MB'.format(size_mb, legacy / 2 ** 20, streamed / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,351 @@
+import base64
+import collections
+import logging
+import threading
+import time
+
+from urllib.parse import parse_qs
+from urllib.parse import urljoin
+from urllib.parse import urlsplit
+
+import requests
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django.urls import reverse
+from django.utils.module_loading import import_string
+from django.utils.translation import ugettext as _
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.views import exception_handler
+
+from precioussecret.service import api
+from precioussecret.service.authentication import get_user_token_key
+from precioussecret.service.responses import accepts_gzip
+from precioussecret.service.storage import is_compressed
+from precioussecret.service.throttles import client_ip
+from precioussecret.service.tokens import make_download_token
+
+logger = logging.getLogger(__name__)
+
+SecretResource = collections.namedtuple(
+    'SecretResource',
+    ['url', 'file', 'content_type', 'size', 'content_encoding', 'content_range', 'etag', 'download_token'],
+    defaults=[None] * 8,
+)
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def get_secret_service():
+    """Returns service backend configured with SECRET_SERVICE_BACKEND setting.
+    """
+    return import_string(settings.SECRET_SERVICE_BACKEND)()
+
+
+def get_http_client():
+    """Returns process-wide HTTP client configured with SECRET_SERVICE_HTTP setting.
+    """
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            options = settings.SECRET_SERVICE_HTTP
+            _http_client = ServiceHTTPClient(
+                pool_size=options.get('POOL_SIZE', 10),
+                connect_timeout=options.get('CONNECT_TIMEOUT', 3.05),
+                read_timeout=options.get('READ_TIMEOUT', 30),
+                retries=options.get('RETRIES', 2),
+            )
+        return _http_client
+
+
+class ServiceHTTPClient:
+    """HTTP client keeping a pool of keep-alive connections to the service.
+    Requests are retried on connection errors, only idempotent ones also on read errors and 502-504 responses.
+    """
+    idempotent_methods = frozenset(['HEAD', 'GET', 'OPTIONS'])
+
+    def __init__(self, pool_size=10, connect_timeout=3.05, read_timeout=30, retries=2):
+        try:
+            retry = Retry(
+                total=retries, backoff_factor=0.1, status_forcelist=[502, 503, 504], raise_on_status=False,
+                allowed_methods=self.idempotent_methods,
+            )
+        except TypeError:  # urllib3 < 1.26
+            retry = Retry(
+                total=retries, backoff_factor=0.1, status_forcelist=[502, 503, 504], raise_on_status=False,
+                method_whitelist=self.idempotent_methods,
+            )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.timeout = (connect_timeout, read_timeout)
+
+    def request(self, method, url, **kwargs):
+        """Sends request and logs its latency.
+        """
+        start = time.monotonic()
+        status_code = None
+        try:
+            response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            status_code = response.status_code
+            return response
+        finally:
+            logger.info('%s %s %s %.1fms', method, url, status_code, (time.monotonic() - start) * 1000)
+
+
+class ResponseFile:
+    """Read-only file-like view of streamed HTTP response body.
+    """
+
+    def __init__(self, response, decode_content=True):
+        self.response = response
+        self.response.raw.decode_content = decode_content
+
+    def read(self, size=-1):
+        return self.response.raw.read(None if size < 0 else size)
+
+    def close(self):
+        self.response.close()
+
+
+class LocalSecretService:
+    """Calls service layer in the same process.
+    """
+
+    def add_secret(self, request, resource_dict):
+        """Adds secret and returns tuple with secret access data.
+        """
+        try:
+            secret = api.add_secret({'resource': resource_dict})
+        except (APIException, Http404) as e:
+            raise ValidationError(
+                _('Unable to add secret: %(value)s'),
+                code='api-secret-not-created',
+                params={'value': self.__render_error(e)},
+            )
+        return secret.access_name, secret.access_code
+
+    def access_secret(self, request, access_name, access_code):
+        """Registers access to secret and returns its resource.
+        """
+        try:
+            secret = api.access_secret(access_name, {'access_code': access_code}, client_ip=client_ip(request))
+        except (APIException, Http404) as e:
+            raise ValidationError(
+                _('Unable to access secret: %(value)s'),
+                code='api-secret-not-accessible',
+                params={'value': self.__render_error(e)},
+            )
+
+        resource = secret.resource
+        if resource.file:
+            return SecretResource(
+                content_type=resource.get_content_type(),
+                size=resource.get_size(),
+                download_token=make_download_token(secret.access_name),
+            )
+        return SecretResource(url=resource.url)
+
+    def download_secret(self, request, access_name, token):
+        """Returns file of accessed secret, `token` is the download token returned on access.
+        """
+        try:
+            secret = api.download_secret(access_name, token)
+        except (APIException, Http404) as e:
+            raise ValidationError(
+                _('Unable to download secret: %(value)s'),
+                code='api-secret-not-downloadable',
+                params={'value': self.__render_error(e)},
+            )
+
+        resource = secret.resource
+        file = resource.file
+        if is_compressed(file.name) and accepts_gzip(request) and 'HTTP_RANGE' not in request.META:
+            return SecretResource(
+                file=file.storage.open_compressed(file.name),
+                content_type=resource.get_content_type(),
+                size=file.storage.size(file.name),
+                content_encoding='gzip',
+            )
+        return SecretResource(
+            file=file.storage.open(file.name),
+            content_type=resource.get_content_type(),
+            size=resource.get_size(),
+            etag='"{0}"'.format(resource.sha256) if resource.sha256 else None,
+        )
+
+    def __render_error(self, exception):
+        """Returns error the same way REST API renders it.
+        """
+        return JSONRenderer().render(exception_handler(exception, {}).data).decode('utf-8')
+
+
+class RemoteSecretService:
+    """Calls REST API over HTTP, SECRET_SERVICE_URL points to it or to the current host when not set.
+    """
+
+    def add_secret(self, request, resource_dict):
+        """Send request to API and returns tuple with secret access data.
+        """
+        uploaded_file = resource_dict.get('file')
+        if uploaded_file:
+            try:
+                resource_dict = dict(resource_dict, file=base64.b64encode(uploaded_file.read()).decode('utf-8'))
+            except ValueError:
+                raise ValidationError(
+                    _('Uploaded file is corrupted'),
+                    code='corrupted-uploaded-file',
+                )
+
+        user_token = get_user_token_key(request.user)
+        response = self.__request(
+            'POST',
+            self.__build_url(request, reverse('service:add-secret-endpoint')),
+            json={
+                'resource': resource_dict
+            },
+            headers={
+                'Content-type': 'application/json',
+                'Authorization': 'Token {token}'.format(token=user_token)
+            },
+            error=_('Unable to add secret: %(value)s'),
+        )
+        if response.status_code != status.HTTP_201_CREATED:
+            raise ValidationError(
+                _('Unable to add secret: %(value)s'),
+                code='api-secret-not-created',
+                params={'value': response.text},
+            )
+
+        access_name = response.json().get('access_name')
+        access_code = response.json().get('access_code')
+        if not all([access_name, access_code]):
+            raise ValidationError(
+                _('Unable to fetch secret access data'),
+                code='api-missing-access-data'
+            )
+        return access_name, access_code
+
+    def access_secret(self, request, access_name, access_code):
+        """Send request to API and returns secret resource.
+        """
+        response = self.__request(
+            'PUT',
+            self.__build_url(request, reverse('service:access-secret-endpoint', kwargs={'access_name': access_name})),
+            json={
+                'access_code': access_code
+            },
+            headers=self.__client_headers(request, {
+                'Content-type': 'application/json',
+                'Accept': 'application/octet-stream',
+            }),
+            stream=True,
+            error=_('Unable to access secret: %(value)s'),
+        )
+        content_type = response.headers.get('Content-Type', '')
+        if response.status_code == status.HTTP_200_OK and not content_type.startswith('application/json'):
+            token = parse_qs(urlsplit(response.headers.get('Content-Location', '')).query).get('token')
+            if token:
+                response.close()  # file is downloaded with the token
+                size = response.headers.get('Content-Length')
+                return SecretResource(
+                    content_type=content_type,
+                    size=int(size) if size and 'Content-Encoding' not in response.headers else None,
+                    download_token=token[0],
+                )
+            return self.__file_resource(request, response)
+
+        if response.status_code != status.HTTP_200_OK:
+            raise ValidationError(
+                _('Unable to access secret: %(value)s'),
+                code='api-secret-not-accessible',
+                params={'value': response.text},
+            )
+
+        secret_data = response.json()
+        if not secret_data:
+            raise ValidationError(
+                _('Unable to fetch secret data'),
+                code='api-missing-secret-data'
+            )
+
+        resource = secret_data.get('resource') or {}
+        return SecretResource(url=resource.get('url'))
+
+    def download_secret(self, request, access_name, token):
+        """Send request to API and returns secret file or its range requested by `request`.
+        """
+        headers = {'Accept': 'application/octet-stream'}
+        for header in ['Range', 'If-Range']:
+            value = request.META.get('HTTP_{0}'.format(header.upper().replace('-', '_')))
+            if value:
+                headers[header] = value
+        response = self.__request(
+            'GET',
+            self.__build_url(request, reverse('service:download-secret-endpoint', kwargs={'access_name': access_name})),
+            params={'token': token},
+            headers=headers,
+            stream=True,
+            error=_('Unable to download secret: %(value)s'),
+        )
+        if response.status_code == status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE:
+            response.close()
+            return SecretResource(content_range=response.headers.get('Content-Range'))
+        if response.status_code not in [status.HTTP_200_OK, status.HTTP_206_PARTIAL_CONTENT]:
+            raise ValidationError(
+                _('Unable to download secret: %(value)s'),
+                code='api-secret-not-downloadable',
+                params={'value': response.text},
+            )
+        return self.__file_resource(request, response)
+
+    def __file_resource(self, request, response):
+        """Returns resource streaming file from response, still compressed if `request` accepts it.
+        """
+        content_encoding = response.headers.get('Content-Encoding')
+        resource = SecretResource(
+            content_type=response.headers.get('Content-Type'),
+            content_range=response.headers.get('Content-Range'),
+            etag=response.headers.get('ETag'),
+        )
+        if content_encoding and not (content_encoding == 'gzip' and accepts_gzip(request)):
+            return resource._replace(file=ResponseFile(response))
+        size = response.headers.get('Content-Length')
+        return resource._replace(
+            file=ResponseFile(response, decode_content=False),
+            size=int(size) if size else None,
+            content_encoding=content_encoding,
+        )
+
+    def __client_headers(self, request, headers):
+        """Returns `headers` with address of the user, trusted by service when sent with SECRET_SERVICE_TOKEN.
+        Without the token, failed accesses of all users are counted for the address of this host.
+        """
+        if not settings.SECRET_SERVICE_TOKEN:
+            return headers
+        return dict(headers, **{
+            'Authorization': 'Token {token}'.format(token=settings.SECRET_SERVICE_TOKEN),
+            'X-Client-IP': client_ip(request),
+        })
+
+    def __request(self, method, url, error, **kwargs):
+        """Sends request with shared HTTP client, raises `error` when service is not reachable.
+        """
+        try:
+            return get_http_client().request(method, url, **kwargs)
+        except requests.RequestException as e:
+            raise ValidationError(error, code='api-unavailable', params={'value': e})
+
+    def __build_url(self, request, path):
+        if settings.SECRET_SERVICE_URL:
+            return urljoin(settings.SECRET_SERVICE_URL, path)
+        return request.build_absolute_uri(path)
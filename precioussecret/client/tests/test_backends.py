@@ -0,0 +1,192 @@
+import gzip
+import json
+import threading
+import uuid
+
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.test import LiveServerTestCase
+from django.test import RequestFactory
+from django.test import TestCase
+from django.test import override_settings
+
+from rest_framework.authtoken.models import Token
+
+from precioussecret.client.backends import RemoteSecretService
+from precioussecret.service.models import Resource
+from precioussecret.service.models import Secret
+
+
+class ServiceStub(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    connections = 0
+    responses = []
+    requests = []
+
+    def setup(self):
+        ServiceStub.connections += 1
+        super(ServiceStub, self).setup()
+
+    def do_PUT(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.requests.append((self.command, self.path, self.headers))
+        status_code, body, *headers = self.responses.pop(0)
+        self.send_response(status_code)
+        self.send_header('Content-Type', headers[0] if headers else 'application/json')
+        if len(headers) > 1 and headers[1]:
+            self.send_header('Content-Encoding', headers[1])
+        for name, value in (headers[2] if len(headers) > 2 else {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_POST = do_PUT
+    do_GET = do_PUT
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RemoteSecretServiceTest(TestCase):
+    """Test module for calling service over HTTP.
+    """
+
+    def setUp(self):
+        ServiceStub.connections = 0
+        ServiceStub.requests = []
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), ServiceStub)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.settings_override = override_settings(
+            SECRET_SERVICE_URL='http://127.0.0.1:{0}/'.format(self.server.server_port)
+        )
+        self.settings_override.enable()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username='gollum', password='myprecioussss')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connections_are_reused(self):
+        ServiceStub.responses = [
+            (200, json.dumps({'resource': {'url': 'https://www.google.com/'}}).encode()),
+            (201, json.dumps({'access_name': 'sa-mp-le', 'access_code': 'SAMPLE'}).encode()),
+            (400, json.dumps(['Wrong access code']).encode()),
+        ]
+        service = RemoteSecretService()
+        request = self.factory.post('N/A')
+        request.user = self.user
+
+        resource = service.access_secret(request, 'sa-mp-le', 'SAMPLE')
+        self.assertEqual('https://www.google.com/', resource.url)
+        self.assertEqual(('sa-mp-le', 'SAMPLE'), service.add_secret(request, {'url': 'https://www.google.com/'}))
+        with self.assertRaisesMessage(ValidationError, 'Unable to access secret: ["Wrong access code"]'):
+            service.access_secret(request, 'sa-mp-le', 'WRONGS')
+        self.assertEqual(1, ServiceStub.connections)
+
+    def test_service_unavailable(self):
+        self.server.shutdown()
+        self.server.server_close()
+        request = self.factory.post('N/A')
+        with self.assertLogs('precioussecret.client.backends', level='INFO'):
+            with self.assertRaisesMessage(ValidationError, 'Unable to access secret'):
+                RemoteSecretService().access_secret(request, 'sa-mp-le', 'SAMPLE')
+
+    def test_file_is_streamed(self):
+        ServiceStub.responses = [(200, b'my precious' * 1000, 'text/plain')]
+        request = self.factory.post('N/A')
+        resource = RemoteSecretService().access_secret(request, 'sa-mp-le', 'SAMPLE')
+        self.assertEqual('text/plain', resource.content_type)
+        self.assertEqual(11000, resource.size)
+        self.assertEqual(b'my precious', resource.file.read(11))
+        self.assertEqual(b'my precious' * 999, resource.file.read())
+        resource.file.close()
+
+    def test_compressed_file_is_passed_through(self):
+        ServiceStub.responses = [(200, gzip.compress(b'my precious' * 1000), 'text/plain', 'gzip')] * 2
+        request = self.factory.post('N/A', HTTP_ACCEPT_ENCODING='gzip')
+        resource = RemoteSecretService().access_secret(request, 'sa-mp-le', 'SAMPLE')
+        self.assertEqual('gzip', resource.content_encoding)
+        self.assertEqual(b'my precious' * 1000, gzip.decompress(resource.file.read()))
+        resource.file.close()
+
+        request = self.factory.post('N/A')
+        resource = RemoteSecretService().access_secret(request, 'sa-mp-le', 'SAMPLE')
+        self.assertIsNone(resource.content_encoding)
+        self.assertIsNone(resource.size)
+        self.assertEqual(b'my precious' * 1000, resource.file.read())
+        resource.file.close()
+
+    def test_file_is_downloaded_with_token(self):
+        ServiceStub.responses = [
+            (200, b'my precious', 'text/plain', None, {'Content-Location': '/api/secret/sa-mp-le/download/?token=a%3Ab'}),
+            (206, b'precious', 'text/plain', None, {'Content-Range': 'bytes 3-10/11'}),
+            (416, b'', 'text/plain', None, {'Content-Range': 'bytes */11'}),
+        ]
+        request = self.factory.post('N/A')
+        resource = RemoteSecretService().access_secret(request, 'sa-mp-le', 'SAMPLE')
+        self.assertEqual('a:b', resource.download_token)
+        self.assertIsNone(resource.file)
+
+        request = self.factory.get('N/A', HTTP_RANGE='bytes=3-')
+        resource = RemoteSecretService().download_secret(request, 'sa-mp-le', 'a:b')
+        self.assertEqual('bytes 3-10/11', resource.content_range)
+        self.assertEqual(b'precious', resource.file.read())
+        resource.file.close()
+        method, path, headers = ServiceStub.requests[1]
+        self.assertEqual(('GET', '/api/secret/sa-mp-le/download/?token=a%3Ab'), (method, path))
+        self.assertEqual('bytes=3-', headers['Range'])
+
+        request = self.factory.get('N/A', HTTP_RANGE='bytes=11-')
+        resource = RemoteSecretService().download_secret(request, 'sa-mp-le', 'a:b')
+        self.assertIsNone(resource.file)
+        self.assertEqual('bytes */11', resource.content_range)
+
+
+@override_settings(
+    SECRET_LOOKUP_CACHE=None,
+    ACCESS_FILTER_CACHE=None,
+    ACCESS_THROTTLE_CACHE='default',
+    ACCESS_THROTTLE_IP_LIMIT=3,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class RemoteSecretServiceThrottleTest(LiveServerTestCase):
+    """Test module for throttling accesses of web client users over HTTP.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.secret = Secret.objects.create(
+            resource=Resource.objects.create(
+                url='https://www.google.com/'
+            )
+        )
+        token = Token.objects.create(user=User.objects.create_user(username='client'))
+        self.settings_override = override_settings(
+            SECRET_SERVICE_URL=self.live_server_url,
+            SECRET_SERVICE_TOKEN=token.key,
+        )
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+
+    def __access(self, ip, access_name=None):
+        request = self.factory.post('N/A', REMOTE_ADDR=ip)
+        access_name = access_name or self.secret.access_name
+        return RemoteSecretService().access_secret(request, access_name, self.secret.access_code)
+
+    def test_users_are_throttled_by_own_address(self):
+        for _ in range(3):
+            with self.assertRaisesMessage(ValidationError, 'Not found'):
+                self.__access('1.1.1.1', access_name=str(uuid.uuid4()))
+        with self.assertRaisesMessage(ValidationError, 'Too many failed attempts'):
+            self.__access('1.1.1.1')
+        self.assertEqual('https://www.google.com/', self.__access('2.2.2.2').url)
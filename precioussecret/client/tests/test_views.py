@@ -1,13 +1,29 @@
+import gzip
+import shutil
+import tempfile
+
+from urllib.parse import parse_qs
+from urllib.parse import urlsplit
+
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.auth.models import User
 from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.files.base import ContentFile
+from django.http import Http404
 from django.test import RequestFactory
 from django.test import TestCase
+from django.test import override_settings
+from django.urls import reverse
 
 from rest_framework import status
 
+from precioussecret.client.views import AccessSecretView
 from precioussecret.client.views import AddSecretView
+from precioussecret.client.views import DownloadSecretView
 from precioussecret.client.views import SecretDetailsView
+from precioussecret.service.models import Resource
+from precioussecret.service.models import Secret
 
 
 class AddSecretViewTest(TestCase):
@@ -34,6 +50,118 @@ class AddSecretViewTest(TestCase):
         response = AddSecretView.as_view()(request)
         self.assertEqual(status.HTTP_200_OK, response.status_code)
 
+    def test_post_url_secret(self):
+        request = self.factory.post("N/A", data={'url': 'https://www.google.com/'})
+        request.user = self.user
+        SessionMiddleware().process_request(request)
+        response = AddSecretView.as_view()(request)
+        self.assertEqual(status.HTTP_302_FOUND, response.status_code)
+        secret = Secret.objects.get(access_name=request.session['access_name'])
+        self.assertEqual(secret.access_code, request.session['access_code'])
+        self.assertEqual('https://www.google.com/', secret.resource.url)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class AccessSecretViewTest(TestCase):
+    """Test module for access secret view.
+    """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def test_post_url_secret(self):
+        secret = Secret.objects.create(
+            resource=Resource.objects.create(
+                url='https://www.google.com/'
+            )
+        )
+        request = self.factory.post("N/A", data={'access_code': secret.access_code})
+        response = AccessSecretView.as_view()(request, access_name=secret.access_name)
+        self.assertEqual(status.HTTP_302_FOUND, response.status_code)
+        self.assertEqual(secret.resource.url, response.url)
+        self.assertEqual(1, Secret.objects.get(pk=secret.pk).number_of_accesses)
+
+    def __download(self, secret, **extra):
+        request = self.factory.post("N/A", data={'access_code': secret.access_code})
+        response = AccessSecretView.as_view()(request, access_name=secret.access_name)
+        self.assertEqual(status.HTTP_303_SEE_OTHER, response.status_code)
+        url = urlsplit(response.url)
+        self.assertEqual(reverse('client:download-secret', kwargs={'access_name': secret.access_name}), url.path)
+        request = self.factory.get(url.path, data=parse_qs(url.query), **extra)
+        return DownloadSecretView.as_view()(request, access_name=secret.access_name)
+
+    def test_post_file_secret(self):
+        secret = Secret.objects.create(
+            resource=Resource.objects.create(
+                file=ContentFile(b'my precious', name='sample.txt')
+            )
+        )
+        response = self.__download(secret)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b'my precious', b''.join(response.streaming_content))
+        self.assertEqual('text/plain', response['Content-Type'])
+        self.assertEqual('11', response['Content-Length'])
+        self.assertEqual('bytes', response['Accept-Ranges'])
+        self.assertIn('{0}.txt'.format(secret.access_name), response['Content-Disposition'])
+        self.assertEqual(1, Secret.objects.get(pk=secret.pk).number_of_accesses)
+
+    def test_download_file_secret_range(self):
+        secret = Secret.objects.create(
+            resource=Resource.objects.create(
+                file=ContentFile(b'my precious', name='sample.txt')
+            )
+        )
+        response = self.__download(secret, HTTP_RANGE='bytes=3-')
+        self.assertEqual(status.HTTP_206_PARTIAL_CONTENT, response.status_code)
+        self.assertEqual('bytes 3-10/11', response['Content-Range'])
+        self.assertEqual(b'precious', b''.join(response.streaming_content))
+
+        response = self.__download(secret, HTTP_RANGE='bytes=11-')
+        self.assertEqual(status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, response.status_code)
+        self.assertEqual('bytes */11', response['Content-Range'])
+        self.assertEqual(2, Secret.objects.get(pk=secret.pk).number_of_accesses)
+
+    def test_download_wrong_token(self):
+        secret = Secret.objects.create(
+            resource=Resource.objects.create(
+                file=ContentFile(b'my precious', name='sample.txt')
+            )
+        )
+        request = self.factory.get("N/A", data={'token': 'SAMPLE'})
+        with self.assertRaises(Http404):
+            DownloadSecretView.as_view()(request, access_name=secret.access_name)
+
+    @override_settings(DEFAULT_FILE_STORAGE='precioussecret.service.storage.CompressedStorage')
+    def test_post_compressed_file_secret(self):
+        content = b'my precious ' * 1000
+        secret = Secret.objects.create(
+            resource=Resource.objects.create(
+                file=ContentFile(content, name='sample.txt')
+            )
+        )
+        response = self.__download(secret, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual('gzip', response['Content-Encoding'])
+        self.assertEqual(content, gzip.decompress(b''.join(response.streaming_content)))
+        self.assertIn('{0}.txt'.format(secret.access_name), response['Content-Disposition'])
+
+    def test_post_wrong_access_code(self):
+        secret = Secret.objects.create(
+            resource=Resource.objects.create(
+                url='https://www.google.com/'
+            )
+        )
+        request = self.factory.post("N/A", data={'access_code': 'SAMPLE'})
+        response = AccessSecretView.as_view()(request, access_name=secret.access_name)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertIn(
+            'Unable to access secret: ["Wrong access code"]',
+            response.context_data['form'].non_field_errors()
+        )
+
 
 class SecretDetailsViewTest(TestCase):
     """Test module for secret details view.
@@ -3,6 +3,7 @@ from django.contrib.auth.decorators import login_required
 
 from precioussecret.client.views import AddSecretView
 from precioussecret.client.views import AccessSecretView
+from precioussecret.client.views import DownloadSecretView
 from precioussecret.client.views import HomeView
 from precioussecret.client.views import LoginView
 from precioussecret.client.views import LogoutView
@@ -17,4 +18,5 @@ urlpatterns = [
     url(r'^add-secret/$', login_required(AddSecretView.as_view()), name='add-secret'),
     url(r'^secret-details/$', SecretDetailsView.as_view(), name='secret-details'),
     url(r'^access-secret/(?P<access_name>[\w-]+)/$', AccessSecretView.as_view(), name='access-secret'),
+    url(r'^access-secret/(?P<access_name>[\w-]+)/download/$', DownloadSecretView.as_view(), name='download-secret'),
 ]
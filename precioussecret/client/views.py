@@ -1,9 +1,6 @@
-import base64
-import io
 import mimetypes
 
-import magic
-import requests
+from urllib.parse import urlencode
 
 from django.contrib.auth import login
 from django.contrib.auth import logout
@@ -14,14 +11,14 @@ from django.http import HttpResponse
 from django.http import HttpResponseForbidden
 from django.http import HttpResponseRedirect
 from django.urls import reverse
+from django.utils.cache import patch_vary_headers
 from django.utils.translation import ugettext as _
 from django.views import generic
 
-from rest_framework import status
-from rest_framework.authtoken.models import Token
-
+from precioussecret.client.backends import get_secret_service
 from precioussecret.client.forms import AddSecretForm
 from precioussecret.client.forms import AccessSecretForm
+from precioussecret.service.responses import file_response
 
 
 class LoginView(generic.FormView):
@@ -61,8 +58,7 @@ class AddSecretView(generic.FormView):
 
         try:
             resource_dict = self.__prepare_resource_dict(form)
-            auth_token, created = Token.objects.get_or_create(user=request.user)
-            access_name, access_code = self.__post_secret_to_api(resource_dict, auth_token)
+            access_name, access_code = get_secret_service().add_secret(request, resource_dict)
         except ValidationError as e:
             form.add_error(field=None, error=e)
             return self.form_invalid(form)
@@ -78,14 +74,7 @@ class AddSecretView(generic.FormView):
 
         uploaded_file = form.files.get('file')
         if uploaded_file:
-            try:
-                file_b64 = base64.b64encode(uploaded_file.file.read()).decode('utf-8')
-            except ValueError:
-                raise ValidationError(
-                    _('Uploaded file is corrupted'),
-                    code='corrupted-uploaded-file',
-                )
-            resource_dict['file'] = file_b64
+            resource_dict['file'] = uploaded_file
 
         uploaded_url = form.data.get('url')
         if uploaded_url:
@@ -105,35 +94,6 @@ class AddSecretView(generic.FormView):
 
         return resource_dict
 
-    def __post_secret_to_api(self, resource_dict, user_token):
-        """Send request to API and returns tuple with secret access data.
-        """
-        response = requests.post(
-            self.request.build_absolute_uri(reverse('service:add-secret-endpoint')),
-            json={
-                'resource': resource_dict
-            },
-            headers={
-                'Content-type': 'application/json',
-                'Authorization': 'Token {token}'.format(token=user_token)
-            }
-        )
-        if response.status_code != status.HTTP_201_CREATED:
-            raise ValidationError(
-                _('Unable to add secret: %(value)s'),
-                code='api-secret-not-created',
-                params={'value': response.text},
-            )
-
-        access_name = response.json().get('access_name')
-        access_code = response.json().get('access_code')
-        if not all([access_name, access_code]):
-            raise ValidationError(
-                _('Unable to fetch secret access data'),
-                code='api-missing-access-data'
-            )
-        return access_name, access_code
-
     def get_success_url(self):
         return reverse('client:secret-details')
 
@@ -166,55 +126,65 @@ class AccessSecretView(generic.FormView):
             return self.form_invalid(form)
 
         try:
-            secret_data = self.__access_secret_via_api(kwargs.get('access_name'), form.data.get('access_code'))
+            resource = get_secret_service().access_secret(
+                request, kwargs.get('access_name'), form.data.get('access_code')
+            )
         except ValidationError as e:
             form.add_error(field=None, error=e)
             return self.form_invalid(form)
 
-        url = secret_data.get('resource').get('url')
-        if url:
-            return HttpResponseRedirect(url)
-
-        file_data = secret_data.get('resource').get('file')
-        if file_data:
-            decoded = base64.b64decode(file_data)
-            file = io.BytesIO(decoded)
-            mime = magic.from_buffer(decoded, mime=True)
-            file_ext = mimetypes.guess_extension(mime)
-            response = HttpResponse(file.read(), content_type=mime)
-            response['Content-Disposition'] = 'inline; filename={}{}'.format(kwargs.get('access_name'), file_ext)
-            return response
+        if resource.url:
+            return HttpResponseRedirect(resource.url)
 
-        raise Http404(_('Cannot access the secret'))
+        if resource.download_token:
+            if resource.file:
+                resource.file.close()
+            return HttpResponseRedirect('{0}?{1}'.format(
+                reverse('client:download-secret', kwargs={'access_name': kwargs.get('access_name')}),
+                urlencode({'token': resource.download_token}),
+            ), status=303)
 
-    def __access_secret_via_api(self, access_name, access_code):
-        """Send request to API and returns secret
-        """
-        response = requests.put(
-            self.request.build_absolute_uri(reverse('service:access-secret-endpoint', kwargs={'access_name': access_name})),
-            json={
-                'access_code': access_code
-            },
-            headers={
-                'Content-type': 'application/json'
-            }
-        )
-        if response.status_code != status.HTTP_200_OK:
-            raise ValidationError(
-                _('Unable to access secret: %(value)s'),
-                code='api-secret-not-accessible',
-                params={'value': response.text},
-            )
+        if resource.file:
+            return secret_file_response(request, resource, kwargs.get('access_name'))
 
-        secret_data = response.json()
-        if not secret_data:
-            raise ValidationError(
-                _('Unable to fetch secret data'),
-                code='api-missing-secret-data'
-            )
-        return secret_data
+        raise Http404(_('Cannot access the secret'))
 
     def get_success_url(self):
         """Return the URL to redirect to after processing a valid form.
         """
         return str(self.success_url)
+
+
+class DownloadSecretView(generic.View):
+    """Streams file of accessed secret, also in byte ranges, while download token from the access is valid.
+    """
+
+    def get(self, request, *args, **kwargs):
+        try:
+            resource = get_secret_service().download_secret(
+                request, kwargs.get('access_name'), request.GET.get('token', '')
+            )
+        except ValidationError:
+            raise Http404(_('Cannot access the secret'))
+
+        if resource.file is None:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = resource.content_range
+            return response
+        return secret_file_response(request, resource, kwargs.get('access_name'))
+
+
+def secret_file_response(request, resource, access_name):
+    """Returns response streaming file of the resource named after the secret.
+    """
+    file_ext = mimetypes.guess_extension(resource.content_type.split(';')[0]) or ''
+    response = file_response(
+        request, resource.file, resource.content_type, '{0}{1}'.format(access_name, file_ext),
+        size=resource.size, content_encoding=resource.content_encoding, etag=resource.etag,
+    )
+    if resource.content_range:  # range was already applied by service
+        response.status_code = 206
+        response['Content-Range'] = resource.content_range
+    if resource.content_encoding:
+        patch_vary_headers(response, ['Accept-Encoding'])
+    return response
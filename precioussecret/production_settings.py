@@ -132,11 +132,12 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'precioussecret.service.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
-    ]
+    ],
+    'NUM_PROXIES': 1,  # heroku router
 }
 
 LOGIN_URL = '/login/'
@@ -148,6 +149,86 @@ VALID_FILE_EXTENSIONS = [
     '.wmv', '.mpg', '.mpeg', '.mp4', '.mp3', '.mpa', '.wav', '.wma', '.wpl'
 ]
 
+# Uploaded files bigger than this are streamed to a temporary file instead of memory
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440
+
+MAX_SECRET_FILE_SIZE = 50 * 1024 * 1024
+
+# Web client calls service in-process, use `RemoteSecretService` when service runs on another host
+SECRET_SERVICE_BACKEND = 'precioussecret.client.backends.LocalSecretService'
+SECRET_SERVICE_URL = None
+SECRET_SERVICE_HTTP = {
+    'POOL_SIZE': 10,
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 30,
+    'RETRIES': 2,
+}
+
+# API token the web client sends with accesses over HTTP, so the service throttles them by address of the web
+# client user forwarded in X-Client-IP instead of address of the web client host, set the same one on both
+SECRET_SERVICE_TOKEN = os.environ.get('SECRET_SERVICE_TOKEN')
+
+# Count secret accesses in cache and apply them with `manage.py flush_access_counters --loop`
+ACCESS_COUNTER_BUFFERED = False
+ACCESS_COUNTER_FLUSH_INTERVAL = 10
+
+# Uploads are stored under one 2-character directory per level, e.g. `ab/cd/abcd1234-....pdf`
+MEDIA_SHARD_DEPTH = 2
+
+# Used by `precioussecret.service.storage.CompressedStorage`, types are matched as prefixes
+MEDIA_COMPRESSED_TYPES = [
+    'text/', 'image/svg+xml', 'image/bmp', 'image/tiff', 'image/x-icon', 'image/vnd.microsoft.icon',
+    'application/rtf', 'application/msword', 'application/vnd.ms-excel', 'application/vnd.ms-powerpoint',
+    'application/postscript', 'audio/x-wav', 'audio/wav',
+]
+MEDIA_COMPRESSION_MIN_RATIO = 1.2
+
+# Seconds a download link given on access of a file secret can be used for range requests
+SECRET_DOWNLOAD_TOKEN_MAX_AGE = 15 * 60
+
+# Let front web server send files from MEDIA_ROOT: None streams them from Python, 'x-accel-redirect' for nginx
+# with internal location FILE_DELIVERY_ACCEL_PREFIX aliased to MEDIA_ROOT (see deploy/nginx.conf) or 'x-sendfile'
+FILE_DELIVERY = None
+FILE_DELIVERY_ACCEL_PREFIX = '/protected-media/'
+
+# Chunks of resumable uploads are assembled here, sessions idle for UPLOAD_SESSION_LIFETIME seconds are removed
+# by `manage.py purge_upload_sessions`, offset of a chunk not finished in UPLOAD_CHUNK_TIMEOUT seconds is released
+UPLOAD_SESSION_ROOT = os.path.join(BASE_DIR, 'uploads')
+UPLOAD_SESSION_LIFETIME = 24 * 60 * 60
+UPLOAD_CHUNK_TIMEOUT = 60 * 60
+
+# Cache of CACHES keeping secrets for the access path, None to always load them from the database
+SECRET_LOOKUP_CACHE = 'default'
+
+# Seconds each process keeps counts of metrics such as cache hits before adding them to `manage.py show_metrics`
+METRICS_FLUSH_INTERVAL = 10
+
+# Bloom filter of access names rejecting unknown ones without database lookup, rebuilt by
+# `manage.py rebuild_access_filter` more often than ACCESS_FILTER_MAX_AGE seconds. None disables it
+ACCESS_FILTER_CACHE = 'default'
+ACCESS_FILTER_CAPACITY = 100000
+ACCESS_FILTER_FALSE_POSITIVE_RATE = 0.01
+ACCESS_FILTER_REFRESH_INTERVAL = 60
+ACCESS_FILTER_MAX_AGE = 24 * 60 * 60
+
+# Failed accesses allowed within ACCESS_THROTTLE_WINDOW seconds per secret and per client address before further
+# ones are rejected, addresses are taken from X-Forwarded-For when NUM_PROXIES of REST_FRAMEWORK is set
+ACCESS_THROTTLE_CACHE = 'default'
+ACCESS_THROTTLE_WINDOW = 15 * 60
+ACCESS_THROTTLE_NAME_LIMIT = 10
+ACCESS_THROTTLE_IP_LIMIT = 100
+
+# API tokens are resolved to users in memory of each process for AUTH_TOKEN_LOCAL_CACHE_TIMEOUT seconds and in
+# AUTH_TOKEN_CACHE for AUTH_TOKEN_CACHE_TIMEOUT seconds, None always reads them from the database
+AUTH_TOKEN_CACHE = 'default'
+AUTH_TOKEN_CACHE_TIMEOUT = 60
+AUTH_TOKEN_LOCAL_CACHE_TIMEOUT = 5
+
+# Secrets accepted by one call of the bulk endpoint, its body is limited by DATA_UPLOAD_MAX_MEMORY_SIZE, and rows
+# inserted by one statement
+SECRET_BULK_MAX_ITEMS = 5000
+SECRET_BULK_BATCH_SIZE = 500
+
 SESSION_COOKIE_SECURE = True
 CSRF_COOKIE_SECURE = True
 SECURE_SSL_REDIRECT = True
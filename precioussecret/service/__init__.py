@@ -0,0 +1 @@
+default_app_config = 'precioussecret.service.apps.ServiceConfig'
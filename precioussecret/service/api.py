@@ -0,0 +1,69 @@
+"""Service layer shared by REST API views and in-process callers such as the web client.
+Functions raise the same exceptions REST API renders, so callers get the same validation and messages.
+"""
+from django.http import Http404
+from django.utils.translation import ugettext as _
+
+from rest_framework.exceptions import PermissionDenied
+
+from precioussecret.service.exceptions import WrongAccessCodeError
+from precioussecret.service.lookups import get_secret
+from precioussecret.service.models import Secret
+from precioussecret.service.models import access_name_uuid
+from precioussecret.service.serializers import AccessSecretSerializer
+from precioussecret.service.serializers import AddSecretSerializer
+from precioussecret.service.throttles import AccessThrottle
+from precioussecret.service.tokens import check_download_token
+
+
+def add_secret(data):
+    """Creates and returns 'Secret' from `data` in format accepted by add secret endpoint.
+    """
+    serializer = AddSecretSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    return serializer.save()
+
+
+def add_secrets(data):
+    """Creates and returns list of 'Secret' from `data`, list of items accepted by add secret endpoint.
+    """
+    serializer = AddSecretSerializer(data=data, many=True)
+    serializer.is_valid(raise_exception=True)
+    return serializer.save()
+
+
+def access_secret(access_name, data, client_ip=None):
+    """Registers access to 'Secret' with `data` in format accepted by access secret endpoint and returns it.
+    Failed attempts are throttled per secret and per `client_ip`, see `precioussecret.service.throttles`.
+    Limits are checked before the lookup, only wrong access codes count per secret, so valid accesses of a
+    popular secret never use up its budget.
+    """
+    access_name = str(access_name_uuid(access_name))
+    throttle = AccessThrottle(access_name, client_ip)
+    throttle.check()
+    try:
+        secret = get_secret(access_name)
+    except Http404:
+        throttle.failed(['ip'])
+        raise
+    serializer = AccessSecretSerializer(secret, data=data)
+    serializer.is_valid(raise_exception=True)
+    try:
+        return serializer.save()
+    except WrongAccessCodeError:
+        throttle.failed()
+        raise
+
+
+def download_secret(access_name, token):
+    """Returns available 'Secret' with file if `token` given on its access is still valid.
+    Downloads are not counted as accesses, so a file can be fetched in many range requests.
+    """
+    access_name = str(access_name_uuid(access_name))
+    if not check_download_token(access_name, token):
+        raise PermissionDenied(_('Download link is invalid or expired'))
+    secrets = Secret.objects.available().select_related('resource')
+    try:
+        return secrets.exclude(resource__file='').exclude(resource__file__isnull=True).get_by_access_name(access_name)
+    except Secret.DoesNotExist:
+        raise Http404('No secret matches the given query.')
@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 
 class ServiceConfig(AppConfig):
-    name = 'service'
+    name = 'precioussecret.service'
+    label = 'service'
+
+    def ready(self):
+        from precioussecret.service import signals  # noqa: F401
@@ -0,0 +1,125 @@
+"""Token authentication resolving tokens through a two-level cache.
+
+Tokens are resolved to users in memory of the process for AUTH_TOKEN_LOCAL_CACHE_TIMEOUT seconds and in
+AUTH_TOKEN_CACHE for AUTH_TOKEN_CACHE_TIMEOUT seconds before the database is asked again. Deleting a token
+or saving its user removes it from the shared cache once committed, see `precioussecret.service.signals`,
+and from memory of the process doing it. Other processes may still accept it for up to the local timeout.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils.translation import ugettext as _
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+KEY_PREFIX = 'auth-token'
+USER_FIELDS = ['is_active', 'is_staff']
+LOCAL_CACHE_SIZE = 1000
+
+_local = {}
+_local_lock = threading.Lock()
+
+
+def token_cache_key(key):
+    return '{0}:{1}'.format(KEY_PREFIX, hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+
+def user_token_cache_key(user_pk):
+    return '{0}:user:{1}'.format(KEY_PREFIX, user_pk)
+
+
+def get_cache():
+    """Returns cache configured with AUTH_TOKEN_CACHE setting or None when tokens are not cached.
+    """
+    return caches[settings.AUTH_TOKEN_CACHE] if settings.AUTH_TOKEN_CACHE else None
+
+
+def _get_local(cache_key):
+    with _local_lock:
+        expires, value = _local.get(cache_key, (0, None))
+    return value if expires > time.monotonic() else None
+
+
+def _set_local(cache_key, value):
+    with _local_lock:
+        if len(_local) >= LOCAL_CACHE_SIZE:
+            _local.clear()
+        _local[cache_key] = (time.monotonic() + settings.AUTH_TOKEN_LOCAL_CACHE_TIMEOUT, value)
+
+
+def get_token(key):
+    """Returns 'Token' with its user, from cache if possible. Raises Token.DoesNotExist if there is none.
+    Users loaded from cache have only primary key and USER_FIELDS set, the rest is deferred, so password
+    hashes are never kept in cache.
+    """
+    cache = get_cache()
+    cache_key = token_cache_key(key)
+    values = _get_local(cache_key) if cache else None
+    if values is None and cache:
+        values = cache.get(cache_key)
+        if values is not None:
+            _set_local(cache_key, values)
+    if values is None:
+        token = Token.objects.select_related('user').get(key=key)
+        if cache:
+            values = {field: getattr(token.user, field) for field in [token.user._meta.pk.attname] + USER_FIELDS}
+            cache.set(cache_key, values, timeout=settings.AUTH_TOKEN_CACHE_TIMEOUT)
+            _set_local(cache_key, values)
+        return token
+
+    User = get_user_model()
+    fields = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+    token = Token.from_db(None, ['key', 'user_id'], [key, values[User._meta.pk.attname]])
+    token.user = User.from_db(None, fields, [values[field] for field in fields])
+    return token
+
+
+def get_user_token_key(user):
+    """Returns key of API token of `user`, creating the token when the user has none.
+    """
+    cache = get_cache()
+    cache_key = user_token_cache_key(user.pk)
+    key = _get_local(cache_key) if cache else None
+    if key is None and cache:
+        key = cache.get(cache_key)
+    if key is None:
+        key = Token.objects.get_or_create(user=user)[0].key
+        if cache:
+            cache.set(cache_key, key, timeout=settings.AUTH_TOKEN_CACHE_TIMEOUT)
+    if cache:
+        _set_local(cache_key, key)
+    return key
+
+
+def invalidate_tokens(keys, user_pks=()):
+    """Removes tokens with given keys and tokens of given users from cache.
+    """
+    cache_keys = [token_cache_key(key) for key in keys] + [user_token_cache_key(pk) for pk in user_pks]
+    with _local_lock:
+        for cache_key in cache_keys:
+            _local.pop(cache_key, None)
+    cache = get_cache()
+    if cache and cache_keys:
+        cache.delete_many(cache_keys)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Drop-in replacement of `TokenAuthentication` resolving tokens through cache.
+    """
+
+    def authenticate_credentials(self, key):
+        try:
+            token = get_token(key)
+        except Token.DoesNotExist:
+            raise AuthenticationFailed(_('Invalid token.'))
+
+        if not token.user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+
+        return token.user, token
@@ -0,0 +1,118 @@
+"""Write-behind access counters.
+
+Accesses are counted in the configured cache and applied to `Secret.number_of_accesses` in batches by
+`flush_access_counters`. Every secret whose cache counter leaves zero is written into a journal split
+into time buckets, so the flusher knows which counters to read without scanning secrets. Buckets are
+flushed once they are closed for a whole interval, so counts reach the database within about three
+`ACCESS_COUNTER_FLUSH_INTERVAL`s when the flusher runs every interval. Counts live in the cache, not in
+the worker, so restarting workers or the flusher does not lose them.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from precioussecret.service.models import Secret
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'access-counter'
+CURSOR_KEY = '{0}:cursor'.format(KEY_PREFIX)
+LOCK_KEY = '{0}:lock'.format(KEY_PREFIX)
+LOCK_TIMEOUT = 5 * 60
+JOURNAL_TIMEOUT = 24 * 60 * 60
+BATCH_SIZE = 500
+
+
+def counter_key(pk):
+    return '{0}:{1}'.format(KEY_PREFIX, pk)
+
+
+def journal_key(bucket, slot=None):
+    if slot is None:
+        return '{0}:journal:{1}'.format(KEY_PREFIX, bucket)
+    return '{0}:journal:{1}:{2}'.format(KEY_PREFIX, bucket, slot)
+
+
+def current_bucket(now=None):
+    return int((time.time() if now is None else now) // settings.ACCESS_COUNTER_FLUSH_INTERVAL)
+
+
+def buffer_access(secret, now=None):
+    """Counts one access of `secret` in cache. Returns False when cache is not available.
+    """
+    key = counter_key(secret.pk)
+    try:
+        cache.add(key, 0, timeout=None)
+        if cache.incr(key) == 1 and not _journal(secret.pk, now):
+            cache.decr(key)
+            return False
+    except ValueError:  # counter is missing, cache is not available
+        return False
+    return True
+
+
+def _journal(pk, now=None):
+    """Records that counter of secret `pk` has pending accesses.
+    """
+    bucket = current_bucket(now)
+    try:
+        cache.add(journal_key(bucket), 0, timeout=JOURNAL_TIMEOUT)
+        slot = cache.incr(journal_key(bucket))
+    except ValueError:
+        return False
+    cache.set(journal_key(bucket, slot), pk, timeout=JOURNAL_TIMEOUT)
+    return True
+
+
+def flush_access_counters(now=None):
+    """Applies buffered accesses from closed journal buckets to the database.
+    Returns number of applied accesses or None when another flush is running.
+    """
+    if not cache.add(LOCK_KEY, True, timeout=LOCK_TIMEOUT):
+        return None
+
+    try:
+        last_bucket = current_bucket(now) - 2
+        cursor = cache.get(CURSOR_KEY)
+        if cursor is None:
+            cursor = last_bucket - JOURNAL_TIMEOUT // settings.ACCESS_COUNTER_FLUSH_INTERVAL
+
+        applied = 0
+        for bucket in range(cursor, last_bucket + 1):
+            length = cache.get(journal_key(bucket)) or 0
+            for start in range(1, length + 1, BATCH_SIZE):
+                slots = range(start, min(start + BATCH_SIZE, length + 1))
+                pks = cache.get_many([journal_key(bucket, slot) for slot in slots]).values()
+                applied += _apply(set(pks), now)
+            if length:
+                cache.set(CURSOR_KEY, bucket + 1, timeout=None)
+        cache.set(CURSOR_KEY, max(cursor, last_bucket + 1), timeout=None)
+        return applied
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def _apply(pks, now=None):
+    """Moves counters of given secrets from cache to the database.
+    Database is written before the counter is decreased, so a crash may only count accesses twice.
+    """
+    counters = cache.get_many([counter_key(pk) for pk in pks])
+    secrets = Secret.objects.select_related('resource').in_bulk(pks)
+    applied = 0
+    for pk in pks:
+        count = counters.get(counter_key(pk))
+        if not count:
+            continue
+        if pk in secrets:
+            secrets[pk].register_accesses(count=count)
+            applied += count
+        else:
+            logger.warning('Dropping %d buffered access(es) of removed secret %s', count, pk)
+        try:
+            if cache.decr(counter_key(pk), count):  # accessed again while flushing
+                _journal(pk, now)
+        except ValueError:  # counter was evicted
+            pass
+    return applied
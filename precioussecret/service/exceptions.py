@@ -1,5 +1,6 @@
 from rest_framework import status
 from rest_framework.exceptions import APIException
+from rest_framework.exceptions import ValidationError
 
 
 class GoneValidationError(APIException):
@@ -7,3 +8,22 @@ class GoneValidationError(APIException):
 
     def __init__(self, detail):
         self.detail = {'detail': detail}
+
+
+class RequestEntityTooLargeError(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+    def __init__(self, detail):
+        self.detail = {'detail': detail}
+
+
+class ConflictError(APIException):
+    status_code = status.HTTP_409_CONFLICT
+
+    def __init__(self, detail):
+        self.detail = {'detail': detail}
+
+
+class WrongAccessCodeError(ValidationError):
+    """Access code does not match the secret, counted by `precioussecret.service.throttles`.
+    """
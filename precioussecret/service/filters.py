@@ -0,0 +1,217 @@
+"""Bloom filter of access names, rejecting unknown names without a database lookup.
+
+The filter is built from all secrets by `manage.py rebuild_access_filter` and stored in ACCESS_FILTER_CACHE
+under a new generation. Names of secrets created later are appended to a journal of that generation, which
+every process replays into its own copy of the filter before it rejects a name. Bloom filters cannot forget,
+so purged names stay in the filter until the next rebuild, their lookups just reach the database as before.
+
+The filter fails open: while it is not built, expired or any part of it is missing from the cache, names are
+looked up in the database as if there was no filter.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from precioussecret.service import metrics
+
+KEY_PREFIX = 'access-filter'
+GENERATION_KEY = '{0}:generation'.format(KEY_PREFIX)
+CHUNK_SIZE = 512 * 1024  # bytes, memcached stores items up to 1 MB by default
+
+_local = None
+_local_lock = threading.Lock()
+
+
+def filter_key(generation, chunk=None):
+    if chunk is None:
+        return '{0}:{1}'.format(KEY_PREFIX, generation)
+    return '{0}:{1}:{2}'.format(KEY_PREFIX, generation, chunk)
+
+
+def journal_key(generation, slot=None):
+    if slot is None:
+        return '{0}:{1}:journal'.format(KEY_PREFIX, generation)
+    return '{0}:{1}:journal:{2}'.format(KEY_PREFIX, generation, slot)
+
+
+def get_cache():
+    """Returns cache configured with ACCESS_FILTER_CACHE setting or None when the filter is not used.
+    """
+    return caches[settings.ACCESS_FILTER_CACHE] if settings.ACCESS_FILTER_CACHE else None
+
+
+class BloomFilter:
+    """Set of strings answering whether it may contain a string, with false positives but no false negatives.
+    """
+
+    def __init__(self, size, hashes, bits=None):
+        self.size = size
+        self.hashes = hashes
+        self.bits = bytearray(bits) if bits is not None else bytearray((size + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity, false_positive_rate):
+        """Returns empty filter sized to hold `capacity` strings with given false positive rate.
+        """
+        capacity = max(capacity, 1)
+        size = max(int(math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)), 8)
+        return cls(size, max(int(round(size / capacity * math.log(2))), 1))
+
+    def positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self.positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(value))
+
+
+class GenerationFilter(BloomFilter):
+    """Copy of filter of a generation, remembering how much of the journals it has replayed.
+    """
+
+    def __init__(self, generation, size, hashes, bits=None):
+        super(GenerationFilter, self).__init__(size, hashes, bits)
+        self.generation = generation
+        self.replayed = {}
+        self.loaded = time.monotonic()
+
+
+def build_filter(access_names, capacity):
+    """Stores filter of `access_names` as a new generation and returns number of its names.
+    `access_names` is read after the generation is started, so names journaled before are not needed.
+    """
+    cache = get_cache()
+    cache.add(GENERATION_KEY, 0, timeout=None)
+    generation = cache.incr(GENERATION_KEY)
+    cache.set(journal_key(generation), 0, timeout=settings.ACCESS_FILTER_MAX_AGE)
+
+    bloom = BloomFilter.for_capacity(capacity, settings.ACCESS_FILTER_FALSE_POSITIVE_RATE)
+    count = 0
+    for access_name in access_names:
+        bloom.add(access_name)
+        count += 1
+
+    chunks = [bytes(bloom.bits[start:start + CHUNK_SIZE]) for start in range(0, len(bloom.bits), CHUNK_SIZE)]
+    cache.set_many(
+        {filter_key(generation, chunk): data for chunk, data in enumerate(chunks)},
+        timeout=settings.ACCESS_FILTER_MAX_AGE,
+    )
+    cache.set(filter_key(generation), {
+        'size': bloom.size, 'hashes': bloom.hashes, 'chunks': len(chunks),
+    }, timeout=settings.ACCESS_FILTER_MAX_AGE)
+    return count
+
+
+def add_access_names(access_names):
+    """Journals names of new secrets, so processes add them to their copies of the filter.
+    """
+    cache = get_cache()
+    generation = cache.get(GENERATION_KEY) if cache and access_names else None
+    if generation is None:  # no filter to add to
+        return
+    try:
+        last = cache.incr(journal_key(generation), len(access_names))
+    except ValueError:  # journal was evicted, filter fails open until rebuilt
+        return
+    first = last - len(access_names) + 1
+    cache.set_many(
+        {journal_key(generation, first + i): access_name for i, access_name in enumerate(access_names)},
+        timeout=settings.ACCESS_FILTER_MAX_AGE,
+    )
+
+
+def may_exist(access_name):
+    """Returns False only if there is definitely no secret with `access_name`.
+    Cache is read without holding the lock, threads only take it to swap in a newer copy of the filter.
+    """
+    cache = get_cache()
+    if cache is None:
+        return True
+    bloom = _load(cache)
+    if bloom is None or access_name in bloom:
+        return True
+    if not _replay(cache, bloom) or access_name in bloom:  # created since the filter was loaded
+        return True
+    metrics.increment('access_filter.rejected')
+    return False
+
+
+def _load(cache):
+    """Returns local copy of the latest filter, loading it from cache when it is new or old copy is due.
+    """
+    with _local_lock:
+        local = _local
+    if local is not None and time.monotonic() - local.loaded < settings.ACCESS_FILTER_REFRESH_INTERVAL:
+        return local
+
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        return _swap(local, None)
+    if local is not None and local.generation == generation:
+        local.loaded = time.monotonic()
+        return local
+
+    meta = cache.get(filter_key(generation))
+    if meta is None:  # being built, keep using the previous generation
+        meta, generation = cache.get(filter_key(generation - 1)), generation - 1
+        if local is not None and local.generation == generation:
+            local.loaded = time.monotonic()
+            return local
+    if meta is None:
+        return _swap(local, None)
+    chunks = cache.get_many([filter_key(generation, chunk) for chunk in range(meta['chunks'])])
+    if len(chunks) != meta['chunks']:
+        return _swap(local, None)
+    bits = b''.join(chunks[filter_key(generation, chunk)] for chunk in range(meta['chunks']))
+    return _swap(local, GenerationFilter(generation, meta['size'], meta['hashes'], bits))
+
+
+def _swap(old, new):
+    """Replaces local copy `old` of the filter with `new` and returns the current copy.
+    Copy swapped in by another thread meanwhile is kept.
+    """
+    global _local
+    with _local_lock:
+        if _local is old:
+            _local = new
+        return _local
+
+
+def _replay(cache, bloom):
+    """Adds names journaled since the filter was built, both to its generation and to one being built.
+    Returns False when some of them are missing in the cache, the filter is incomplete then.
+    """
+    generations = [bloom.generation, bloom.generation + 1]
+    lengths = cache.get_many([GENERATION_KEY] + [journal_key(generation) for generation in generations])
+    current = lengths.get(GENERATION_KEY)
+    if current is None or current > bloom.generation + 1:
+        return False
+
+    journaled = {}
+    for generation in generations[:current - bloom.generation + 1]:
+        length = lengths.get(journal_key(generation))
+        if length is None:
+            return False
+        start = bloom.replayed.get(generation, 0)
+        if length <= start:
+            continue
+        names = cache.get_many([journal_key(generation, slot) for slot in range(start + 1, length + 1)])
+        if len(names) != length - start:
+            return False
+        journaled[generation] = (length, names.values())
+
+    with _local_lock:  # adding names is idempotent, threads replaying the same slots do not conflict
+        for generation, (length, names) in journaled.items():
+            for access_name in names:
+                bloom.add(access_name)
+            bloom.replayed[generation] = max(length, bloom.replayed.get(generation, 0))
+    return True
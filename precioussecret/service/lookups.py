@@ -0,0 +1,83 @@
+"""Read-through cache of secrets for the access path.
+
+Only parts of a secret that never change are cached: its resource, creation time and a keyed hash of the
+access code, see `hash_access_code`. Entries expire together with the secret, so a valid access loaded from
+the cache costs the database just the access counter write, or nothing when counters are buffered. Secrets
+are removed from the cache when they are changed, deleted or purged, or when their file is moved. Names
+that are not in the cache are checked against `precioussecret.service.filters` before the database.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.fields.files import FieldFile
+from django.http import Http404
+from django.utils import timezone
+
+from precioussecret.service import metrics
+from precioussecret.service.filters import may_exist
+from precioussecret.service.models import SECRET_LIFETIME
+from precioussecret.service.models import Resource
+from precioussecret.service.models import Secret
+from precioussecret.service.models import access_name_uuid
+from precioussecret.service.models import hash_access_code
+
+KEY_PREFIX = 'secret'
+RESOURCE_FIELDS = ['id', 'url', 'file', 'content_type', 'size', 'sha256']
+SECRET_FIELDS = ['id', 'created', 'resource_id', 'access_name']
+
+
+def secret_key(access_name):
+    return '{0}:{1}'.format(KEY_PREFIX, access_name)
+
+
+def get_cache():
+    """Returns cache configured with SECRET_LOOKUP_CACHE setting or None when secrets are not cached.
+    """
+    return caches[settings.SECRET_LOOKUP_CACHE] if settings.SECRET_LOOKUP_CACHE else None
+
+
+def get_secret(access_name):
+    """Returns 'Secret' with its resource, from cache if possible. Raises Http404 if there is none.
+    Secrets loaded from cache have `access_code` deferred, check it with `Secret.check_access_code`.
+    """
+    access_name = str(access_name_uuid(access_name))
+    cache = get_cache()
+    if cache:
+        data = cache.get(secret_key(access_name))
+        if data is not None:
+            metrics.increment('secret_cache.hit')
+            secret = Secret.from_db(None, SECRET_FIELDS, data['secret'])
+            secret.resource = Resource.from_db(None, RESOURCE_FIELDS, data['resource'])
+            secret.access_code_hash = data['access_code_hash']
+            return secret
+        metrics.increment('secret_cache.miss')
+
+    try:
+        if not may_exist(access_name):
+            raise Secret.DoesNotExist
+        secret = Secret.objects.select_related('resource').get_by_access_name(access_name)
+    except Secret.DoesNotExist:
+        raise Http404('No secret matches the given query.')
+    if cache:
+        timeout = (secret.created + SECRET_LIFETIME - timezone.now()).total_seconds()
+        if timeout > 0:  # expired secrets are rarely accessed, no need to keep them
+            cache.set(secret_key(access_name), {
+                'secret': _values(secret, SECRET_FIELDS),
+                'resource': _values(secret.resource, RESOURCE_FIELDS),
+                'access_code_hash': hash_access_code(secret.access_code),
+            }, timeout=int(timeout) + 1)
+    return secret
+
+
+def _values(instance, fields):
+    """Returns values of given fields as stored in the database, names of files instead of `FieldFile`.
+    """
+    values = [getattr(instance, field) for field in fields]
+    return [value.name if isinstance(value, FieldFile) else value for value in values]
+
+
+def invalidate_secrets(access_names):
+    """Removes given secrets from cache.
+    """
+    cache = get_cache()
+    if cache and access_names:
+        cache.delete_many([secret_key(access_name) for access_name in access_names])
@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from precioussecret.service.counters import flush_access_counters
+
+
+class Command(BaseCommand):
+    help = 'Applies secret accesses buffered in cache to the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep flushing every ACCESS_COUNTER_FLUSH_INTERVAL seconds.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            applied = flush_access_counters()
+            if applied is None:
+                self.stdout.write('Another flush is running.')
+            elif applied or options['verbosity'] > 1:
+                self.stdout.write('Applied {0} access(es).'.format(applied))
+            if not options['loop']:
+                break
+            time.sleep(settings.ACCESS_COUNTER_FLUSH_INTERVAL)
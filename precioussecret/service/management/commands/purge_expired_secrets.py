@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from precioussecret.service.models import Secret
+from precioussecret.service.storage import delete_unreferenced_file
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired secrets with their resources and files, keeping their statistics.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of secrets deleted in one transaction.',
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=0,
+            help='Seconds to wait between batches to throttle database load.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report what would be deleted.',
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            expired = Secret.objects.expired()
+            self.stdout.write('Would purge {0} secret(s) with {1} file(s).'.format(
+                expired.count(),
+                expired.exclude(resource__file='').exclude(resource__file__isnull=True).count(),
+            ))
+            return
+
+        secrets = files = 0
+        while True:
+            purged, file_names = self.purge_batch(options['batch_size'])
+            if not purged:
+                break
+            secrets += purged
+            files += sum(delete_unreferenced_file(name) for name in file_names)
+            if options['verbosity'] > 1:
+                self.stdout.write('Purged {0} secret(s).'.format(purged))
+            if purged < options['batch_size']:
+                break
+            time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS('Purged {0} secret(s) with {1} file(s).'.format(secrets, files)))
+
+    def purge_batch(self, batch_size):
+        """Deletes oldest expired secrets and their resources in one transaction.
+        """
+        with transaction.atomic():
+            pks = list(Secret.objects.expired().order_by('created').values_list('pk', flat=True)[:batch_size])
+            return Secret.objects.filter(pk__in=pks).purge()
@@ -0,0 +1,58 @@
+import os
+import uuid
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from precioussecret.service.models import UploadSession
+from precioussecret.service.uploads import remove_upload_file
+
+
+class Command(BaseCommand):
+    help = 'Deletes resumable uploads idle for UPLOAD_SESSION_LIFETIME seconds and files left without session.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report what would be deleted.',
+        )
+
+    def handle(self, *args, **options):
+        threshold = timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_LIFETIME)
+        sessions = list(UploadSession.objects.filter(updated__lt=threshold))
+        files = self.stray_files(threshold)
+        if options['dry_run']:
+            self.stdout.write('Would purge {0} upload(s) and {1} stray file(s).'.format(len(sessions), len(files)))
+            return
+
+        for session in sessions:
+            if UploadSession.objects.filter(pk=session.pk, updated__lt=threshold).delete()[0]:
+                remove_upload_file(session.path)
+        for path in files:
+            os.remove(path)
+        self.stdout.write(self.style.SUCCESS(
+            'Purged {0} upload(s) and {1} stray file(s).'.format(len(sessions), len(files))
+        ))
+
+    def stray_files(self, threshold):
+        """Returns paths of old files under UPLOAD_SESSION_ROOT without upload session.
+        """
+        try:
+            entries = list(os.scandir(settings.UPLOAD_SESSION_ROOT))
+        except FileNotFoundError:
+            return []
+        old = {
+            entry.name: entry.path for entry in entries
+            if entry.is_file() and entry.stat().st_mtime < threshold.timestamp()
+        }
+        pks = []
+        for name in old:
+            try:
+                pks.append(uuid.UUID(name))
+            except ValueError:
+                pass
+        existing = {str(pk) for pk in UploadSession.objects.filter(pk__in=pks).values_list('pk', flat=True)}
+        return [path for name, path in old.items() if name not in existing]
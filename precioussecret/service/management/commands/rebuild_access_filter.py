@@ -0,0 +1,38 @@
+import itertools
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from precioussecret.service.filters import build_filter
+from precioussecret.service.models import Secret
+from precioussecret.service.models import access_name_uuid
+
+
+class Command(BaseCommand):
+    help = 'Builds a new Bloom filter of access names, dropping names of purged secrets.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Number of access names loaded from the database at once.',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.ACCESS_FILTER_CACHE:
+            raise CommandError('Access filter is disabled, set ACCESS_FILTER_CACHE.')
+
+        capacity = max(settings.ACCESS_FILTER_CAPACITY, 2 * Secret.objects.count())
+        # Secrets of the previous release without UUID first, ones getting it meanwhile are in the second query
+        legacy_access_names = Secret.objects.filter(access_name__isnull=True).values_list(
+            'legacy_access_name', flat=True
+        ).iterator(chunk_size=options['batch_size'])
+        access_names = Secret.objects.filter(access_name__isnull=False).values_list(
+            'access_name', flat=True
+        ).iterator(chunk_size=options['batch_size'])
+        count = build_filter(itertools.chain(
+            (str(access_name_uuid(access_name)) for access_name in legacy_access_names), access_names,
+        ), capacity)
+        self.stdout.write(self.style.SUCCESS(
+            'Built filter of {0} access name(s) for up to {1}.'.format(count, capacity)
+        ))
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import transaction
+
+from precioussecret.service.models import DailyAccessStats
+from precioussecret.service.models import Secret
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds daily access statistics from secrets or checks that both are consistent.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only compare statistics with secrets and fail when they differ.',
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            return self.check_statistics()
+
+        with transaction.atomic():
+            purged = self.purged_counts()
+            counts = dict.fromkeys(purged, 0)
+            counts.update(self.live_counts())
+            DailyAccessStats.objects.all().delete()
+            DailyAccessStats.objects.bulk_create(
+                DailyAccessStats(
+                    date=date,
+                    resource_type=resource_type,
+                    count=count + purged.get((date, resource_type), 0),
+                    purged=purged.get((date, resource_type), 0),
+                ) for (date, resource_type), count in counts.items()
+            )
+        self.stdout.write(self.style.SUCCESS(
+            'Rebuilt statistics for {0} day(s).'.format(DailyAccessStats.objects.dates('date', 'day').count())
+        ))
+
+    def check_statistics(self):
+        """Compares statistics rollup against counts aggregated from secrets and purged counters.
+        """
+        expected = self.purged_counts()
+        for key, count in self.live_counts().items():
+            expected[key] = expected.get(key, 0) + count
+        expected = {key: count for key, count in expected.items() if count}
+        actual = {
+            (row['date'], row['resource_type']): row['count']
+            for row in DailyAccessStats.objects.filter(count__gt=0).values('date', 'resource_type', 'count')
+        }
+        differences = sorted(key for key in expected.keys() | actual.keys() if expected.get(key) != actual.get(key))
+        for date, resource_type in differences:
+            self.stdout.write('{0} {1}: expected {2}, found {3}'.format(
+                date, resource_type, expected.get((date, resource_type), 0), actual.get((date, resource_type), 0)
+            ))
+        if differences:
+            raise CommandError('Statistics are inconsistent for {0} counter(s).'.format(len(differences)))
+        self.stdout.write(self.style.SUCCESS('Statistics are consistent.'))
+
+    def live_counts(self):
+        return {(row['date'], row['resource_type']): row['count'] for row in Secret.objects.statistics()}
+
+    def purged_counts(self):
+        """Returns counts of accessed secrets that were purged, those cannot be recounted from `Secret`.
+        """
+        return {
+            (row['date'], row['resource_type']): row['purged']
+            for row in DailyAccessStats.objects.filter(purged__gt=0).values('date', 'resource_type', 'purged')
+        }
@@ -0,0 +1,166 @@
+import heapq
+import json
+import os
+import posixpath
+
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from precioussecret.service.models import Resource
+from precioussecret.service.models import Secret
+
+CURSOR_FILE = '.reconcile_media.json'
+SCAN_CHUNK = 10000
+
+
+def scan_directory(storage, path, cursor, chunk_size=SCAN_CHUNK):
+    """Yields names of entries in directory `path` in lexicographic order, directories with trailing slash.
+    Entries sorting entirely before `cursor` are skipped. At most `chunk_size` names are held at once,
+    larger directories are scanned again for every chunk.
+    """
+    last = ''
+    while True:
+        with os.scandir(storage.path(path)) as entries:
+            names = (posixpath.join(path, entry.name) + ('/' if entry.is_dir() else '') for entry in entries)
+            chunk = heapq.nsmallest(chunk_size, (
+                name for name in names
+                if name > last and (name > cursor or name.endswith('/') and cursor.startswith(name))
+            ))
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        last = chunk[-1]
+
+
+def walk_storage(storage, cursor='', path='', chunk_size=SCAN_CHUNK):
+    """Yields names of files in storage in lexicographic order, starting after `cursor`.
+    Directories sorting entirely before `cursor` are not scanned.
+    """
+    for name in scan_directory(storage, path, cursor, chunk_size):
+        if name.endswith('/'):
+            yield from walk_storage(storage, cursor, name.rstrip('/'), chunk_size)
+        elif name != CURSOR_FILE:
+            yield name
+
+
+def load_cursors(storage):
+    """Returns file and resource cursors stored by the previous run, empty ones before the first run.
+    """
+    try:
+        with open(storage.path(CURSOR_FILE)) as file:
+            cursors = json.load(file)
+    except FileNotFoundError:
+        return '', 0
+    return cursors['file'], cursors['resource']
+
+
+def store_cursors(storage, file_cursor, resource_cursor):
+    """Replaces stored cursors atomically, so an interrupted run leaves those of the previous one.
+    """
+    path = storage.path(CURSOR_FILE)
+    temporary = '{0}.{1}'.format(path, os.getpid())
+    with open(temporary, 'w') as file:
+        json.dump({'file': file_cursor, 'resource': resource_cursor}, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+class Command(BaseCommand):
+    help = 'Reports and optionally deletes media files without resources and resources without files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of files or resources looked up in the database at once.',
+        )
+        parser.add_argument(
+            '--limit', type=int, default=None,
+            help='Maximum number of files and of resources checked in this run, next run resumes after them.',
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help='Seconds a file without resource is left alone, its resource may not be committed yet.',
+        )
+        parser.add_argument(
+            '--file-cursor',
+            help='Start after this file name instead of the stored cursor, empty string starts over.',
+        )
+        parser.add_argument(
+            '--resource-cursor', type=int,
+            help='Start after this resource id instead of the stored cursor, 0 starts over.',
+        )
+        parser.add_argument(
+            '--delete', action='store_true',
+            help='Delete orphaned files and resources with missing files together with their secrets.',
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.delete = options['delete']
+
+        stored_file_cursor, stored_resource_cursor = load_cursors(default_storage)
+        file_cursor = options['file_cursor']
+        if file_cursor is None:
+            file_cursor = stored_file_cursor
+        file_cursor = self.reconcile_files(file_cursor, options['limit'], timedelta(seconds=options['min_age']))
+        store_cursors(default_storage, file_cursor, stored_resource_cursor)
+
+        resource_cursor = options['resource_cursor']
+        if resource_cursor is None:
+            resource_cursor = stored_resource_cursor
+        resource_cursor = self.reconcile_resources(resource_cursor, options['limit'])
+        store_cursors(default_storage, file_cursor, resource_cursor)
+
+        self.stdout.write('Next file cursor: {0!r}, next resource cursor: {1}'.format(file_cursor, resource_cursor))
+
+    def reconcile_files(self, cursor, limit, min_age):
+        """Checks files after `cursor` against resources, returns cursor to resume from or '' when done.
+        """
+        checked = 0
+        batch = []
+        for name in walk_storage(default_storage, cursor):
+            batch.append(name)
+            checked += 1
+            if len(batch) == self.batch_size or checked == limit:
+                self.check_files(batch, min_age)
+                if checked == limit:
+                    return name
+                batch = []
+        self.check_files(batch, min_age)
+        return ''
+
+    def check_files(self, names, min_age):
+        if not names:
+            return
+        referenced = set(Resource.objects.filter(file__in=names).values_list('file', flat=True))
+        threshold = timezone.now() - min_age
+        for name in names:
+            if name in referenced or default_storage.get_modified_time(name) > threshold:
+                continue
+            self.stdout.write('Orphaned file: {0}'.format(name))
+            if self.delete:
+                default_storage.delete(name)
+
+    def reconcile_resources(self, cursor, limit):
+        """Checks files of resources after `cursor` exist, returns cursor to resume from or 0 when done.
+        """
+        resources = Resource.objects.exclude(file='').exclude(file__isnull=True).order_by('pk')
+        checked = 0
+        while limit is None or checked < limit:
+            size = self.batch_size if limit is None else min(self.batch_size, limit - checked)
+            batch = list(resources.filter(pk__gt=cursor).values_list('pk', 'file')[:size])
+            if not batch:
+                return 0
+            dangling = [pk for pk, name in batch if not default_storage.exists(name)]
+            for pk in dangling:
+                self.stdout.write('Resource {0} has missing file.'.format(pk))
+            if dangling and self.delete:
+                Secret.objects.filter(resource__in=dangling).purge()
+                Resource.objects.filter(pk__in=dangling, secret__isnull=True).delete()
+            cursor = batch[-1][0]
+            checked += len(batch)
+        return cursor
@@ -0,0 +1,101 @@
+import hashlib
+import os
+import shutil
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from precioussecret.service.lookups import invalidate_secrets
+from precioussecret.service.models import Resource
+from precioussecret.service.models import Secret
+from precioussecret.service.models import sharded_upload_path
+from precioussecret.service.storage import delete_unreferenced_file
+
+
+class Command(BaseCommand):
+    help = 'Moves files of resources into directories given by MEDIA_SHARD_DEPTH.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of resources loaded from the database at once.',
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=0,
+            help='Seconds to wait between batches to throttle storage load.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report files that would be moved.',
+        )
+
+    def handle(self, *args, **options):
+        resources = Resource.objects.exclude(file='').exclude(file__isnull=True).order_by('pk')
+        moved = 0
+        last_pk = 0
+        while True:
+            batch = list(resources.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            for resource in batch:
+                name = resource.file.name
+                new_name = sharded_upload_path(resource, name)
+                if name == new_name:
+                    continue
+                if options['dry_run']:
+                    self.stdout.write('Would move {0} to {1}'.format(name, new_name))
+                elif self.move(resource.pk, name, new_name):
+                    moved += 1
+            last_pk = batch[-1].pk
+            time.sleep(options['sleep'])
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS('Moved {0} file(s).'.format(moved)))
+
+    def move(self, pk, name, new_name):
+        """Copies file to the new location, points resource to it and removes the old one if unreferenced.
+        The file is readable under one of both names at any time, so it can run while the site is serving.
+        Files shared by resources in content-addressed storage are moved once and reused by the others.
+        """
+        if not default_storage.exists(name):
+            self.stderr.write('File {0} of resource {1} is missing.'.format(name, pk))
+            return False
+        if not default_storage.exists(new_name):
+            self.copy(name, new_name)
+        elif self.digest(new_name) != self.digest(name):
+            if Resource.objects.filter(file=new_name).exists():
+                self.stderr.write('File {0} of resource {1} already exists.'.format(new_name, pk))
+                return False
+            default_storage.delete(new_name)  # left by an interrupted run
+            self.copy(name, new_name)
+
+        if not Resource.objects.filter(pk=pk, file=name).update(file=new_name):  # changed or deleted meanwhile
+            delete_unreferenced_file(new_name)
+            return False
+        # cached secrets point to the old file until invalidated
+        invalidate_secrets(Secret.objects.filter(resource=pk).values_list('access_name', flat=True))
+        delete_unreferenced_file(name)
+        return True
+
+    def digest(self, name):
+        digest = hashlib.sha256()
+        with default_storage.open(name) as file:
+            for chunk in file.chunks():
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def copy(self, name, new_name):
+        """Hard links file when storage is a local file system, copies it otherwise.
+        """
+        try:
+            path, new_path = default_storage.path(name), default_storage.path(new_name)
+        except NotImplementedError:
+            with default_storage.open(name) as file:
+                default_storage.save(new_name, file)
+            return
+
+        os.makedirs(os.path.dirname(new_path), exist_ok=True)
+        try:
+            os.link(path, new_path)
+        except OSError:  # not supported by file system
+            shutil.copyfile(path, new_path)
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from precioussecret.service.metrics import flush
+from precioussecret.service.metrics import snapshot
+
+
+class Command(BaseCommand):
+    help = 'Shows totals of metrics such as secret cache hits and misses counted by all processes.'
+
+    def handle(self, *args, **options):
+        flush()
+        metrics = snapshot()
+        for name in sorted(metrics):
+            self.stdout.write('{0} {1}'.format(name, metrics[name]))
+        hits, misses = metrics.get('secret_cache.hit', 0), metrics.get('secret_cache.miss', 0)
+        if hits + misses:
+            self.stdout.write('secret_cache.hit_ratio {0:.3f}'.format(hits / (hits + misses)))
@@ -0,0 +1,61 @@
+"""Operational counters such as cache hits and misses.
+
+Counters are incremented in memory of the worker process and added to the cache counters shared by all
+workers at most every `METRICS_FLUSH_INTERVAL` seconds, so counting does not cost a cache round trip.
+Totals are shown by `manage.py show_metrics`, counts not flushed yet by a worker are not included.
+"""
+import collections
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+KEY_PREFIX = 'metrics'
+NAMES_KEY = '{0}:names'.format(KEY_PREFIX)
+
+_pending = collections.Counter()
+_pending_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def metric_key(name):
+    return '{0}:{1}'.format(KEY_PREFIX, name)
+
+
+def increment(name, count=1):
+    """Adds `count` to metric `name`, flushing counts of the process when they are kept long enough.
+    """
+    with _pending_lock:
+        _pending[name] += count
+        due = time.monotonic() - _last_flush >= settings.METRICS_FLUSH_INTERVAL
+    if due:
+        flush()
+
+
+def flush():
+    """Adds counts of the process to the shared counters. Counts are dropped if cache is not available.
+    """
+    global _last_flush
+    with _pending_lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+
+    names = set(cache.get(NAMES_KEY) or [])
+    if not names.issuperset(pending):
+        cache.set(NAMES_KEY, sorted(names.union(pending)), timeout=None)
+    for name, count in pending.items():
+        try:
+            cache.add(metric_key(name), 0, timeout=None)
+            cache.incr(metric_key(name), count)
+        except ValueError:  # counter is missing, cache is not available
+            pass
+
+
+def snapshot():
+    """Returns dictionary with totals of all metrics flushed so far.
+    """
+    names = cache.get(NAMES_KEY) or []
+    values = cache.get_many([metric_key(name) for name in names])
+    return {name: values.get(metric_key(name), 0) for name in names}
@@ -0,0 +1,17 @@
+# Generated by Django 3.0.5 on 2026-10-18 07:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='secret',
+            index=models.Index(condition=models.Q(number_of_accesses__gt=0), fields=['created', 'resource'], name='secret_accessed_created_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.0.5 on 2026-10-18 07:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0002_secret_statistics_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAccessStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('resource_type', models.CharField(choices=[('URL', 'URL'), ('FILE', 'File')], max_length=4)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('date', 'resource_type')},
+            },
+        ),
+    ]
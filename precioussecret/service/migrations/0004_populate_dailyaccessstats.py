@@ -0,0 +1,30 @@
+from django.db import migrations
+from django.db.models import Case, CharField, Count, Q, Value, When
+from django.db.models.functions import TruncDate
+
+
+def populate_daily_access_stats(apps, schema_editor):
+    Secret = apps.get_model('service', 'Secret')
+    DailyAccessStats = apps.get_model('service', 'DailyAccessStats')
+    rows = Secret.objects.filter(
+        number_of_accesses__gt=0
+    ).annotate(
+        date=TruncDate('created'),
+        resource_type=Case(
+            When(Q(resource__url__isnull=True) | Q(resource__url=''), then=Value('FILE')),
+            default=Value('URL'),
+            output_field=CharField(),
+        ),
+    ).values('date', 'resource_type').annotate(count=Count('id')).order_by()
+    DailyAccessStats.objects.bulk_create(DailyAccessStats(**row) for row in rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0003_dailyaccessstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_daily_access_stats, migrations.RunPython.noop),
+    ]
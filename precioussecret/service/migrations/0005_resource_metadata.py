@@ -0,0 +1,28 @@
+# Generated by Django 3.0.5 on 2026-10-18 07:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0004_populate_dailyaccessstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resource',
+            name='content_type',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='sha256',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,52 @@
+import hashlib
+
+import magic
+
+from django.core.files.storage import default_storage
+from django.db import migrations
+
+BATCH_SIZE = 500
+MIME_SNIFF_SIZE = 64 * 1024
+
+
+def backfill_resource_metadata(apps, schema_editor):
+    """Stores content type, size and SHA-256 digest of files uploaded before they were kept on `Resource`.
+    """
+    Resource = apps.get_model('service', 'Resource')
+    resources = Resource.objects.filter(size__isnull=True, file__isnull=False).exclude(file='').order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(resources.filter(pk__gt=last_pk).values_list('pk', 'file')[:BATCH_SIZE])
+        if not batch:
+            break
+        for pk, name in batch:
+            try:
+                file = default_storage.open(name)
+            except FileNotFoundError:
+                continue
+            with file:
+                header = file.read(MIME_SNIFF_SIZE)
+                digest = hashlib.sha256(header)
+                size = len(header)
+                for chunk in iter(lambda: file.read(MIME_SNIFF_SIZE), b''):
+                    digest.update(chunk)
+                    size += len(chunk)
+            Resource.objects.filter(pk=pk).update(
+                content_type=magic.from_buffer(header, mime=True),
+                size=size,
+                sha256=digest.hexdigest(),
+            )
+        last_pk = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('service', '0005_resource_metadata'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_resource_metadata, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.0.5 on 2026-10-18 07:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0006_backfill_resource_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyaccessstats',
+            name='purged',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='secret',
+            index=models.Index(fields=['created'], name='secret_created_idx'),
+        ),
+    ]
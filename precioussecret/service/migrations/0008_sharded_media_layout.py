@@ -0,0 +1,19 @@
+# Generated by Django 3.0.5 on 2026-10-18 07:41
+
+from django.db import migrations, models
+import precioussecret.service.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0007_purge_expired_secrets'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='resource',
+            name='file',
+            field=models.FileField(blank=True, null=True, upload_to=precioussecret.service.models.sharded_upload_path),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.0.5 on 2026-10-18 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0008_sharded_media_layout'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['file'], name='resource_file_idx'),
+        ),
+    ]
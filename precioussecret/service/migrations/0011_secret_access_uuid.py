@@ -0,0 +1,40 @@
+from django.db import migrations, models
+
+import precioussecret.service.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0010_uploadsession'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RenameField(
+                    model_name='secret',
+                    old_name='access_name',
+                    new_name='legacy_access_name',
+                ),
+                migrations.AlterField(
+                    model_name='secret',
+                    name='legacy_access_name',
+                    field=models.CharField(
+                        db_column='access_name', db_index=True,
+                        default=precioussecret.service.models.generate_access_name, max_length=255, unique=True,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='secret',
+            name='legacy_access_name',
+            field=models.CharField(db_column='access_name', editable=False, max_length=255, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='secret',
+            name='access_name',
+            field=precioussecret.service.models.AccessNameField(db_column='access_uuid', null=True),
+        ),
+    ]
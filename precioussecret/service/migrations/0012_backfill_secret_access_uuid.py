@@ -0,0 +1,42 @@
+from django.db import migrations
+from django.db import transaction
+from django.db.models import Case
+from django.db.models import Value
+from django.db.models import When
+
+from precioussecret.service.models import AccessNameField
+from precioussecret.service.models import access_name_uuid
+
+BATCH_SIZE = 1000
+
+
+def backfill_access_uuid(apps, schema_editor):
+    """Stores access names of existing secrets in the UUID column, one UPDATE in a short transaction per batch.
+    Secrets created by the previous release meanwhile are found by `SecretQuerySet.get_by_access_name`.
+    """
+    Secret = apps.get_model('service', 'Secret')
+    secrets = Secret.objects.filter(access_name__isnull=True).order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(secrets.filter(pk__gt=last_pk).values_list('pk', 'legacy_access_name')[:BATCH_SIZE])
+        if not batch:
+            break
+        with transaction.atomic():
+            secrets.filter(pk__in=[pk for pk, _ in batch]).update(access_name=Case(*[
+                When(pk=pk, then=Value(str(access_name_uuid(legacy_access_name)), output_field=AccessNameField()))
+                for pk, legacy_access_name in batch
+            ]))
+        last_pk = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('service', '0011_secret_access_uuid'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_access_uuid, migrations.RunPython.noop),
+    ]
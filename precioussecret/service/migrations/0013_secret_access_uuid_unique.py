@@ -0,0 +1,54 @@
+from django.db import migrations
+
+import precioussecret.service.models
+
+
+def add_unique_constraint(apps, schema_editor):
+    """Makes UUID column unique, on PostgreSQL without blocking writes while its index is built.
+    """
+    Secret = apps.get_model('service', 'Secret')
+    column = Secret._meta.get_field('access_name').column
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.execute(schema_editor._create_unique_sql(Secret, [column]))
+        return
+    name = schema_editor.quote_name(schema_editor._create_index_name(Secret._meta.db_table, [column], '_uniq'))
+    table = schema_editor.quote_name(Secret._meta.db_table)
+    schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS {0}'.format(name))  # left invalid by interrupted run
+    schema_editor.execute('CREATE UNIQUE INDEX CONCURRENTLY {0} ON {1} ({2})'.format(
+        name, table, schema_editor.quote_name(column),
+    ))
+    schema_editor.execute('ALTER TABLE {0} ADD CONSTRAINT {1} UNIQUE USING INDEX {1}'.format(table, name))
+
+
+def remove_unique_constraint(apps, schema_editor):
+    Secret = apps.get_model('service', 'Secret')
+    column = Secret._meta.get_field('access_name').column
+    name = schema_editor._create_index_name(Secret._meta.db_table, [column], '_uniq')
+    schema_editor.execute(schema_editor._delete_unique_sql(Secret, name))
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('service', '0012_backfill_secret_access_uuid'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(add_unique_constraint, remove_unique_constraint),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='secret',
+                    name='access_name',
+                    field=precioussecret.service.models.AccessNameField(
+                        db_column='access_uuid', default=precioussecret.service.models.generate_access_name,
+                        null=True, unique=True,
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.5 on 2026-10-18 08:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0013_secret_access_uuid_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='writer',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+    ]
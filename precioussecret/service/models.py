@@ -1,16 +1,69 @@
+import mimetypes
+import os
 import random
 import string
 import uuid
 
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError
 from django.db import models
+from django.db import transaction
+from django.db.models import Case
+from django.db.models import CharField
+from django.db.models import Count
+from django.db.models import F
+from django.db.models import Q
+from django.db.models import Value
+from django.db.models import When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.crypto import salted_hmac
+
+from precioussecret.service.filters import add_access_names
+
+SECRET_LIFETIME = timedelta(hours=24)
+
+
+def sharded_upload_path(instance, filename):
+    """Returns path of uploaded file in directories named after its leading characters, see MEDIA_SHARD_DEPTH.
+    """
+    name = os.path.basename(filename)
+    stem = os.path.splitext(name)[0]
+    shards = [stem[i:i + 2] for i in range(0, 2 * settings.MEDIA_SHARD_DEPTH, 2)]
+    return '/'.join([shard for shard in shards if shard] + [name])
 
 
 class Resource(models.Model):
+    URL = 'URL'
+    FILE = 'FILE'
+    TYPE_CHOICES = [(URL, 'URL'), (FILE, 'File')]
+
     url = models.URLField(blank=True, null=True)
-    file = models.FileField(blank=True, null=True)
+    file = models.FileField(blank=True, null=True, upload_to=sharded_upload_path)
+    content_type = models.CharField(max_length=255, blank=True, null=True)
+    size = models.BigIntegerField(blank=True, null=True)
+    sha256 = models.CharField(max_length=64, blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['file'], name='resource_file_idx'),
+        ]
 
     def __str__(self):
-        return 'URL' if self.url else 'FILE'
+        return self.URL if self.url else self.FILE
+
+    def get_content_type(self):
+        """Returns MIME type of the file, guessed from its name if it was not stored on upload.
+        """
+        return self.content_type or mimetypes.guess_type(self.file.name)[0] or 'application/octet-stream'
+
+    def get_size(self):
+        """Returns size of the file, asking storage only if it was not stored on upload.
+        """
+        return self.size if self.size is not None else self.file.size
 
 
 def generate_access_name():
@@ -19,15 +72,247 @@ def generate_access_name():
     return str(uuid.uuid4())
 
 
+ACCESS_NAME_NAMESPACE = uuid.UUID('5d3c4f0e-6b1a-4f4b-9a57-2f8d2b7c1e90')
+
+
+def access_name_uuid(value):
+    """Returns UUID of access name, names that are not UUIDs get a name-based one so they still match.
+    """
+    if isinstance(value, uuid.UUID):
+        return value
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return uuid.uuid5(ACCESS_NAME_NAMESPACE, str(value))
+
+
+class AccessNameField(models.Field):
+    """Access name stored as native UUID column, or as 16 bytes on databases without one.
+    Python value is the canonical string form of the UUID, see `access_name_uuid`.
+    """
+    binary_types = {'mysql': 'binary(16)', 'oracle': 'RAW(16)'}
+
+    def db_type(self, connection):
+        if connection.features.has_native_uuid_field:
+            return 'uuid'
+        return self.binary_types.get(connection.vendor, 'blob')
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if value is None:
+            return None
+        value = access_name_uuid(value)
+        return value if connection.features.has_native_uuid_field else value.bytes
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        if isinstance(value, (bytes, memoryview)):
+            return str(uuid.UUID(bytes=bytes(value)))
+        return str(access_name_uuid(value))
+
+    def to_python(self, value):
+        return None if value is None else str(access_name_uuid(value))
+
+
 def generate_access_code():
     """Returns short code, Note this code is not necessarily unique.
     """
     return ''.join(random.choice(string.ascii_uppercase) for _ in range(6))
 
 
+def hash_access_code(access_code):
+    """Returns keyed hash of access code, safe to keep outside of the database.
+    """
+    return salted_hmac('precioussecret.service.access-code', access_code).hexdigest()
+
+
+def _invalidate_secrets(access_names):
+    from precioussecret.service.lookups import invalidate_secrets  # lookups imports models
+    invalidate_secrets(access_names)
+
+
+class SecretQuerySet(models.QuerySet):
+
+    def get_by_access_name(self, access_name):
+        """Returns secret with `access_name`, also one created by previous release without its UUID column.
+        Their UUID is stored on first lookup, `manage.py migrate` stores the rest.
+        """
+        secret = self.get(Q(access_name=access_name) | Q(access_name__isnull=True, legacy_access_name=access_name))
+        if secret.access_name is None:
+            secret.access_name = str(access_name_uuid(secret.legacy_access_name))
+            Secret.objects.filter(pk=secret.pk, access_name__isnull=True).update(access_name=secret.access_name)
+        return secret
+
+    def bulk_create(self, objs, *args, **kwargs):
+        for obj in objs:
+            obj.fill_legacy_access_name()
+        return super(SecretQuerySet, self).bulk_create(objs, *args, **kwargs)
+
+    def available(self):
+        """Returns secrets that did not expire yet.
+        """
+        return self.filter(created__gte=timezone.now() - SECRET_LIFETIME)
+
+    def expired(self):
+        """Returns secrets that can no longer be accessed.
+        """
+        return self.filter(created__lt=timezone.now() - SECRET_LIFETIME)
+
+    def statistics(self):
+        """Returns number of accessed secrets grouped by creation date and resource type.
+        Output format: [{'date': date(2020, 4, 8), 'resource_type': 'FILE', 'count': 1}, ...]
+        """
+        return self.filter(
+            number_of_accesses__gt=0
+        ).annotate(
+            date=TruncDate('created'),
+            resource_type=Case(
+                When(Q(resource__url__isnull=True) | Q(resource__url=''), then=Value(Resource.FILE)),
+                default=Value(Resource.URL),
+                output_field=CharField(),
+            ),
+        ).values('date', 'resource_type').annotate(
+            count=Count('id')
+        ).order_by('date', 'resource_type')
+
+    def purge(self):
+        """Deletes secrets with resources no longer used by other secrets, keeping their statistics.
+        Returns number of deleted secrets and names of files to remove once the transaction is committed.
+        """
+        with transaction.atomic():
+            secrets = Secret.objects.select_for_update().filter(pk__in=list(self.values_list('pk', flat=True)))
+            access_names = list(secrets.values_list('access_name', flat=True))
+            transaction.on_commit(lambda: _invalidate_secrets(access_names))
+            resource_pks = set(secrets.values_list('resource', flat=True))
+            for row in secrets.statistics():
+                DailyAccessStats.objects.increment(
+                    date=row['date'], resource_type=row['resource_type'], count=0, purged=row['count'],
+                )
+            purged = secrets.delete()[0]
+
+            resources = Resource.objects.filter(pk__in=resource_pks, secret__isnull=True)
+            file_names = [name for name in resources.values_list('file', flat=True) if name]
+            resources.delete()
+        return purged, file_names
+
+
 class Secret(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     resource = models.ForeignKey(Resource, on_delete=models.PROTECT)
-    access_name = models.CharField(max_length=255, unique=True, db_index=True, default=generate_access_name)
+    access_name = AccessNameField(unique=True, null=True, default=generate_access_name, db_column='access_uuid')
+    # Kept with its unique index for workers of the previous release looking secrets up by it, drop both in the
+    # release after every secret has `access_name`
+    legacy_access_name = models.CharField(
+        max_length=255, unique=True, null=True, editable=False, db_column='access_name',
+    )
     access_code = models.CharField(max_length=255, default=generate_access_code)
     number_of_accesses = models.IntegerField(default=0)
+
+    objects = SecretQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created'], name='secret_created_idx'),
+            models.Index(
+                fields=['created', 'resource'],
+                name='secret_accessed_created_idx',
+                condition=Q(number_of_accesses__gt=0),
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        self.fill_legacy_access_name()
+        super(Secret, self).save(*args, **kwargs)
+        if adding:
+            transaction.on_commit(lambda: add_access_names([self.access_name]))
+        else:
+            transaction.on_commit(lambda: _invalidate_secrets([self.access_name]))
+
+    def delete(self, *args, **kwargs):
+        access_name = self.access_name
+        transaction.on_commit(lambda: _invalidate_secrets([access_name]))
+        return super(Secret, self).delete(*args, **kwargs)
+
+    def fill_legacy_access_name(self):
+        if self.legacy_access_name is None and 'legacy_access_name' not in self.get_deferred_fields():
+            self.legacy_access_name = self.access_name
+
+    def check_access_code(self, access_code):
+        """Returns True if `access_code` is the code of the secret.
+        Secrets loaded from cache know only keyed hash of the code, see `precioussecret.service.lookups`.
+        """
+        if 'access_code' in self.get_deferred_fields():
+            return constant_time_compare(hash_access_code(access_code), self.access_code_hash)
+        return constant_time_compare(access_code, self.access_code)
+
+    def is_available(self):
+        """Returns True if secret did not expire yet.
+        """
+        return self.created >= timezone.now() - SECRET_LIFETIME
+
+    def register_accesses(self, count=1, queryset=None):
+        """Adds `count` to number of accesses, usually with a single conditional UPDATE of that column only.
+        Secret is counted in statistics on its first access. Returns False when `queryset` does not match it.
+        """
+        secret = (queryset if queryset is not None else Secret.objects.all()).filter(pk=self.pk)
+        accessed = secret.filter(number_of_accesses__gt=0)
+        if accessed.update(number_of_accesses=F('number_of_accesses') + count):
+            return True
+        with transaction.atomic():
+            if secret.filter(number_of_accesses=0).update(number_of_accesses=count):
+                DailyAccessStats.objects.increment(
+                    date=timezone.localdate(self.created),
+                    resource_type=str(self.resource),
+                )
+                return True
+        return bool(accessed.update(number_of_accesses=F('number_of_accesses') + count))  # first one was concurrent
+
+
+class DailyAccessStatsQuerySet(models.QuerySet):
+
+    def increment(self, date, resource_type, count=1, purged=0):
+        """Adds `count` and `purged` to the counters of given day and resource type, creating them when missing.
+        """
+        counter = self.filter(date=date, resource_type=resource_type)
+        if counter.update(count=F('count') + count, purged=F('purged') + purged):
+            return
+        try:
+            with transaction.atomic():
+                self.create(date=date, resource_type=resource_type, count=count, purged=purged)
+        except IntegrityError:  # created concurrently
+            counter.update(count=F('count') + count, purged=F('purged') + purged)
+
+
+class DailyAccessStats(models.Model):
+    """Number of accessed secrets per creation day and resource type.
+    Maintained incrementally on the first access of every secret so statistics never scan `Secret`.
+    `purged` tells how many of them were already deleted, the rest can be recounted from `Secret`.
+    """
+    date = models.DateField()
+    resource_type = models.CharField(max_length=4, choices=Resource.TYPE_CHOICES)
+    count = models.PositiveIntegerField(default=0)
+    purged = models.PositiveIntegerField(default=0)
+
+    objects = DailyAccessStatsQuerySet.as_manager()
+
+    class Meta:
+        unique_together = [('date', 'resource_type')]
+
+
+class UploadSession(models.Model):
+    """File of a new secret uploaded in chunks, see `precioussecret.service.uploads`.
+    Received bytes are kept in a file under UPLOAD_SESSION_ROOT until the upload is finalized.
+    `writer` identifies request writing a chunk at `offset`, no other chunk is accepted until it finishes.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    writer = models.UUIDField(null=True, editable=False)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    @property
+    def path(self):
+        return os.path.join(settings.UPLOAD_SESSION_ROOT, str(self.pk))
@@ -0,0 +1,279 @@
+import binascii
+import hashlib
+import re
+import string
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+from django.utils.translation import ugettext as _
+
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles
+from rest_framework.parsers import FileUploadParser
+from rest_framework.parsers import JSONParser
+from rest_framework.utils import json
+
+from precioussecret.service.exceptions import RequestEntityTooLargeError
+from precioussecret.service.serializers import MIME_SNIFF_SIZE
+from precioussecret.service.serializers import check_file_size
+from precioussecret.service.serializers import detect_content_type
+
+STRUCTURAL_CHARACTERS = re.compile(rb'["{}\[\]:,]')
+STRING_SPECIAL_CHARACTERS = re.compile(rb'["\\]')
+NON_BASE64_CHARACTERS = bytes(set(range(256)) - set((string.ascii_letters + string.digits + '+/=').encode()))
+
+
+class Base64ValueScanner:
+    """Incremental JSON scanner that base64-decodes string found under `path` into a temporary file.
+    Everything else is copied into `skeleton`, the string itself is replaced with `null`.
+    """
+
+    def __init__(self, path, max_skeleton_size=None):
+        self.path = tuple(key.encode() for key in path)
+        self.max_skeleton_size = max_skeleton_size
+        self.skeleton = bytearray()
+        self.stack = []  # [key, expecting_key] for objects, None for arrays
+        self.in_string = False
+        self.string_key = None
+        self.escaped = False
+        self.file = None
+        self.streaming = False
+        self.escape = 0  # -1 when escaped character is expected, else number of bytes to skip
+        self.pending = b''
+        self.header = bytearray()
+        self.size = 0
+        self.digest = hashlib.sha256()
+
+    def feed(self, chunk):
+        position = 0
+        while position < len(chunk):
+            if self.streaming:
+                position = self.__feed_value(chunk, position)
+            elif self.in_string:
+                position = self.__feed_string(chunk, position)
+            else:
+                match = STRUCTURAL_CHARACTERS.search(chunk, position)
+                end = match.start() if match else len(chunk)
+                self.__append(chunk[position:end])
+                if match:
+                    self.__structural(chunk[end:end + 1])
+                position = end + 1
+
+    def close(self):
+        """Returns decoded file or None when there was no string under `path`.
+        """
+        if self.streaming:
+            raise ValueError('Unterminated string')
+        if self.file is not None:
+            self.__write(binascii.a2b_base64(self.pending))
+            if len(self.header) < MIME_SNIFF_SIZE:
+                self.__check_header()
+            self.file.size = self.size
+            self.file.sha256 = self.digest.hexdigest()
+            self.file.seek(0)
+        return self.file
+
+    def discard(self):
+        if self.file is not None:
+            self.file.close()
+
+    def __append(self, data):
+        self.skeleton += data
+        if self.max_skeleton_size is not None and len(self.skeleton) > self.max_skeleton_size:
+            raise RequestEntityTooLargeError(_('Request body is too large'))
+
+    def __structural(self, character):
+        top = self.stack[-1] if self.stack else None
+        if character == b'"':
+            if top is not None and top[1]:
+                self.string_key = bytearray()
+            elif top is not None and self.__at_path():
+                self.__append(b'null')
+                self.file = TemporaryUploadedFile('upload', 'application/octet-stream', 0, None)
+                self.streaming = True
+                return
+            self.in_string = True
+        elif character == b'{':
+            self.stack.append([None, True])
+        elif character == b'[':
+            self.stack.append(None)
+        elif character in b'}]' and self.stack:
+            self.stack.pop()
+        elif character == b':' and top is not None:
+            top[1] = False
+        elif character == b',' and top is not None:
+            top[1] = True
+        self.__append(character)
+
+    def __at_path(self):
+        return len(self.stack) == len(self.path) and all(
+            entry is not None and entry[0] == key for entry, key in zip(self.stack, self.path)
+        )
+
+    def __feed_string(self, chunk, position):
+        """Copies regular string, remembering it if it is an object key.
+        """
+        if self.escaped:
+            self.__copy_string(chunk[position:position + 1])
+            self.escaped = False
+            return position + 1
+
+        match = STRING_SPECIAL_CHARACTERS.search(chunk, position)
+        if not match:
+            self.__copy_string(chunk[position:])
+            return len(chunk)
+
+        self.__copy_string(chunk[position:match.start()])
+        self.__append(match.group())
+        if match.group() == b'\\':
+            self.escaped = True
+        else:
+            self.in_string = False
+            if self.string_key is not None:
+                self.stack[-1][0] = bytes(self.string_key)
+                self.string_key = None
+        return match.end()
+
+    def __copy_string(self, data):
+        self.__append(data)
+        if self.string_key is not None:
+            self.string_key += data
+
+    def __feed_value(self, chunk, position):
+        """Decodes base64 string, skipping JSON escapes other than `\\/`.
+        """
+        if self.escape == -1:
+            character = chunk[position:position + 1]
+            if character == b'/':
+                self.__decode(character)
+            self.escape = 4 if character == b'u' else 0
+            return position + 1
+        if self.escape:
+            skipped = min(self.escape, len(chunk) - position)
+            self.escape -= skipped
+            return position + skipped
+
+        match = STRING_SPECIAL_CHARACTERS.search(chunk, position)
+        end = match.start() if match else len(chunk)
+        self.__decode(chunk[position:end])
+        if not match:
+            return end
+        if match.group() == b'\\':
+            self.escape = -1
+        else:
+            self.streaming = False
+        return match.end()
+
+    def __decode(self, data):
+        self.pending += data.translate(None, NON_BASE64_CHARACTERS)
+        usable = len(self.pending) // 4 * 4
+        if usable:
+            self.__write(binascii.a2b_base64(self.pending[:usable]))
+            self.pending = self.pending[usable:]
+
+    def __write(self, data):
+        self.size += len(data)
+        check_file_size(self.size)
+        if len(self.header) < MIME_SNIFF_SIZE:
+            self.header += data[:MIME_SNIFF_SIZE - len(self.header)]
+            if len(self.header) == MIME_SNIFF_SIZE:
+                self.__check_header()
+        self.digest.update(data)
+        self.file.write(data)
+
+    def __check_header(self):
+        """Rejects forbidden file types before the rest of the file is read.
+        """
+        try:
+            detect_content_type(bytes(self.header))
+        except serializers.ValidationError as e:
+            raise serializers.ValidationError({'resource': {'file': e.detail}})
+
+
+class ResourceJSONParser(JSONParser):
+    """Parses JSON body base64-decoding `resource.file` into a temporary file while the body is read.
+    Only the rest of the document is kept in memory, up to DATA_UPLOAD_MAX_MEMORY_SIZE bytes.
+    """
+    chunk_size = 64 * 1024
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        max_skeleton_size = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+
+        request = parser_context.get('request')
+        if request is not None:
+            self.check_content_length(request.META.get('CONTENT_LENGTH'), max_skeleton_size)
+
+        scanner = Base64ValueScanner(path=('resource', 'file'), max_skeleton_size=max_skeleton_size)
+        try:
+            for chunk in iter(lambda: stream.read(self.chunk_size), b''):
+                scanner.feed(chunk)
+            file = scanner.close()
+            parse_constant = json.strict_constant if self.strict else None
+            data = json.loads(scanner.skeleton.decode(encoding), parse_constant=parse_constant)
+        except binascii.Error:
+            scanner.discard()
+            raise serializers.ValidationError({'resource': {'file': [_('Not a valid base64 file')]}})
+        except ValueError as exc:
+            scanner.discard()
+            raise ParseError('JSON parse error - %s' % str(exc))
+        except Exception:
+            scanner.discard()
+            raise
+
+        if file is not None:
+            if not isinstance(data, dict) or not isinstance(data.get('resource'), dict):  # duplicated keys
+                scanner.discard()
+                raise ParseError('JSON parse error - unexpected `resource`')
+            data['resource']['file'] = file
+        return data
+
+    def check_content_length(self, content_length, max_skeleton_size):
+        """Rejects body that cannot fit allowed file before reading it.
+        """
+        try:
+            content_length = int(content_length)
+        except (TypeError, ValueError):
+            return
+        max_encoded_size = (settings.MAX_SECRET_FILE_SIZE + 2) // 3 * 4
+        if content_length > max_encoded_size + (max_skeleton_size or 0):
+            raise RequestEntityTooLargeError(_('File is too large'))
+
+
+class BoundedJSONParser(JSONParser):
+    """Parses JSON body of at most DATA_UPLOAD_MAX_MEMORY_SIZE bytes, larger ones are rejected unread.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        max_size = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        body = stream.read(max_size + 1) if max_size is not None else stream.read()
+        if max_size is not None and len(body) > max_size:
+            raise RequestEntityTooLargeError(_('Request body is too large'))
+
+        try:
+            parse_constant = json.strict_constant if self.strict else None
+            return json.loads(body.decode(encoding), parse_constant=parse_constant)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class ResourceFileUploadParser(FileUploadParser):
+    """Parses raw request body as `resource.file` of a new secret.
+    Body is passed through Django upload handlers, so large files are spilled to a temporary file.
+    """
+    media_type = 'application/octet-stream'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        data_and_files = super(ResourceFileUploadParser, self).parse(stream, media_type, parser_context)
+        return DataAndFiles(QueryDict(), MultiValueDict({'resource.file': [data_and_files.files['file']]}))
+
+    def get_filename(self, stream, media_type, parser_context):
+        """File name is optional, file type is detected from its content anyway.
+        """
+        return super(ResourceFileUploadParser, self).get_filename(stream, media_type, parser_context) or 'upload'
@@ -0,0 +1,14 @@
+from rest_framework import renderers
+
+
+class ResourceFileRenderer(renderers.BaseRenderer):
+    """Renderer negotiated by clients that want file secrets as raw bytes instead of base64 inside JSON.
+    Views stream the file themselves, this renderer only makes `Accept: application/octet-stream` acceptable.
+    """
+    media_type = 'application/octet-stream'
+    format = 'file'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
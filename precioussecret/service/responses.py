@@ -0,0 +1,144 @@
+import os
+import re
+
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import FileResponse
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from precioussecret.service.storage import is_compressed
+from precioussecret.service.storage import original_name
+
+FILE_RESPONSE_BLOCK_SIZE = 64 * 1024
+
+accepts_gzip_re = re.compile(r'\bgzip\b')
+byte_range_re = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def accepts_gzip(request):
+    return bool(accepts_gzip_re.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+
+
+def requested_range(request, size, etag=None):
+    """Returns first and last byte of single range requested by `request` or None to send whole file.
+    First byte is not less than `size` when the range is not satisfiable. Multiple ranges are not supported
+    and, as well as ranges conditional on another version of the file, get whole file.
+    """
+    header = request.META.get('HTTP_RANGE', '').strip()
+    if_range = request.META.get('HTTP_IF_RANGE')
+    match = byte_range_re.match(header)
+    if not match or not any(match.groups()) or (if_range and if_range != etag):
+        return None
+
+    first, last = match.groups()
+    if not first:  # suffix of given length
+        first = max(size - int(last), 0) if int(last) else size
+        return first, size - 1
+    if last and int(last) < int(first):
+        return None
+    return int(first), min(int(last), size - 1) if last else size - 1
+
+
+class FileRange:
+    """Read-only view of `length` bytes of file from its current position.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def delivery_response(file, content_type, filename, content_encoding=None):
+    """Returns empty response telling front web server to send `file`, or None if it cannot be sent that way.
+    Only files stored as they are in MEDIA_ROOT can be, front server then handles byte ranges as well.
+    """
+    path = getattr(file, 'name', None)
+    media_root = os.path.join(os.path.abspath(settings.MEDIA_ROOT), '')
+    if not settings.FILE_DELIVERY or not isinstance(path, str) or not path.startswith(media_root):
+        return None
+
+    response = HttpResponse(content_type=content_type)
+    if settings.FILE_DELIVERY == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = settings.FILE_DELIVERY_ACCEL_PREFIX + quote(path[len(media_root):])
+    elif settings.FILE_DELIVERY == 'x-sendfile':
+        response['X-Sendfile'] = path
+    else:
+        raise ImproperlyConfigured('Unknown FILE_DELIVERY {0!r}'.format(settings.FILE_DELIVERY))
+    response['Content-Disposition'] = 'inline; filename="{0}"'.format(filename)
+    if content_encoding:
+        response['Content-Encoding'] = content_encoding
+    file.close()
+    return response
+
+
+def file_response(request, file, content_type, filename, size=None, content_encoding=None, etag=None):
+    """Returns response streaming `file` in chunks or letting front web server send it, see FILE_DELIVERY.
+    Byte range asked for by `request` is sent with 206 if size of the file is known and it can be seeked.
+    """
+    response = delivery_response(file, content_type, filename, content_encoding)
+    if response is not None:
+        return response
+
+    seekable = size is not None and content_encoding is None and hasattr(file, 'seek')
+    byte_range = requested_range(request, size, etag) if seekable else None
+    if byte_range and byte_range[0] >= size:
+        file.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */{0}'.format(size)
+        return response
+
+    if byte_range:
+        first, last = byte_range
+        file.seek(first)
+        response = FileResponse(
+            FileRange(file, last - first + 1), status=206, content_type=content_type, filename=filename
+        )
+        response['Content-Range'] = 'bytes {0}-{1}/{2}'.format(first, last, size)
+        response['Content-Length'] = last - first + 1
+    else:
+        response = FileResponse(file, content_type=content_type, filename=filename)
+        if size is not None:
+            response['Content-Length'] = size
+    response.block_size = FILE_RESPONSE_BLOCK_SIZE
+    if content_encoding:
+        response['Content-Encoding'] = content_encoding
+    if seekable:
+        response['Accept-Ranges'] = 'bytes'
+    if etag:
+        response['ETag'] = etag
+    return response
+
+
+def resource_file_response(secret, request):
+    """Returns response streaming file of the secret from storage, or its requested byte range.
+    Compressed files are sent as stored with `Content-Encoding: gzip` when `request` accepts it and no range.
+    """
+    resource = secret.resource
+    file = resource.file
+    filename = '{0}{1}'.format(secret.access_name, os.path.splitext(original_name(file.name))[1])
+    if is_compressed(file.name) and accepts_gzip(request) and 'HTTP_RANGE' not in request.META:
+        response = file_response(
+            request, file.storage.open_compressed(file.name), resource.get_content_type(), filename,
+            size=file.storage.size(file.name), content_encoding='gzip',
+        )
+    else:
+        response = file_response(
+            request, file.storage.open(file.name), resource.get_content_type(), filename,
+            size=resource.get_size(), etag='"{0}"'.format(resource.sha256) if resource.sha256 else None,
+        )
+    if is_compressed(file.name):
+        patch_vary_headers(response, ['Accept-Encoding'])
+    return response
@@ -1,20 +1,60 @@
 import base64
+import hashlib
 import magic
 import mimetypes
 import uuid
 
-from datetime import timedelta
-
 from django.conf import settings
 from django.core.files.base import ContentFile
+from django.core.files.base import File
 from django.core.files.storage import default_storage
-from django.utils import timezone
+from django.db import connection
+from django.db import transaction
 from django.utils.translation import ugettext as _
 
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 
+from precioussecret.service.counters import buffer_access
 from precioussecret.service.exceptions import GoneValidationError
-from precioussecret.service.models import Secret, Resource
+from precioussecret.service.exceptions import RequestEntityTooLargeError
+from precioussecret.service.exceptions import WrongAccessCodeError
+from precioussecret.service.filters import add_access_names
+from precioussecret.service.models import Secret, Resource, UploadSession
+from precioussecret.service.tokens import make_download_token
+
+MIME_SNIFF_SIZE = 64 * 1024
+
+
+def detect_content_type(header):
+    """Returns MIME type and extension detected from first bytes of the file if it is allowed.
+    """
+    mime_type = magic.from_buffer(header, mime=True)
+    file_ext = mimetypes.guess_extension(mime_type)
+    if file_ext not in settings.VALID_FILE_EXTENSIONS:
+        raise serializers.ValidationError(
+            _('Forbidden file extension')
+        )
+    return mime_type, file_ext
+
+
+def file_sha256(file):
+    """Returns hex SHA-256 digest of the file read in chunks.
+    """
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def check_file_size(size):
+    """Raises error if file is bigger than allowed.
+    """
+    if size > settings.MAX_SECRET_FILE_SIZE:
+        raise RequestEntityTooLargeError(
+            _('File is too large'),
+        )
 
 
 class ResourceFileField(serializers.FileField):
@@ -30,25 +70,27 @@ class ResourceFileField(serializers.FileField):
             return encoded
 
     def to_internal_value(self, data):
-        """Save file received as base64 and returns path to it.
+        """Save file received as base64 or uploaded file and returns path to it.
+        Detected MIME type and SHA-256 digest are set on returned file as `content_type` and `sha256`.
         """
-        try:  # ToDo penetrate in order test if it has any security flaws
-            decoded = base64.b64decode(data)
-            mime_type = magic.from_buffer(decoded, mime=True)
-            file_ext = mimetypes.guess_extension(mime_type)
-        except TypeError:
-            raise serializers.ValidationError(
-                _('Not a valid base64 file')
-            )
-
-        if file_ext not in settings.VALID_FILE_EXTENSIONS:
-            raise serializers.ValidationError(
-                _('Forbidden file extension')
-            )
-
-        file_name = "{0}{1}".format(uuid.uuid4(), file_ext)
-        data = ContentFile(decoded, name=file_name)
-        return data
+        if isinstance(data, File):
+            file = data
+        else:
+            try:  # ToDo penetrate in order test if it has any security flaws
+                file = ContentFile(base64.b64decode(data))
+            except TypeError:
+                raise serializers.ValidationError(
+                    _('Not a valid base64 file')
+                )
+
+        check_file_size(file.size)
+        header = file.read(MIME_SNIFF_SIZE)
+        file.seek(0)
+        file.content_type, file_ext = detect_content_type(header)
+        file.name = "{0}{1}".format(uuid.uuid4(), file_ext)
+        if not getattr(file, 'sha256', None):
+            file.sha256 = file_sha256(file)
+        return file
 
 
 class ResourceSerializer(serializers.Serializer):
@@ -60,54 +102,113 @@ class ResourceSerializer(serializers.Serializer):
             raise serializers.ValidationError(
                 _("`resource` has to contain exactly one of field"),
             )
+        file = attrs.get('file')
+        if file:
+            attrs.update(content_type=file.content_type, size=file.size, sha256=file.sha256)
         return super(ResourceSerializer, self).validate(attrs)
 
 
+class BulkAddSecretSerializer(serializers.ListSerializer):
+    """Creates secrets of all items in one transaction with bulk INSERTs of SECRET_BULK_BATCH_SIZE rows.
+    Nothing is created when any item is invalid, errors are reported per item in input order.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, list) and len(data) > settings.SECRET_BULK_MAX_ITEMS:
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    _('Ensure there are no more than %(max)d secrets') % {'max': settings.SECRET_BULK_MAX_ITEMS}
+                ]
+            })
+        return super(BulkAddSecretSerializer, self).to_internal_value(data)
+
+    def create(self, validated_data):
+        """Create and return list of 'Secret' instances, given the validated data.
+        """
+        secrets = []
+        batch_size = settings.SECRET_BULK_BATCH_SIZE
+        with transaction.atomic():
+            for start in range(0, len(validated_data), batch_size):
+                resources = [Resource(**item['resource']) for item in validated_data[start:start + batch_size]]
+                try:
+                    if connection.features.can_return_rows_from_bulk_insert:
+                        Resource.objects.bulk_create(resources)
+                    else:  # primary keys of inserted rows are needed for secrets
+                        for resource in resources:
+                            resource.save()
+                finally:
+                    for resource in resources:
+                        if resource.file:
+                            resource.file.close()
+                secrets += Secret.objects.bulk_create([Secret(resource=resource) for resource in resources])
+            access_names = [secret.access_name for secret in secrets]
+            transaction.on_commit(lambda: add_access_names(access_names))
+        return secrets
+
+
 class AddSecretSerializer(serializers.Serializer):
     created = serializers.DateTimeField(read_only=True)
     resource = ResourceSerializer(write_only=True)
     access_name = serializers.CharField(read_only=True)
     access_code = serializers.CharField(read_only=True)
 
+    class Meta:
+        list_serializer_class = BulkAddSecretSerializer
+
     def create(self, validated_data):
         """Create and return 'Secret' instance, given the validated data.
         """
-        resource = Resource.objects.create(**validated_data.get("resource"))
+        resource_data = validated_data.get("resource")
+        try:
+            resource = Resource.objects.create(**resource_data)
+        finally:
+            if resource_data.get('file'):  # temporary upload may be already moved to storage
+                resource_data['file'].close()
         return Secret.objects.create(resource=resource)
 
 
 class AccessSecretSerializer(serializers.Serializer):
     resource = ResourceSerializer(read_only=True)
     access_code = serializers.CharField(write_only=True, required=True)
+    download_token = serializers.SerializerMethodField()
+
+    def get_download_token(self, instance):
+        """Returns token for range requests to download endpoint if secret is a file.
+        """
+        return make_download_token(instance.access_name) if instance.resource.file else None
 
     def update(self, instance, validated_data):
         """Update and return 'Secret' instance, given the validated data.
         """
-        if instance.access_code != validated_data.get('access_code'):
-            raise serializers.ValidationError(
+        access_code = validated_data.get('access_code')
+        if settings.ACCESS_COUNTER_BUFFERED and instance.check_access_code(access_code) and instance.is_available():
+            if buffer_access(instance):
+                return instance
+
+        if instance.register_accesses(queryset=Secret.objects.available().filter(access_code=access_code)):
+            return instance
+
+        if not instance.check_access_code(access_code):
+            raise WrongAccessCodeError(
                 _("Wrong access code"),
             )
 
-        if timezone.now() - instance.created > timedelta(hours=24):
-            raise GoneValidationError(
-                _("Secret is no longer available"),
-            )
+        raise GoneValidationError(
+            _("Secret is no longer available"),
+        )
 
-        instance.number_of_accesses += 1
-        instance.save()
-        return instance
 
+class UploadSessionSerializer(serializers.ModelSerializer):
 
-class StatisticsSerializer(serializers.Serializer):
-    created = serializers.DateTimeField(read_only=True)
-    resource = serializers.StringRelatedField(read_only=True)
-    number_of_accesses = serializers.IntegerField(read_only=True)
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'size', 'offset', 'created']
+        read_only_fields = ['id', 'offset', 'created']
 
-    def to_representation(self, instance):
-        """Returns representation for statistics purpose.
-        Output format: ('DATE', 'RESOURCE_TYPE') e.g. ('2020-04-08', 'FILE')
-        """
-        representation = super(StatisticsSerializer, self).to_representation(instance)
-        if representation.get('number_of_accesses') > 0:
-            return representation.get('created')[:10], representation.get('resource')
-        return ()
+    def validate_size(self, value):
+        if value < 1:
+            raise serializers.ValidationError(
+                _('Upload has to contain at least one byte')
+            )
+        check_file_size(value)
+        return value
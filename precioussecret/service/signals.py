@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from precioussecret.service.authentication import invalidate_tokens
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    key, user_pk = instance.key, instance.user_id
+    transaction.on_commit(lambda: invalidate_tokens([key], user_pks=[user_pk]))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    """Removes cached tokens of changed user, e.g. deactivated one, once the change is committed.
+    Logins only update `last_login`.
+    """
+    if created or update_fields == frozenset(['last_login']):
+        return
+    keys = list(Token.objects.filter(user=instance).values_list('key', flat=True))
+    if keys:
+        transaction.on_commit(lambda: invalidate_tokens(keys))
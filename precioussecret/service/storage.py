@@ -0,0 +1,186 @@
+"""Content-addressed and compressed file storages.
+
+Enable with `DEFAULT_FILE_STORAGE = 'precioussecret.service.storage.ContentAddressedStorage'`. Files are
+stored under their SHA-256 digest, so identical uploads share one file. The file is freed when no
+`Resource` references it any more, which makes the reference count a single indexed query instead of a
+counter that could drift from the rows.
+
+`CompressedStorage` and `CompressedContentAddressedStorage` gzip files of MIME types listed in
+MEDIA_COMPRESSED_TYPES when it shrinks them at least MEDIA_COMPRESSION_MIN_RATIO times. Compressed files
+get `.gz` suffix and are decompressed while read, `open_compressed` returns their stored bytes.
+Keep one of them configured as long as compressed files are stored.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import struct
+import tempfile
+import uuid
+
+from datetime import timedelta
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from precioussecret.service.models import Resource
+from precioussecret.service.models import sharded_upload_path
+
+# Stored files younger than this are never freed, a resource referencing them may not be committed yet
+GRACE_PERIOD = timedelta(hours=1)
+
+# Files being deleted are renamed with this suffix first, see `delete_unreferenced_file`
+TOMBSTONE_SUFFIX = '.deleted'
+
+COMPRESSED_SUFFIX = '.gz'
+
+
+def is_compressed(name):
+    return name.endswith(COMPRESSED_SUFFIX)
+
+
+def original_name(name):
+    """Returns name of stored file without suffix of compression.
+    """
+    return name[:-len(COMPRESSED_SUFFIX)] if is_compressed(name) else name
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage naming files after their SHA-256 digest.
+    Every upload is written in full and then linked to its digest name, so a duplicate upload takes as long
+    as a new one and does not tell whether somebody stored the same file before.
+    """
+
+    def _save(self, name, content):
+        digest = getattr(content, 'sha256', None) or self.__digest(content)
+        target = sharded_upload_path(None, digest + ''.join(PurePosixPath(name).suffixes))
+        name = super(ContentAddressedStorage, self)._save(name, content)
+        path, target_path = self.path(name), self.path(target)
+        try:
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            while True:
+                try:
+                    os.link(path, target_path)
+                    break
+                except FileExistsError:
+                    try:
+                        os.utime(target_path)  # restart grace period of existing file
+                        break
+                    except FileNotFoundError:  # freed meanwhile
+                        continue
+        finally:
+            os.remove(path)
+        return target
+
+    def __digest(self, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        return digest.hexdigest()
+
+
+class DecompressedFile(File):
+    """Stored gzip file read as its original content.
+    """
+
+    def __init__(self, file, name):
+        self.compressed_file = file
+        super(DecompressedFile, self).__init__(gzip.GzipFile(fileobj=file, mode='rb'), original_name(name))
+        file.seek(-4, os.SEEK_END)  # gzip trailer ends with original size modulo 4 GiB
+        self.size = struct.unpack('<I', file.read(4))[0]
+        file.seek(0)
+
+    def close(self):
+        super(DecompressedFile, self).close()
+        self.compressed_file.close()
+
+
+class CompressedStorageMixin:
+    """Compresses files worth it on save and decompresses them on open.
+    """
+
+    def open_compressed(self, name):
+        """Returns stored bytes of the file without decompressing them.
+        """
+        return super(CompressedStorageMixin, self)._open(name, 'rb')
+
+    def _open(self, name, mode='rb'):
+        file = super(CompressedStorageMixin, self)._open(name, mode)
+        if is_compressed(name):
+            return DecompressedFile(file, name)
+        return file
+
+    def _save(self, name, content):
+        compressed = self.__compress(name, content)
+        if compressed is None:
+            return super(CompressedStorageMixin, self)._save(name, content)
+        with compressed:
+            return super(CompressedStorageMixin, self)._save(name + COMPRESSED_SUFFIX, compressed)
+
+    def __compress(self, name, content):
+        """Returns gzipped content in a temporary file or None when it is not compressible enough.
+        """
+        content_type = getattr(content, 'content_type', None) or mimetypes.guess_type(name)[0] or ''
+        if not content.size or not content_type.startswith(tuple(settings.MEDIA_COMPRESSED_TYPES)):
+            return None
+
+        compressed = tempfile.TemporaryFile()
+        with gzip.GzipFile(fileobj=compressed, mode='wb', mtime=0) as gzip_file:
+            for chunk in content.chunks():
+                gzip_file.write(chunk)
+        content.seek(0)
+        if compressed.tell() * settings.MEDIA_COMPRESSION_MIN_RATIO > content.size:
+            compressed.close()
+            return None
+        compressed.seek(0)
+        return File(compressed)
+
+
+class CompressedStorage(CompressedStorageMixin, FileSystemStorage):
+    pass
+
+
+class CompressedContentAddressedStorage(CompressedStorageMixin, ContentAddressedStorage):
+    pass
+
+
+def delete_unreferenced_file(name, storage=default_storage):
+    """Deletes stored file unless a resource references it or it was stored within GRACE_PERIOD.
+    Returns True when the file was deleted.
+    """
+    if Resource.objects.filter(file=name).exists():
+        return False
+    try:
+        if storage.get_modified_time(name) > timezone.now() - GRACE_PERIOD:
+            return False
+    except FileNotFoundError:
+        return False
+    if not isinstance(storage, FileSystemStorage):
+        storage.delete(name)
+        return True
+
+    # Duplicate upload may link the file between the check and its deletion, see `ContentAddressedStorage`.
+    # The file is moved aside and checked again, so the upload either restarted its grace period before the
+    # move and the file is put back, or finds it missing and links a new copy.
+    path = storage.path(name)
+    tombstone = '{0}.{1}{2}'.format(path, uuid.uuid4().hex, TOMBSTONE_SUFFIX)
+    try:
+        os.rename(path, tombstone)
+    except FileNotFoundError:
+        return False
+    try:
+        recent = os.path.getmtime(tombstone) > (timezone.now() - GRACE_PERIOD).timestamp()
+        if not recent and not Resource.objects.filter(file=name).exists():
+            return True
+        try:
+            os.link(tombstone, path)
+        except FileExistsError:  # new copy was linked meanwhile
+            pass
+        return False
+    finally:
+        os.remove(tombstone)
@@ -0,0 +1,86 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.test import RequestFactory
+from django.test import TransactionTestCase
+from django.test import override_settings
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from precioussecret.service import authentication
+from precioussecret.service.authentication import get_user_token_key
+from precioussecret.service.authentication import token_cache_key
+from precioussecret.service.views import StatisticsView
+
+
+@override_settings(
+    AUTH_TOKEN_CACHE='default',
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class CachedTokenAuthenticationTest(TransactionTestCase):
+    """Test module for token authentication through cache.
+    """
+
+    def setUp(self):
+        cache.clear()
+        authentication._local.clear()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username='test', password='test')
+        self.token = Token.objects.create(user=self.user)
+
+    def __statistics(self, key=None):
+        request = self.factory.get('N/A', HTTP_AUTHORIZATION='Token {0}'.format(key or self.token.key))
+        return StatisticsView.as_view()(request)
+
+    def test_cached_token_is_not_queried(self):
+        with self.assertNumQueries(2):  # token with user, statistics
+            self.assertEqual(status.HTTP_200_OK, self.__statistics().status_code)
+        with self.assertNumQueries(1):
+            self.assertEqual(status.HTTP_200_OK, self.__statistics().status_code)
+
+    def test_shared_cache_is_used_by_other_processes(self):
+        self.__statistics()
+        authentication._local.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(status.HTTP_200_OK, self.__statistics().status_code)
+
+    def test_password_hash_is_not_cached(self):
+        self.__statistics()
+        self.assertEqual(
+            {'id': self.user.pk, 'is_active': True, 'is_staff': False}, cache.get(token_cache_key(self.token.key)),
+        )
+        authentication._local.clear()
+        user = authentication.get_token(self.token.key).user
+        self.assertEqual({'password', 'username'}, {'password', 'username'} & user.get_deferred_fields())
+        with self.assertNumQueries(1):
+            self.assertEqual('test', user.username)
+
+    def test_deleted_token_is_rejected(self):
+        self.__statistics()
+        self.token.delete()
+        self.assertEqual(status.HTTP_401_UNAUTHORIZED, self.__statistics(self.token.key).status_code)
+
+    def test_token_is_invalidated_on_commit(self):
+        self.__statistics()
+        cache_key = token_cache_key(self.token.key)
+        with transaction.atomic():
+            self.token.delete()
+            self.assertIsNotNone(cache.get(cache_key))
+        self.assertIsNone(cache.get(cache_key))
+
+    def test_deactivated_user_is_rejected(self):
+        self.__statistics()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(status.HTTP_401_UNAUTHORIZED, self.__statistics().status_code)
+
+    def test_invalid_token_is_rejected(self):
+        self.assertEqual(status.HTTP_401_UNAUTHORIZED, self.__statistics('0' * 40).status_code)
+
+    def test_user_token_key_is_cached(self):
+        self.assertEqual(self.token.key, get_user_token_key(self.user))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.token.key, get_user_token_key(self.user))
+        self.token.delete()
+        self.assertNotEqual(self.token.key, get_user_token_key(self.user))
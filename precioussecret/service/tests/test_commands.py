@@ -0,0 +1,301 @@
+import io
+import os
+import shutil
+import tempfile
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import RequestFactory
+from django.test import TestCase
+from django.test import override_settings
+from django.utils import timezone
+
+from rest_framework import status
+
+from precioussecret.service.lookups import get_secret
+from precioussecret.service.management.commands.reconcile_media import CURSOR_FILE
+from precioussecret.service.management.commands.reconcile_media import walk_storage
+from precioussecret.service.models import SECRET_LIFETIME
+from precioussecret.service.models import DailyAccessStats
+from precioussecret.service.models import Resource
+from precioussecret.service.models import Secret
+from precioussecret.service.storage import GRACE_PERIOD
+from precioussecret.service.views import StatisticsView
+
+
+class RebuildStatisticsCommandTest(TestCase):
+    """Test module for rebuilding statistics rollup.
+    """
+
+    def setUp(self):
+        self.secret = Secret.objects.create(
+            resource=Resource.objects.create(
+                url='https://www.google.com/'
+            ),
+            number_of_accesses=3
+        )
+        Secret.objects.create(
+            resource=Resource.objects.create(
+                url='https://www.google.com/'
+            )
+        )
+
+    def test_rebuild(self):
+        DailyAccessStats.objects.create(date=timezone.localdate(), resource_type=Resource.FILE, count=7)
+        call_command('rebuild_statistics', stdout=io.StringIO())
+        statistics = DailyAccessStats.objects.get()
+        self.assertEqual(timezone.localdate(self.secret.created), statistics.date)
+        self.assertEqual(Resource.URL, statistics.resource_type)
+        self.assertEqual(1, statistics.count)
+
+    def test_check_consistent(self):
+        call_command('rebuild_statistics', stdout=io.StringIO())
+        out = io.StringIO()
+        call_command('rebuild_statistics', check=True, stdout=out)
+        self.assertIn('consistent', out.getvalue())
+
+    def test_check_inconsistent(self):
+        out = io.StringIO()
+        with self.assertRaises(CommandError):
+            call_command('rebuild_statistics', check=True, stdout=out)
+        self.assertIn('expected 1, found 0', out.getvalue())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class PurgeExpiredSecretsCommandTest(TestCase):
+    """Test module for purging expired secrets.
+    """
+
+    def setUp(self):
+        self.expired_url = Secret.objects.create(
+            resource=Resource.objects.create(
+                url='https://www.google.com/'
+            )
+        )
+        self.expired_file = Secret.objects.create(
+            resource=Resource.objects.create(
+                file=ContentFile(b'my precious', name='sample.txt')
+            )
+        )
+        Secret.objects.filter(pk__in=[self.expired_url.pk, self.expired_file.pk]).update(
+            created=timezone.now() - SECRET_LIFETIME - timedelta(minutes=1)
+        )
+        self.expired_file.refresh_from_db()
+        self.expired_file.register_accesses()
+        self.available = Secret.objects.create(
+            resource=Resource.objects.create(
+                url='https://www.google.com/'
+            )
+        )
+        self.available.register_accesses()
+        self.file_name = self.expired_file.resource.file.name
+        old = (timezone.now() - SECRET_LIFETIME).timestamp()
+        os.utime(default_storage.path(self.file_name), (old, old))
+        self.user = User.objects.create_user(username='test', password='test')
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def __statistics(self):
+        request = RequestFactory().get('N/A')
+        request.user = self.user
+        response = StatisticsView.as_view()(request)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return response.data
+
+    def test_purge(self):
+        statistics = {
+            str(timezone.localdate(self.expired_file.created)): {'files': 1, 'links': 0},
+            str(timezone.localdate(self.available.created)): {'files': 0, 'links': 1},
+        }
+        self.assertEqual(statistics, self.__statistics())
+        call_command('purge_expired_secrets', batch_size=1, stdout=io.StringIO())
+
+        self.assertEqual([self.available.pk], list(Secret.objects.values_list('pk', flat=True)))
+        self.assertEqual([self.available.resource.pk], list(Resource.objects.values_list('pk', flat=True)))
+        self.assertFalse(default_storage.exists(self.file_name))
+        self.assertEqual(statistics, self.__statistics())
+
+        call_command('purge_expired_secrets', stdout=io.StringIO())
+        self.assertEqual(statistics, self.__statistics())
+        call_command('rebuild_statistics', check=True, stdout=io.StringIO())
+        call_command('rebuild_statistics', stdout=io.StringIO())
+        self.assertEqual(statistics, self.__statistics())
+
+    def test_dry_run(self):
+        out = io.StringIO()
+        call_command('purge_expired_secrets', dry_run=True, stdout=out)
+        self.assertIn('Would purge 2 secret(s) with 1 file(s).', out.getvalue())
+        self.assertEqual(3, Secret.objects.count())
+        self.assertTrue(default_storage.exists(self.file_name))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ReconcileMediaCommandTest(TestCase):
+    """Test module for reconciling media files with resources.
+    """
+
+    def setUp(self):
+        self.secret = Secret.objects.create(
+            resource=Resource.objects.create(
+                file=ContentFile(b'my precious', name='b.txt')
+            )
+        )
+        self.dangling = Secret.objects.create(
+            resource=Resource.objects.create(
+                file=ContentFile(b'my precious', name='c.txt')
+            )
+        )
+        default_storage.delete(self.dangling.resource.file.name)
+        self.orphans = [default_storage.save(name, ContentFile(b'my precious')) for name in ['a.txt', 'd/e.txt']]
+        for name in self.orphans:
+            old = (timezone.now() - timedelta(days=1)).timestamp()
+            os.utime(default_storage.path(name), (old, old))
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def test_report(self):
+        out = io.StringIO()
+        call_command('reconcile_media', stdout=out)
+        self.assertIn('Orphaned file: a.txt', out.getvalue())
+        self.assertIn('Orphaned file: d/e.txt', out.getvalue())
+        self.assertNotIn('b.txt', out.getvalue())
+        self.assertIn('Resource {0} has missing file.'.format(self.dangling.resource.pk), out.getvalue())
+        self.assertTrue(all(default_storage.exists(name) for name in self.orphans))
+        self.assertEqual(2, Secret.objects.count())
+
+    def test_new_files_are_skipped(self):
+        default_storage.save('f.txt', ContentFile(b'my precious'))
+        out = io.StringIO()
+        call_command('reconcile_media', stdout=out)
+        self.assertNotIn('f.txt', out.getvalue())
+
+    def test_resume(self):
+        out = io.StringIO()
+        call_command('reconcile_media', limit=1, batch_size=1, stdout=out)
+        self.assertIn('Orphaned file: a.txt', out.getvalue())
+        self.assertNotIn('d/e.txt', out.getvalue())
+        self.assertIn("Next file cursor: 'a.txt'", out.getvalue())
+
+        out = io.StringIO()
+        call_command('reconcile_media', limit=2, stdout=out)
+        self.assertNotIn('a.txt', out.getvalue())
+        self.assertNotIn(CURSOR_FILE, out.getvalue())
+        self.assertIn('Orphaned file: d/e.txt', out.getvalue())
+        self.assertIn('Resource {0} has missing file.'.format(self.dangling.resource.pk), out.getvalue())
+
+        out = io.StringIO()
+        call_command('reconcile_media', file_cursor='', resource_cursor=0, stdout=out)
+        self.assertIn('Orphaned file: a.txt', out.getvalue())
+        self.assertIn("Next file cursor: '', next resource cursor: 0", out.getvalue())
+
+    def test_walk_in_chunks(self):
+        default_storage.save('d.txt', ContentFile(b'my precious'))
+        names = sorted(['a.txt', 'd.txt', 'd/e.txt', self.secret.resource.file.name])
+        self.assertEqual(names, list(walk_storage(default_storage, chunk_size=1)))
+        self.assertEqual(names[2:], list(walk_storage(default_storage, names[1], chunk_size=1)))
+
+    def test_delete(self):
+        call_command('reconcile_media', delete=True, stdout=io.StringIO())
+        self.assertFalse(any(default_storage.exists(name) for name in self.orphans))
+        self.assertTrue(default_storage.exists(self.secret.resource.file.name))
+        self.assertEqual([self.secret.pk], list(Secret.objects.values_list('pk', flat=True)))
+        self.assertEqual([self.secret.resource.pk], list(Resource.objects.values_list('pk', flat=True)))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ShardMediaCommandTest(TestCase):
+    """Test module for moving media files into sharded directories.
+    """
+
+    def setUp(self):
+        with override_settings(MEDIA_SHARD_DEPTH=0):
+            self.resource = Resource.objects.create(
+                file=ContentFile(b'my precious', name='abcdef.txt')
+            )
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def test_flat_file_resolves(self):
+        self.assertEqual('abcdef.txt', self.resource.file.name)
+        self.resource.refresh_from_db()
+        self.assertEqual(b'my precious', self.resource.file.read())
+
+    def test_upload_is_sharded(self):
+        resource = Resource.objects.create(file=ContentFile(b'my precious', name='012345.txt'))
+        self.assertEqual('01/23/012345.txt', resource.file.name)
+
+    def test_dry_run(self):
+        out = io.StringIO()
+        call_command('shard_media', dry_run=True, stdout=out)
+        self.assertIn('Would move abcdef.txt to ab/cd/abcdef.txt', out.getvalue())
+        self.assertTrue(default_storage.exists('abcdef.txt'))
+
+    def __age(self, name):
+        old = (timezone.now() - GRACE_PERIOD - timedelta(minutes=1)).timestamp()
+        os.utime(default_storage.path(name), (old, old))
+
+    @override_settings(
+        SECRET_LOOKUP_CACHE='default',
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    )
+    def test_cached_secret_follows_move(self):
+        cache.clear()
+        secret = Secret.objects.create(resource=self.resource)
+        get_secret(secret.access_name)
+        self.__age('abcdef.txt')
+        call_command('shard_media', stdout=io.StringIO())
+        file = get_secret(secret.access_name).resource.file
+        self.assertEqual('ab/cd/abcdef.txt', file.name)
+        self.assertEqual(b'my precious', file.read())
+        file.close()
+
+    def test_move(self):
+        self.__age('abcdef.txt')
+        call_command('shard_media', stdout=io.StringIO())
+        self.resource.refresh_from_db()
+        self.assertEqual('ab/cd/abcdef.txt', self.resource.file.name)
+        self.assertEqual(b'my precious', self.resource.file.read())
+        self.assertFalse(default_storage.exists('abcdef.txt'))
+
+        out = io.StringIO()
+        call_command('shard_media', stdout=out)
+        self.assertIn('Moved 0 file(s).', out.getvalue())
+
+    def test_interrupted_move(self):
+        default_storage.save('ab/cd/abcdef.txt', ContentFile(b'my prec'))
+        call_command('shard_media', stdout=io.StringIO())
+        self.resource.refresh_from_db()
+        self.assertEqual('ab/cd/abcdef.txt', self.resource.file.name)
+        self.assertEqual(b'my precious', self.resource.file.read())
+
+    @override_settings(DEFAULT_FILE_STORAGE='precioussecret.service.storage.ContentAddressedStorage')
+    def test_move_shared_file(self):
+        with override_settings(MEDIA_SHARD_DEPTH=0):
+            resources = [
+                Resource.objects.create(file=ContentFile(b'shared precious', name=name))
+                for name in ['012345.txt', '6789ab.txt']
+            ]
+        name = resources[0].file.name
+        self.assertEqual(name, resources[1].file.name)
+        self.__age(name)
+
+        out = io.StringIO()
+        call_command('shard_media', stdout=out, stderr=out)
+        self.assertIn('Moved 3 file(s).', out.getvalue())
+        self.assertNotIn('missing', out.getvalue())
+        for resource in resources:
+            resource.refresh_from_db()
+            self.assertEqual('{0}/{1}/{2}'.format(name[:2], name[2:4], name), resource.file.name)
+            self.assertEqual(b'shared precious', resource.file.read())
+            resource.file.close()
+        self.assertFalse(default_storage.exists(name))
@@ -0,0 +1,73 @@
+import time
+
+from django.core.cache import cache
+from django.test import RequestFactory
+from django.test import TestCase
+from django.test import override_settings
+
+from rest_framework import status
+
+from precioussecret.service.counters import buffer_access
+from precioussecret.service.counters import flush_access_counters
+from precioussecret.service.models import DailyAccessStats
+from precioussecret.service.models import Resource
+from precioussecret.service.models import Secret
+from precioussecret.service.views import AccessSecretView
+
+
+@override_settings(
+    ACCESS_COUNTER_BUFFERED=True,
+    ACCESS_COUNTER_FLUSH_INTERVAL=10,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class BufferedAccessCounterTest(TestCase):
+    """Test module for write-behind access counters.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.secret = Secret.objects.create(
+            resource=Resource.objects.create(
+                url='https://www.google.com/'
+            )
+        )
+
+    def __access(self, access_code):
+        request = self.factory.put('N/A', data={'access_code': access_code}, content_type='application/json')
+        return AccessSecretView.as_view()(request, **{'access_name': self.secret.access_name})
+
+    def test_accesses_are_buffered(self):
+        for _ in range(3):
+            self.assertEqual(status.HTTP_200_OK, self.__access(self.secret.access_code).status_code)
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, self.__access('SAMPLE').status_code)
+        self.secret.refresh_from_db()
+        self.assertEqual(0, self.secret.number_of_accesses)
+
+        self.assertEqual(3, flush_access_counters(now=time.time() + 30))
+        self.secret.refresh_from_db()
+        self.assertEqual(3, self.secret.number_of_accesses)
+        self.assertEqual(1, DailyAccessStats.objects.get().count)
+
+    def test_open_bucket_is_not_flushed(self):
+        now = time.time()
+        buffer_access(self.secret, now=now)
+        self.assertEqual(0, flush_access_counters(now=now))
+        self.assertEqual(1, flush_access_counters(now=now + 30))
+        self.assertEqual(0, flush_access_counters(now=now + 60))
+        self.secret.refresh_from_db()
+        self.assertEqual(1, self.secret.number_of_accesses)
+
+    def test_later_accesses_are_flushed(self):
+        now = time.time()
+        buffer_access(self.secret, now=now)
+        buffer_access(self.secret, now=now)
+        self.assertEqual(2, flush_access_counters(now=now + 30))
+        buffer_access(self.secret, now=now + 30)
+        self.assertEqual(1, flush_access_counters(now=now + 60))
+        self.secret.refresh_from_db()
+        self.assertEqual(3, self.secret.number_of_accesses)
+
+    def test_flush_is_exclusive(self):
+        cache.add('access-counter:lock', True)
+        self.assertIsNone(flush_access_counters())
@@ -0,0 +1,95 @@
+import os
+import re
+import shutil
+import tempfile
+
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.test import RequestFactory
+from django.test import TestCase
+from django.test import override_settings
+
+from rest_framework import status
+
+from precioussecret.service.models import Resource
+from precioussecret.service.models import Secret
+from precioussecret.service.views import AccessSecretView
+
+NGINX_CONF = os.path.join(settings.BASE_DIR, 'deploy', 'nginx.conf')
+
+
+class NginxStandIn:
+    """Resolves `X-Accel-Redirect` the way nginx does with internal locations of deploy/nginx.conf.
+    Aliases pointing to media are replaced with MEDIA_ROOT of the test.
+    """
+    location_re = re.compile(r'location\s+(\S+)\s*\{([^}]*)\}')
+
+    def __init__(self, media_root):
+        with open(NGINX_CONF) as conf:
+            locations = self.location_re.findall(conf.read())
+        self.internal = {
+            prefix: media_root for prefix, body in locations
+            if re.search(r'^\s*internal;', body, re.M) and re.search(r'^\s*alias\s+\S*/media/;', body, re.M)
+        }
+        self.public_media = [prefix for prefix, body in locations if '/media/' in body and prefix not in self.internal]
+
+    def send(self, response):
+        """Returns body nginx would send for the upstream response.
+        """
+        uri = response['X-Accel-Redirect']
+        for prefix, root in self.internal.items():
+            if uri.startswith(prefix):
+                with open(os.path.join(root, unquote(uri[len(prefix):])), 'rb') as file:
+                    return file.read()
+        raise AssertionError('No internal location for {0}'.format(uri))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class FileDeliveryTest(TestCase):
+    """Test module for sending files by front web server.
+    """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.content = b'my precious' * 10000
+        self.secret = Secret.objects.create(
+            resource=Resource.objects.create(
+                file=ContentFile(self.content, name='sample.txt')
+            )
+        )
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def __access(self):
+        data = {'access_code': self.secret.access_code}
+        request = self.factory.put('N/A', data=data, content_type='application/json', HTTP_ACCEPT='application/octet-stream')
+        response = AccessSecretView.as_view()(request, **{'access_name': self.secret.access_name})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(1, Secret.objects.get(pk=self.secret.pk).number_of_accesses)
+        return response
+
+    @override_settings(FILE_DELIVERY='x-accel-redirect')
+    def test_x_accel_redirect(self):
+        nginx = NginxStandIn(settings.MEDIA_ROOT)
+        self.assertEqual([settings.FILE_DELIVERY_ACCEL_PREFIX], list(nginx.internal))
+        self.assertEqual([], nginx.public_media)
+
+        response = self.__access()
+        self.assertFalse(response.streaming)
+        self.assertEqual(b'', response.content)
+        self.assertEqual('text/plain', response['Content-Type'])
+        self.assertIn('{0}.txt'.format(self.secret.access_name), response['Content-Disposition'])
+        self.assertEqual(self.content, nginx.send(response))
+
+    @override_settings(FILE_DELIVERY='x-sendfile')
+    def test_x_sendfile(self):
+        response = self.__access()
+        self.assertEqual(os.path.join(settings.MEDIA_ROOT, self.secret.resource.file.name), response['X-Sendfile'])
+
+    def test_python_fallback(self):
+        response = self.__access()
+        self.assertFalse(response.has_header('X-Accel-Redirect'))
+        self.assertEqual(self.content, b''.join(response.streaming_content))
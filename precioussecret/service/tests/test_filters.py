@@ -0,0 +1,102 @@
+import uuid
+
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory
+from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test import override_settings
+
+from rest_framework import status
+
+from precioussecret.service import filters
+from precioussecret.service.filters import BloomFilter
+from precioussecret.service.filters import journal_key
+from precioussecret.service.models import Resource
+from precioussecret.service.models import Secret
+from precioussecret.service.views import AccessSecretView
+
+
+class BloomFilterTest(TestCase):
+    """Test module for Bloom filter.
+    """
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter.for_capacity(1000, 0.01)
+        names = [str(uuid.uuid4()) for _ in range(1000)]
+        for name in names:
+            bloom.add(name)
+        self.assertTrue(all(name in bloom for name in names))
+
+        false_positives = sum(str(uuid.uuid4()) in bloom for _ in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+@override_settings(
+    SECRET_LOOKUP_CACHE=None,
+    ACCESS_FILTER_CACHE='default',
+    ACCESS_FILTER_REFRESH_INTERVAL=60,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class AccessFilterTest(TransactionTestCase):
+    """Test module for rejecting unknown access names with filter of access names.
+    """
+
+    def setUp(self):
+        cache.clear()
+        filters._local = None
+        self.factory = RequestFactory()
+        self.secret = Secret.objects.create(
+            resource=Resource.objects.create(
+                url='https://www.google.com/'
+            )
+        )
+
+    def __access(self, access_name, access_code):
+        request = self.factory.put('N/A', data={'access_code': access_code}, content_type='application/json')
+        return AccessSecretView.as_view()(request, **{'access_name': access_name})
+
+    def __rebuild(self):
+        out = StringIO()
+        call_command('rebuild_access_filter', stdout=out)
+        self.assertIn('Built filter of 1 access name(s)', out.getvalue())
+
+    def test_unknown_name_is_rejected_without_query(self):
+        self.__rebuild()
+        with self.assertNumQueries(0):
+            response = self.__access(str(uuid.uuid4()), 'SAMPLE')
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+        self.assertEqual(status.HTTP_200_OK, self.__access(self.secret.access_name, self.secret.access_code).status_code)
+
+    def test_secret_without_uuid_is_found_after_rebuild(self):
+        legacy_access_name = str(uuid.uuid4())
+        Secret.objects.filter(pk=self.secret.pk).update(access_name=None, legacy_access_name=legacy_access_name)
+        self.__rebuild()
+        self.assertEqual(status.HTTP_200_OK, self.__access(legacy_access_name, self.secret.access_code).status_code)
+
+    def test_unknown_name_is_looked_up_without_filter(self):
+        with self.assertNumQueries(1):
+            response = self.__access(str(uuid.uuid4()), 'SAMPLE')
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    def test_secret_created_after_rebuild_is_found(self):
+        self.__rebuild()
+        self.__access(str(uuid.uuid4()), 'SAMPLE')  # filter is loaded
+        secret = Secret.objects.create(resource=self.secret.resource)
+        self.assertEqual(status.HTTP_200_OK, self.__access(secret.access_name, secret.access_code).status_code)
+
+    def test_filter_fails_open_when_journal_is_evicted(self):
+        self.__rebuild()
+        self.__access(str(uuid.uuid4()), 'SAMPLE')
+        secret = Secret.objects.create(resource=self.secret.resource)
+        cache.delete(journal_key(cache.get(filters.GENERATION_KEY), 1))
+        self.assertEqual(status.HTTP_200_OK, self.__access(secret.access_name, secret.access_code).status_code)
+
+    def test_secret_created_during_rebuild_is_found(self):
+        self.__rebuild()
+        self.__access(str(uuid.uuid4()), 'SAMPLE')
+        filters.build_filter(iter([]), 100)  # next generation is being built without the new secret
+        secret = Secret.objects.create(resource=self.secret.resource)
+        self.assertEqual(status.HTTP_200_OK, self.__access(secret.access_name, secret.access_code).status_code)
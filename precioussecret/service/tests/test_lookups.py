@@ -0,0 +1,123 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory
+from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from rest_framework import status
+
+from precioussecret.service import metrics
+from precioussecret.service.lookups import get_secret
+from precioussecret.service.lookups import secret_key
+from precioussecret.service.models import Resource
+from precioussecret.service.models import Secret
+from precioussecret.service.views import AccessSecretView
+
+
+@override_settings(
+    SECRET_LOOKUP_CACHE='default',
+    METRICS_FLUSH_INTERVAL=0,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class SecretLookupTest(TestCase):
+    """Test module for cached secret lookup.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.secret = Secret.objects.create(
+            resource=Resource.objects.create(
+                url='https://www.google.com/'
+            )
+        )
+
+    def __access(self, access_code):
+        request = self.factory.put('N/A', data={'access_code': access_code}, content_type='application/json')
+        return AccessSecretView.as_view()(request, **{'access_name': self.secret.access_name})
+
+    def test_cached_secret_is_not_queried(self):
+        self.assertEqual(status.HTTP_200_OK, self.__access(self.secret.access_code).status_code)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.__access(self.secret.access_code)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertFalse([query for query in queries if query['sql'].startswith('SELECT')])
+        self.assertEqual('https://www.google.com/', response.data['resource']['url'])
+        self.secret.refresh_from_db()
+        self.assertEqual(2, self.secret.number_of_accesses)
+
+    @override_settings(ACCESS_COUNTER_BUFFERED=True, ACCESS_COUNTER_FLUSH_INTERVAL=10)
+    def test_buffered_access_of_cached_secret_is_not_queried(self):
+        get_secret(self.secret.access_name)
+        with self.assertNumQueries(0):
+            self.assertEqual(status.HTTP_200_OK, self.__access(self.secret.access_code).status_code)
+
+    def test_wrong_access_code_of_cached_secret(self):
+        get_secret(self.secret.access_name)
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, self.__access('SAMPLE').status_code)
+        self.secret.refresh_from_db()
+        self.assertEqual(0, self.secret.number_of_accesses)
+
+    def test_cached_secret_keeps_only_hash_of_access_code(self):
+        get_secret(self.secret.access_name)
+        self.assertNotIn(self.secret.access_code, str(cache.get(secret_key(self.secret.access_name))))
+
+    def test_expired_secret_is_not_cached(self):
+        Secret.objects.filter(pk=self.secret.pk).update(created=timezone.now() - timedelta(days=2))
+        self.assertEqual(status.HTTP_410_GONE, self.__access(self.secret.access_code).status_code)
+        self.assertIsNone(cache.get(secret_key(self.secret.access_name)))
+
+    def test_hits_and_misses_are_counted(self):
+        metrics.flush()
+        before = metrics.snapshot()
+        for _ in range(3):
+            get_secret(self.secret.access_name)
+        after = metrics.snapshot()
+        self.assertEqual(1, after['secret_cache.miss'] - before.get('secret_cache.miss', 0))
+        self.assertEqual(2, after['secret_cache.hit'] - before.get('secret_cache.hit', 0))
+
+        out = StringIO()
+        call_command('show_metrics', stdout=out)
+        self.assertIn('secret_cache.hit 2', out.getvalue())
+
+
+@override_settings(
+    SECRET_LOOKUP_CACHE='default',
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class SecretLookupInvalidationTest(TransactionTestCase):
+    """Test module for removing changed secrets from cache once transaction is committed.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.secret = Secret.objects.create(
+            resource=Resource.objects.create(
+                url='https://www.google.com/'
+            )
+        )
+
+    def __access(self, access_code):
+        request = self.factory.put('N/A', data={'access_code': access_code}, content_type='application/json')
+        return AccessSecretView.as_view()(request, **{'access_name': self.secret.access_name})
+
+    def test_purge_invalidates_cache(self):
+        get_secret(self.secret.access_name)
+        Secret.objects.filter(pk=self.secret.pk).update(created=timezone.now() - timedelta(days=2))
+        Secret.objects.expired().purge()
+        self.assertIsNone(cache.get(secret_key(self.secret.access_name)))
+        self.assertEqual(status.HTTP_404_NOT_FOUND, self.__access(self.secret.access_code).status_code)
+
+    def test_save_invalidates_cache(self):
+        get_secret(self.secret.access_name)
+        self.secret.access_code = 'SAMPLE'
+        self.secret.save()
+        self.assertEqual(status.HTTP_200_OK, self.__access('SAMPLE').status_code)
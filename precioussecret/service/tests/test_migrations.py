@@ -0,0 +1,94 @@
+import hashlib
+import importlib
+import shutil
+import tempfile
+import uuid
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+from django.core.files.base import ContentFile
+from django.test import TestCase
+from django.test import override_settings
+
+from precioussecret.service import api
+from precioussecret.service.models import Resource
+from precioussecret.service.models import ACCESS_NAME_NAMESPACE
+from precioussecret.service.models import Secret
+
+backfill_migration = importlib.import_module('precioussecret.service.migrations.0006_backfill_resource_metadata')
+access_uuid_migration = importlib.import_module('precioussecret.service.migrations.0012_backfill_secret_access_uuid')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class BackfillResourceMetadataTest(TestCase):
+    """Test module for backfilling metadata of files uploaded before it was stored.
+    """
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def test_backfill(self):
+        content = b'my precious' * 10000
+        resource = Resource.objects.create(file=ContentFile(content, name='sample.txt'))
+        missing = Resource.objects.create(file='missing.txt')
+        url = Resource.objects.create(url='https://www.google.com/')
+
+        backfill_migration.backfill_resource_metadata(apps, None)
+
+        resource.refresh_from_db()
+        self.assertEqual('text/plain', resource.content_type)
+        self.assertEqual(len(content), resource.size)
+        self.assertEqual(hashlib.sha256(content).hexdigest(), resource.sha256)
+        missing.refresh_from_db()
+        self.assertIsNone(missing.size)
+        url.refresh_from_db()
+        self.assertIsNone(url.size)
+
+
+class SecretAccessUUIDTest(TestCase):
+    """Test module for access names stored as UUIDs.
+    """
+
+    def setUp(self):
+        self.resource = Resource.objects.create(url='https://www.google.com/')
+
+    def __legacy_secret(self, legacy_access_name):
+        """Returns secret as created by the release storing access names as strings only.
+        """
+        secret = Secret.objects.create(resource=self.resource)
+        Secret.objects.filter(pk=secret.pk).update(access_name=None, legacy_access_name=legacy_access_name)
+        return secret
+
+    def test_access_name_stored_as_uuid(self):
+        secret = Secret.objects.create(resource=self.resource)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT access_uuid, access_name FROM service_secret WHERE id = %s', [secret.pk])
+            access_uuid, legacy_access_name = cursor.fetchone()
+        self.assertEqual(16, len(access_uuid))
+        self.assertEqual(secret.access_name, legacy_access_name)
+        self.assertEqual(secret, Secret.objects.get_by_access_name(secret.access_name.upper()))
+
+    def test_backfill(self):
+        access_name = str(uuid.uuid4())
+        secret = self.__legacy_secret(access_name)
+        named = self.__legacy_secret('legacy-name')
+
+        access_uuid_migration.backfill_access_uuid(apps, None)
+
+        secret.refresh_from_db()
+        self.assertEqual(access_name, secret.access_name)
+        named.refresh_from_db()
+        self.assertEqual(str(uuid.uuid5(ACCESS_NAME_NAMESPACE, 'legacy-name')), named.access_name)
+        self.assertEqual(named, api.access_secret('legacy-name', {'access_code': named.access_code}))
+
+    def test_secret_without_uuid_is_found(self):
+        access_name = str(uuid.uuid4())
+        secret = self.__legacy_secret(access_name)
+        self.assertEqual(secret, Secret.objects.get_by_access_name(access_name))
+        secret.refresh_from_db()
+        self.assertEqual(access_name, secret.access_name)
+
+    def test_invalid_access_name_not_found(self):
+        with self.assertRaises(Secret.DoesNotExist):
+            Secret.objects.get_by_access_name('not-an-uuid')
@@ -0,0 +1,62 @@
+import base64
+import io
+import json
+import os
+
+from django.test import SimpleTestCase
+from django.test import override_settings
+
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+
+from precioussecret.service.exceptions import RequestEntityTooLargeError
+from precioussecret.service.parsers import ResourceJSONParser
+
+PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAMAAAADCAYAAABWKLW/AAAAEklEQVR42mNUaG+vZ4ACRpwcAHTuBQv2OFcqAAAAAElFTkSuQmCC'
+)
+
+
+class ResourceJSONParserTest(SimpleTestCase):
+    """Test module for streaming JSON parser of new secrets.
+    """
+
+    def __parse(self, body):
+        parser = ResourceJSONParser()
+        parser.chunk_size = 7  # split tokens and escapes between chunks
+        return parser.parse(io.BytesIO(body))
+
+    def test_file_decoded_to_temporary_file(self):
+        content = PNG + os.urandom(100000)
+        encoded = base64.b64encode(content).decode()
+        body = '{"other": ["a", {"file": "x"}], "resource": {"file": "%s"}}' % encoded.replace('/', '\\/')
+        data = self.__parse(body.encode())
+        file = data['resource']['file']
+        self.assertTrue(os.path.exists(file.temporary_file_path()))
+        self.assertEqual(len(content), file.size)
+        self.assertEqual(content, file.read())
+        self.assertEqual(['a', {'file': 'x'}], data['other'])
+        file.close()
+
+    def test_url_parsed_as_json(self):
+        data = {'resource': {'url': 'https://www.google.com/?q="file"'}}
+        self.assertEqual(data, self.__parse(json.dumps(data).encode()))
+
+    def test_forbidden_file_rejected(self):
+        encoded = base64.b64encode(b'#!/bin/sh\n' * 10000).decode()
+        with self.assertRaises(serializers.ValidationError):
+            self.__parse(json.dumps({'resource': {'file': encoded}}).encode())
+
+    def test_invalid_base64_rejected(self):
+        with self.assertRaises(serializers.ValidationError):
+            self.__parse(b'{"resource": {"file": "iVBORw0KG"}}')
+
+    def test_invalid_json_rejected(self):
+        with self.assertRaises(ParseError):
+            self.__parse(b'{"resource": {"file": "iVBORw0KGgo=')
+
+    @override_settings(MAX_SECRET_FILE_SIZE=1024)
+    def test_too_large_file_rejected(self):
+        encoded = base64.b64encode(PNG + os.urandom(2048)).decode()
+        with self.assertRaises(RequestEntityTooLargeError):
+            self.__parse(json.dumps({'resource': {'file': encoded}}).encode())
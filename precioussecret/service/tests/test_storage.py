@@ -0,0 +1,179 @@
+import gzip
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import RequestFactory
+from django.test import TestCase
+from django.test import override_settings
+from django.utils import timezone
+
+from rest_framework import status
+
+from precioussecret.service.models import SECRET_LIFETIME
+from precioussecret.service.models import Resource
+from precioussecret.service.models import Secret
+from precioussecret.service.storage import ContentAddressedStorage
+from precioussecret.service.storage import delete_unreferenced_file
+from precioussecret.service.views import AccessSecretView
+
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    DEFAULT_FILE_STORAGE='precioussecret.service.storage.ContentAddressedStorage',
+)
+class ContentAddressedStorageTest(TestCase):
+    """Test module for deduplicated file storage.
+    """
+
+    def setUp(self):
+        self.digest = hashlib.sha256(b'my precious').hexdigest()
+        self.secrets = [
+            Secret.objects.create(
+                resource=Resource.objects.create(
+                    file=ContentFile(b'my precious', name=name)
+                )
+            ) for name in ['abcdef.txt', '012345.txt']
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def __files(self):
+        return [os.path.join(path, name) for path, _, names in os.walk(settings.MEDIA_ROOT) for name in names]
+
+    def __expire(self, secret):
+        Secret.objects.filter(pk=secret.pk).update(created=timezone.now() - SECRET_LIFETIME - timedelta(minutes=1))
+
+    def __age(self, name):
+        old = (timezone.now() - SECRET_LIFETIME).timestamp()
+        os.utime(default_storage.path(name), (old, old))
+
+    def test_identical_files_are_shared(self):
+        name = '{0}/{1}/{2}.txt'.format(self.digest[:2], self.digest[2:4], self.digest)
+        self.assertEqual([name, name], [secret.resource.file.name for secret in self.secrets])
+        self.assertEqual([default_storage.path(name)], self.__files())
+        self.assertEqual(b'my precious', Resource.objects.get(pk=self.secrets[1].resource.pk).file.read())
+
+    def test_shared_file_is_freed_with_last_reference(self):
+        name = self.secrets[0].resource.file.name
+        self.__age(name)
+        self.__expire(self.secrets[0])
+        call_command('purge_expired_secrets', stdout=io.StringIO())
+        self.assertTrue(default_storage.exists(name))
+
+        self.__expire(self.secrets[1])
+        call_command('purge_expired_secrets', stdout=io.StringIO())
+        self.assertFalse(default_storage.exists(name))
+        self.assertEqual(0, Resource.objects.count())
+
+    def test_recently_stored_file_is_kept(self):
+        name = self.secrets[0].resource.file.name
+        Secret.objects.all().delete()
+        Resource.objects.all().delete()
+        self.assertFalse(delete_unreferenced_file(name))
+        self.assertTrue(default_storage.exists(name))
+
+        self.__age(name)
+        default_storage.save('other.txt', ContentFile(b'my precious'))
+        self.assertFalse(delete_unreferenced_file(name))
+        self.assertTrue(default_storage.exists(name))
+
+    def test_file_linked_during_delete_is_kept(self):
+        name = self.secrets[0].resource.file.name
+        Secret.objects.all().delete()
+        Resource.objects.all().delete()
+        self.__age(name)
+
+        class DuplicateUploadStorage(ContentAddressedStorage):
+            calls = 0
+
+            def path(self, name):  # duplicate upload restarts grace period right after the first check
+                path = super(DuplicateUploadStorage, self).path(name)
+                self.calls += 1
+                if self.calls == 2:
+                    os.utime(path)
+                return path
+
+        self.assertFalse(delete_unreferenced_file(name, storage=DuplicateUploadStorage()))
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual([default_storage.path(name)], self.__files())
+
+        self.__age(name)
+        self.assertTrue(delete_unreferenced_file(name))
+        self.assertEqual([], self.__files())
+
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    DEFAULT_FILE_STORAGE='precioussecret.service.storage.CompressedStorage',
+)
+class CompressedStorageTest(TestCase):
+    """Test module for compressed file storage.
+    """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.content = b'my precious ' * 1000
+        self.secret = Secret.objects.create(
+            resource=Resource.objects.create(
+                file=ContentFile(self.content, name='abcdef.txt'),
+                size=len(self.content),
+            )
+        )
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def __access(self, **extra):
+        request = self.factory.put(
+            'N/A', data={'access_code': self.secret.access_code}, content_type='application/json',
+            HTTP_ACCEPT='application/octet-stream', **extra
+        )
+        return AccessSecretView.as_view()(request, access_name=self.secret.access_name)
+
+    def test_compressible_file_is_compressed(self):
+        name = self.secret.resource.file.name
+        self.assertEqual('ab/cd/abcdef.txt.gz', name)
+        self.assertLess(default_storage.size(name), len(self.content))
+        with default_storage.open(name) as file:
+            self.assertEqual(len(self.content), file.size)
+            self.assertEqual(self.content, file.read())
+
+    def test_incompressible_file_is_stored_raw(self):
+        file = ContentFile(os.urandom(1000), name='012345.txt')
+        self.assertEqual('01/23/012345.txt', Resource.objects.create(file=file).file.name)
+        file = ContentFile(self.content, name='012345.png')
+        self.assertEqual('01/23/012345.png', Resource.objects.create(file=file).file.name)
+
+    def test_download_compressed(self):
+        response = self.__access(HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('gzip', response['Content-Encoding'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        body = b''.join(response.streaming_content)
+        self.assertEqual(str(len(body)), response['Content-Length'])
+        self.assertEqual(self.content, gzip.decompress(body))
+        self.assertIn('{0}.txt"'.format(self.secret.access_name), response['Content-Disposition'])
+
+    def test_download_decompressed(self):
+        response = self.__access()
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(str(len(self.content)), response['Content-Length'])
+        self.assertEqual(self.content, b''.join(response.streaming_content))
+
+    @override_settings(DEFAULT_FILE_STORAGE='precioussecret.service.storage.CompressedContentAddressedStorage')
+    def test_compressed_identical_files_are_shared(self):
+        resources = [Resource.objects.create(file=ContentFile(self.content, name=name)) for name in ['a.txt', 'b.txt']]
+        self.assertEqual(resources[0].file.name, resources[1].file.name)
+        self.assertTrue(resources[0].file.name.endswith('.txt.gz'))
+        self.assertEqual(self.content, resources[1].file.read())
@@ -0,0 +1,115 @@
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import RequestFactory
+from django.test import TestCase
+from django.test import override_settings
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import Throttled
+
+from precioussecret.service import metrics
+from precioussecret.service.models import Resource
+from precioussecret.service.models import Secret
+from precioussecret.service.throttles import AccessThrottle
+from precioussecret.service.throttles import client_ip
+from precioussecret.service.views import AccessSecretView
+
+
+@override_settings(
+    SECRET_LOOKUP_CACHE=None,
+    ACCESS_FILTER_CACHE=None,
+    ACCESS_THROTTLE_CACHE='default',
+    ACCESS_THROTTLE_WINDOW=60,
+    ACCESS_THROTTLE_NAME_LIMIT=3,
+    ACCESS_THROTTLE_IP_LIMIT=5,
+    METRICS_FLUSH_INTERVAL=0,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class AccessThrottleTest(TestCase):
+    """Test module for throttling of access code guessing.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.secret = Secret.objects.create(
+            resource=Resource.objects.create(
+                url='https://www.google.com/'
+            )
+        )
+
+    def __access(self, access_code, access_name=None, ip='10.0.0.1', **extra):
+        request = self.factory.put(
+            'N/A', data={'access_code': access_code}, content_type='application/json', REMOTE_ADDR=ip, **extra
+        )
+        return AccessSecretView.as_view()(request, **{'access_name': access_name or self.secret.access_name})
+
+    def test_wrong_codes_of_secret_are_throttled(self):
+        for _ in range(3):
+            self.assertEqual(status.HTTP_400_BAD_REQUEST, self.__access('SAMPLE').status_code)
+        with self.assertNumQueries(0):
+            response = self.__access(self.secret.access_code, ip='10.0.0.2')
+        self.assertEqual(status.HTTP_429_TOO_MANY_REQUESTS, response.status_code)
+        self.assertIn('Retry-After', response)
+
+        metrics.flush()
+        self.assertEqual(1, metrics.snapshot()['access_throttle.rejected.name'])
+
+    def test_unknown_names_are_throttled_per_address(self):
+        for _ in range(5):
+            response = self.__access('SAMPLE', access_name=str(uuid.uuid4()))
+            self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+        self.assertEqual(status.HTTP_429_TOO_MANY_REQUESTS, self.__access(self.secret.access_code).status_code)
+        self.assertEqual(status.HTTP_200_OK, self.__access(self.secret.access_code, ip='10.0.0.2').status_code)
+
+    def test_address_forwarded_by_web_client(self):
+        client = Token.objects.create(user=User.objects.create_user(username='client'))
+        staff = Token.objects.create(user=User.objects.create_user(username='staff', is_staff=True))
+        with override_settings(SECRET_SERVICE_TOKEN=client.key):
+            for _ in range(5):
+                response = self.__access(
+                    'SAMPLE', access_name=str(uuid.uuid4()), HTTP_X_CLIENT_IP='1.1.1.1',
+                    HTTP_AUTHORIZATION='Token {0}'.format(client.key),
+                )
+                self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+            self.assertEqual(status.HTTP_200_OK, self.__access(self.secret.access_code).status_code)
+            response = self.__access(
+                self.secret.access_code, HTTP_X_CLIENT_IP='1.1.1.1', HTTP_AUTHORIZATION='Token {0}'.format(staff.key),
+            )
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            response = self.__access(
+                self.secret.access_code, HTTP_X_CLIENT_IP='1.1.1.1',
+                HTTP_AUTHORIZATION='Token {0}'.format(client.key),
+            )
+            self.assertEqual(status.HTTP_429_TOO_MANY_REQUESTS, response.status_code)
+
+    def test_correct_code_is_not_counted(self):
+        for _ in range(5):
+            self.assertEqual(status.HTTP_200_OK, self.__access(self.secret.access_code).status_code)
+
+    def test_concurrent_correct_accesses_are_not_counted(self):
+        throttles = [AccessThrottle(self.secret.access_name, ip='10.0.0.1') for _ in range(10)]
+        for throttle in throttles:
+            throttle.check()  # none of them failed yet
+        throttles[0].failed()
+        AccessThrottle(self.secret.access_name).check()
+
+    def test_previous_window_is_weighted(self):
+        throttle = AccessThrottle(self.secret.access_name, now=0)
+        for _ in range(3):
+            throttle.failed()
+        AccessThrottle(self.secret.access_name, now=60 + 15).check()  # 2.25 failures remain in window
+        with self.assertRaises(Throttled):
+            AccessThrottle(self.secret.access_name, now=60).check()
+
+    @override_settings(REST_FRAMEWORK={'NUM_PROXIES': 1})
+    def test_client_ip_behind_proxy(self):
+        request = self.factory.get('N/A', HTTP_X_FORWARDED_FOR='1.1.1.1, 10.0.0.3', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual('10.0.0.3', client_ip(request))
+
+    def test_forwarded_for_is_ignored_without_proxies(self):
+        request = self.factory.get('N/A', HTTP_X_FORWARDED_FOR='1.1.1.1', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual('10.0.0.1', client_ip(request))
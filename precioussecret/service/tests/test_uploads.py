@@ -0,0 +1,170 @@
+import base64
+import io
+import os
+import shutil
+import tempfile
+import uuid
+
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import RequestFactory
+from django.test import TestCase
+from django.test import override_settings
+from django.utils import timezone
+
+from rest_framework import status
+
+from precioussecret.service.models import Secret
+from precioussecret.service.models import UploadSession
+from precioussecret.service.uploads import append_chunk
+from precioussecret.service.views import FinalizeUploadView
+from precioussecret.service.views import UploadSessionCreateView
+from precioussecret.service.views import UploadSessionView
+
+PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAMAAAADCAYAAABWKLW/AAAAEklEQVR42mNUaG+vZ4ACRpwcAHTuBQv2OFcqAAAAAElFTkSuQmCC'
+)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), UPLOAD_SESSION_ROOT=tempfile.mkdtemp())
+class ResumableUploadTest(TestCase):
+    """Test module for resumable uploads.
+    """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username='gollum', password='myprecioussss')
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(settings.UPLOAD_SESSION_ROOT, ignore_errors=True)
+
+    def __request(self, view, method, data=None, pk=None, user=None, **extra):
+        request = getattr(self.factory, method)('N/A', data=data, **extra)
+        request.user = user or self.user
+        request._dont_enforce_csrf_checks = True
+        return view.as_view()(request, **({'pk': pk} if pk else {}))
+
+    def __create(self, size):
+        response = self.__request(UploadSessionCreateView, 'post', {'size': size}, content_type='application/json')
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.assertEqual(0, response.data['offset'])
+        self.assertIn(str(response.data['id']), response['Location'])
+        return response.data['id']
+
+    def __patch(self, pk, offset, chunk):
+        return self.__request(
+            UploadSessionView, 'patch', chunk, pk, content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_upload(self):
+        pk = self.__create(len(PNG))
+        response = self.__patch(pk, 0, PNG[:40])
+        self.assertEqual(status.HTTP_204_NO_CONTENT, response.status_code)
+        self.assertEqual('40', response['Upload-Offset'])
+
+        response = self.__patch(pk, 0, PNG[:40])
+        self.assertEqual(status.HTTP_409_CONFLICT, response.status_code)
+        response = self.__request(UploadSessionView, 'head', pk=pk)
+        self.assertEqual('40', response['Upload-Offset'])
+
+        response = self.__request(FinalizeUploadView, 'post', pk=pk)
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+        self.assertEqual(status.HTTP_204_NO_CONTENT, self.__patch(pk, 40, PNG[40:]).status_code)
+        response = self.__request(FinalizeUploadView, 'post', pk=pk)
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+
+        resource = Secret.objects.get(access_name=response.data['access_name']).resource
+        self.assertEqual('image/png', resource.content_type)
+        self.assertEqual(PNG, default_storage.open(resource.file.name).read())
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual([], os.listdir(settings.UPLOAD_SESSION_ROOT))
+
+    def test_broken_chunk_is_kept(self):
+        pk = self.__create(len(PNG))
+        session = UploadSession.objects.get(pk=pk)
+
+        class BrokenStream(io.BytesIO):
+            def read(self, size=-1):
+                if self.tell():
+                    raise OSError('Connection reset')
+                return super(BrokenStream, self).read(10)
+
+        self.assertEqual(10, append_chunk(session, 0, BrokenStream(PNG), len(PNG)))
+        self.assertEqual(10, UploadSession.objects.get(pk=pk).offset)
+
+    def test_chunk_being_written_is_not_overwritten(self):
+        pk = self.__create(len(PNG))
+        UploadSession.objects.filter(pk=pk).update(writer=uuid.uuid4())
+        self.assertEqual(status.HTTP_409_CONFLICT, self.__patch(pk, 0, PNG[:40]).status_code)
+
+        UploadSession.objects.filter(pk=pk).update(updated=timezone.now() - timedelta(hours=2))
+        self.assertEqual(status.HTTP_204_NO_CONTENT, self.__patch(pk, 0, PNG[:40]).status_code)
+        self.assertIsNone(UploadSession.objects.get(pk=pk).writer)
+
+    @skipUnless(os.path.exists('/dev/full'), 'needs /dev/full')
+    def test_disk_error_does_not_move_offset(self):
+        pk = self.__create(len(PNG))
+        session = UploadSession.objects.get(pk=pk)
+        os.remove(session.path)
+        os.symlink('/dev/full', session.path)
+
+        with self.assertRaises(OSError):
+            append_chunk(session, 0, io.BytesIO(PNG), len(PNG))
+        session.refresh_from_db()
+        self.assertEqual(0, session.offset)
+        self.assertIsNone(session.writer)
+
+    def test_chunk_too_large(self):
+        pk = self.__create(10)
+        self.assertEqual(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, self.__patch(pk, 0, PNG).status_code)
+
+    @override_settings(MAX_SECRET_FILE_SIZE=10)
+    def test_upload_too_large(self):
+        response = self.__request(UploadSessionCreateView, 'post', {'size': 11}, content_type='application/json')
+        self.assertEqual(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, response.status_code)
+
+    def test_forbidden_extension(self):
+        content = b'#!/bin/sh\necho my precious\n'
+        pk = self.__create(len(content))
+        self.__patch(pk, 0, content)
+        response = self.__request(FinalizeUploadView, 'post', pk=pk)
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertFalse(Secret.objects.exists())
+        self.assertEqual([str(pk)], [str(pk) for pk in UploadSession.objects.values_list('pk', flat=True)])
+        self.assertEqual([str(pk)], os.listdir(settings.UPLOAD_SESSION_ROOT))
+
+        self.assertEqual(status.HTTP_204_NO_CONTENT, self.__request(UploadSessionView, 'delete', pk=pk).status_code)
+        self.assertEqual([], os.listdir(settings.UPLOAD_SESSION_ROOT))
+
+    def test_other_user(self):
+        pk = self.__create(len(PNG))
+        user = User.objects.create_user(username='smeagol', password='myprecioussss')
+        self.assertEqual(status.HTTP_404_NOT_FOUND, self.__request(UploadSessionView, 'head', pk=pk, user=user).status_code)
+
+    def test_abort(self):
+        pk = self.__create(len(PNG))
+        self.assertEqual(status.HTTP_204_NO_CONTENT, self.__request(UploadSessionView, 'delete', pk=pk).status_code)
+        self.assertEqual([], os.listdir(settings.UPLOAD_SESSION_ROOT))
+
+    def test_purge(self):
+        old = self.__create(len(PNG))
+        new = self.__create(len(PNG))
+        UploadSession.objects.filter(pk=old).update(updated=timezone.now() - timedelta(days=2))
+        stray = os.path.join(settings.UPLOAD_SESSION_ROOT, 'stray')
+        open(stray, 'wb').close()
+        two_days_ago = (timezone.now() - timedelta(days=2)).timestamp()
+        os.utime(stray, (two_days_ago, two_days_ago))
+
+        out = io.StringIO()
+        call_command('purge_upload_sessions', stdout=out)
+        self.assertIn('Purged 1 upload(s) and 1 stray file(s).', out.getvalue())
+        self.assertEqual([str(new)], [str(pk) for pk in UploadSession.objects.values_list('pk', flat=True)])
+        self.assertEqual([str(new)], os.listdir(settings.UPLOAD_SESSION_ROOT))
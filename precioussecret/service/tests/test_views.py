@@ -1,19 +1,34 @@
+import base64
+import hashlib
+import io
 import shutil
+import tempfile
+import threading
 
 from datetime import timedelta
 
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db import OperationalError
 from django.test import RequestFactory
 from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test import override_settings
 from django.utils import timezone
 
 from rest_framework import status
 
+from precioussecret.service.models import DailyAccessStats
 from precioussecret.service.models import Resource
 from precioussecret.service.models import Secret
 from precioussecret.service.views import AddSecretView
 from precioussecret.service.views import AccessSecretView
+from precioussecret.service.views import BulkAddSecretView
+from precioussecret.service.views import DownloadSecretView
 from precioussecret.service.views import StatisticsView
 
 
@@ -22,6 +37,7 @@ class AddSecretViewTest(TestCase):
     """
 
     settings.MEDIA_ROOT += '_test'
+    png_base64 = 'iVBORw0KGgoAAAANSUhEUgAAAAMAAAADCAYAAABWKLW/AAAAEklEQVR42mNUaG+vZ4ACRpwcAHTuBQv2OFcqAAAAAElFTkSuQmCC'
 
     def setUp(self):
         self.user = User.objects.create_user(
@@ -59,6 +75,43 @@ class AddSecretViewTest(TestCase):
         request.user = self.user
         response = AddSecretView.as_view()(request)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        resource = Secret.objects.get(access_name=response.data.get('access_name')).resource
+        self.assertEqual('image/png', resource.content_type)
+        self.assertEqual(hashlib.sha256(base64.b64decode(self.png_base64)).hexdigest(), resource.sha256)
+
+    def test_file_secret_created_multipart(self):
+        data = {
+            'resource.file': SimpleUploadedFile('sample.png', base64.b64decode(self.png_base64))
+        }
+        request = self.factory.post('N/A', data=data)
+        request._dont_enforce_csrf_checks = True
+        request.user = self.user
+        response = AddSecretView.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        resource = Secret.objects.get(access_name=response.data.get('access_name')).resource
+        self.assertTrue(resource.file.name.endswith('.png'))
+        self.assertEqual(base64.b64decode(self.png_base64), resource.file.read())
+        self.assertEqual('image/png', resource.content_type)
+        self.assertEqual(len(base64.b64decode(self.png_base64)), resource.size)
+        self.assertEqual(hashlib.sha256(base64.b64decode(self.png_base64)).hexdigest(), resource.sha256)
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=16)
+    def test_file_secret_created_raw(self):
+        request = self.factory.post('N/A', data=base64.b64decode(self.png_base64), content_type='application/octet-stream')
+        request._dont_enforce_csrf_checks = True
+        request.user = self.user
+        response = AddSecretView.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        resource = Secret.objects.get(access_name=response.data.get('access_name')).resource
+        self.assertTrue(resource.file.name.endswith('.png'))
+
+    def test_file_secret_raw_forbidden_extension(self):
+        request = self.factory.post('N/A', data=b'#!/bin/sh\necho precious\n', content_type='application/octet-stream')
+        request._dont_enforce_csrf_checks = True
+        request.user = self.user
+        response = AddSecretView.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Resource.objects.exists())
 
     def test_bad_request(self):
         request = self.factory.post('N/A')
@@ -79,6 +132,69 @@ class AddSecretViewTest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
 
 
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class BulkAddSecretViewTest(TestCase):
+    """Test module for adding many secrets at once.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='gollum', password='myprecioussss')
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def __post(self, data):
+        request = self.factory.post('N/A', data=data, content_type='application/json')
+        request._dont_enforce_csrf_checks = True
+        request.user = self.user
+        return BulkAddSecretView.as_view()(request)
+
+    def test_secrets_created_in_order(self):
+        data = [{'resource': {'url': 'https://www.google.com/{0}'.format(i)}} for i in range(5)]
+        data.append({'resource': {'file': AddSecretViewTest.png_base64}})
+        with self.settings(SECRET_BULK_BATCH_SIZE=2):
+            response = self.__post(data)
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.assertEqual(6, len(response.data))
+        for i, item in enumerate(response.data[:5]):
+            secret = Secret.objects.select_related('resource').get(access_name=item['access_name'])
+            self.assertEqual(item['access_code'], secret.access_code)
+            self.assertEqual('https://www.google.com/{0}'.format(i), secret.resource.url)
+        resource = Secret.objects.get(access_name=response.data[5]['access_name']).resource
+        self.assertEqual('image/png', resource.content_type)
+        self.assertTrue(resource.file.storage.exists(resource.file.name))
+
+    def test_errors_reported_per_item(self):
+        data = [
+            {'resource': {'url': 'https://www.google.com/'}},
+            {'resource': {'url': 'not an url'}},
+            {'resource': {}},
+        ]
+        response = self.__post(data)
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertEqual(3, len(response.data))
+        self.assertEqual({}, response.data[0])
+        self.assertIn('url', response.data[1]['resource'])
+        self.assertFalse(Secret.objects.exists())
+
+    @override_settings(SECRET_BULK_MAX_ITEMS=2)
+    def test_too_many_items(self):
+        response = self.__post([{'resource': {'url': 'https://www.google.com/'}}] * 3)
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertFalse(Secret.objects.exists())
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=100)
+    def test_body_too_large(self):
+        response = self.__post([{'resource': {'url': 'https://www.google.com/'}}] * 10)
+        self.assertEqual(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, response.status_code)
+
+    def test_unauthorized(self):
+        request = self.factory.post('N/A', data=[], content_type='application/json')
+        response = BulkAddSecretView.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
 class AccessSecretViewTest(TestCase):
     """Test module for adding new secret.
     """
@@ -86,6 +202,54 @@ class AccessSecretViewTest(TestCase):
     def setUp(self):
         self.factory = RequestFactory()
 
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def test_access_file_secret_raw(self):
+        content = b'my precious' * 10000
+        secret = Secret.objects.create(
+            resource=Resource.objects.create(
+                file=ContentFile(content, name='sample.txt')
+            )
+        )
+        data = {'access_code': secret.access_code}
+        request = self.factory.put('N/A', data=data, content_type='application/json', HTTP_ACCEPT='application/octet-stream')
+        response = AccessSecretView.as_view()(request, **{'access_name': secret.access_name})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertTrue(response.streaming)
+        self.assertEqual(content, b''.join(response.streaming_content))
+        self.assertEqual('text/plain', response['Content-Type'])
+        self.assertEqual(str(len(content)), response['Content-Length'])
+        self.assertIn('{0}.txt'.format(secret.access_name), response['Content-Disposition'])
+        self.assertEqual(1, Secret.objects.get(pk=secret.pk).number_of_accesses)
+
+    def test_access_url_secret_raw(self):
+        secret = Secret.objects.create(
+            resource=Resource.objects.create(
+                url='https://www.google.com/'
+            )
+        )
+        data = {'access_code': secret.access_code}
+        request = self.factory.put('N/A', data=data, content_type='application/json', HTTP_ACCEPT='application/octet-stream')
+        response = AccessSecretView.as_view()(request, **{'access_name': secret.access_name})
+        response.render()
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('application/json', response['Content-Type'])
+        self.assertEqual(secret.resource.url, response.data.get('resource').get('url'))
+
+    def test_access_secret_raw_wrong_access_code(self):
+        secret = Secret.objects.create(
+            resource=Resource.objects.create(
+                file=ContentFile(b'my precious', name='sample.txt')
+            )
+        )
+        data = {'access_code': 'SAMPLE'}
+        request = self.factory.put('N/A', data=data, content_type='application/json', HTTP_ACCEPT='application/octet-stream')
+        response = AccessSecretView.as_view()(request, **{'access_name': secret.access_name})
+        response.render()
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertEqual('application/json', response['Content-Type'])
+
     def test_access_secret_ok(self):
         secret = Secret.objects.create(
             resource=Resource.objects.create(
@@ -100,6 +264,21 @@ class AccessSecretViewTest(TestCase):
         self.assertEqual(secret.resource.url, response.data.get('resource').get('url'))
         self.assertEqual(secret.number_of_accesses + 1, updated_secret.number_of_accesses)
 
+    def test_access_secret_counted_in_statistics_once(self):
+        secret = Secret.objects.create(
+            resource=Resource.objects.create(
+                url='https://www.google.com/'
+            )
+        )
+        data = {'access_code': secret.access_code}
+        for _ in range(2):
+            request = self.factory.put('N/A', data=data, content_type='application/json')
+            AccessSecretView.as_view()(request, **{'access_name': secret.access_name})
+        statistics = DailyAccessStats.objects.get()
+        self.assertEqual(timezone.localdate(secret.created), statistics.date)
+        self.assertEqual(Resource.URL, statistics.resource_type)
+        self.assertEqual(1, statistics.count)
+
     def test_access_secret_gone(self):
         secret = Secret.objects.create(
             resource=Resource.objects.create(
@@ -191,6 +370,155 @@ class AccessSecretViewTest(TestCase):
         self.assertEqual(secret.access_code, updated_secret.access_code)
 
 
+class DownloadSecretViewTest(TestCase):
+    """Test module for downloading file of accessed secret.
+    """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.content = b'my precious' * 10000
+        self.secret = Secret.objects.create(
+            resource=Resource.objects.create(
+                file=ContentFile(self.content, name='sample.txt'),
+                sha256=hashlib.sha256(self.content).hexdigest(),
+            )
+        )
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def __download_url(self):
+        data = {'access_code': self.secret.access_code}
+        request = self.factory.put('N/A', data=data, content_type='application/json', HTTP_ACCEPT='application/octet-stream')
+        response = AccessSecretView.as_view()(request, **{'access_name': self.secret.access_name})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return response['Content-Location']
+
+    def __download(self, url, data=None, **extra):
+        request = self.factory.get(url, data=data, **extra)
+        return DownloadSecretView.as_view()(request, **{'access_name': self.secret.access_name})
+
+    def test_download_token_in_json(self):
+        data = {'access_code': self.secret.access_code}
+        request = self.factory.put('N/A', data=data, content_type='application/json')
+        response = AccessSecretView.as_view()(request, **{'access_name': self.secret.access_name})
+        self.assertTrue(response.data.get('download_token'))
+        self.assertEqual(
+            status.HTTP_200_OK,
+            self.__download('N/A', data={'token': response.data.get('download_token')}).status_code
+        )
+
+    def test_download_ranges(self):
+        url = self.__download_url()
+
+        response = self.__download(url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('bytes', response['Accept-Ranges'])
+        self.assertEqual('"{0}"'.format(self.secret.resource.sha256), response['ETag'])
+        self.assertEqual(self.content, b''.join(response.streaming_content))
+
+        response = self.__download(url, HTTP_RANGE='bytes=11-21')
+        self.assertEqual(status.HTTP_206_PARTIAL_CONTENT, response.status_code)
+        self.assertEqual('bytes 11-21/110000', response['Content-Range'])
+        self.assertEqual('11', response['Content-Length'])
+        self.assertEqual(b'my precious', b''.join(response.streaming_content))
+
+        response = self.__download(url, HTTP_RANGE='bytes=-8')
+        self.assertEqual(status.HTTP_206_PARTIAL_CONTENT, response.status_code)
+        self.assertEqual(b'precious', b''.join(response.streaming_content))
+
+        response = self.__download(url, HTTP_RANGE='bytes=0-10', HTTP_IF_RANGE=response['ETag'])
+        self.assertEqual(status.HTTP_206_PARTIAL_CONTENT, response.status_code)
+        response.close()
+
+        self.assertEqual(1, Secret.objects.get(pk=self.secret.pk).number_of_accesses)
+
+    def test_download_raw_file(self):
+        url = self.__download_url()
+        response = self.__download(url, HTTP_ACCEPT='application/octet-stream', HTTP_RANGE='bytes=11-21')
+        self.assertEqual(status.HTTP_206_PARTIAL_CONTENT, response.status_code)
+        self.assertEqual(b'my precious', b''.join(response.streaming_content))
+
+        response = self.__download(url.replace('token=', 'token=x'), HTTP_ACCEPT='application/octet-stream')
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+        response.render()
+        self.assertEqual('application/json', response['Content-Type'])
+
+    def test_download_whole_file_for_unsupported_ranges(self):
+        url = self.__download_url()
+        for extra in [{'HTTP_RANGE': 'bytes=0-10,20-30'}, {'HTTP_RANGE': 'bytes=0-10', 'HTTP_IF_RANGE': '"other"'}]:
+            response = self.__download(url, **extra)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            self.assertEqual(self.content, b''.join(response.streaming_content))
+
+    def test_download_range_not_satisfiable(self):
+        response = self.__download(self.__download_url(), HTTP_RANGE='bytes=110000-')
+        self.assertEqual(status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, response.status_code)
+        self.assertEqual('bytes */110000', response['Content-Range'])
+
+    def test_download_token_invalid(self):
+        url = self.__download_url()
+        response = self.__download(url.replace('token=', 'token=x'))
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+        with override_settings(SECRET_DOWNLOAD_TOKEN_MAX_AGE=-1):
+            self.assertEqual(status.HTTP_403_FORBIDDEN, self.__download(url).status_code)
+
+    def test_download_secret_gone(self):
+        url = self.__download_url()
+        Secret.objects.filter(pk=self.secret.pk).update(created=timezone.now() - timedelta(days=2))
+        self.assertEqual(status.HTTP_404_NOT_FOUND, self.__download(url).status_code)
+
+
+class AccessSecretConcurrencyTest(TransactionTestCase):
+    """Test module for accessing the same secret concurrently.
+    """
+
+    number_of_threads = 8
+    accesses_per_thread = 25
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_no_lost_increments(self):
+        secret = Secret.objects.create(
+            resource=Resource.objects.create(
+                url='https://www.google.com/'
+            )
+        )
+        barrier = threading.Barrier(self.number_of_threads)
+        successes = []
+        errors = []
+
+        def access():
+            barrier.wait()
+            try:
+                for _ in range(self.accesses_per_thread):
+                    request = self.factory.put('N/A', data={'access_code': secret.access_code}, content_type='application/json')
+                    try:
+                        response = AccessSecretView.as_view()(request, **{'access_name': secret.access_name})
+                    except OperationalError:  # e.g. SQLite table lock, the access is not counted then
+                        continue
+                    except Exception as e:
+                        errors.append(e)
+                        continue
+                    if response.status_code == status.HTTP_200_OK:
+                        successes.append(1)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=access) for _ in range(self.number_of_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        secret.refresh_from_db()
+        self.assertEqual([], errors)
+        self.assertTrue(successes)
+        self.assertEqual(len(successes), secret.number_of_accesses)
+        self.assertEqual(1, DailyAccessStats.objects.get().count)
+
+
 class StatisticsViewTest(TestCase):
     """Test module for adding new secret.
     """
@@ -215,8 +543,31 @@ class StatisticsViewTest(TestCase):
             ),
             number_of_accesses=2
         )
+        call_command('rebuild_statistics', stdout=io.StringIO())
         request = self.factory.get('N/A')
         request.user = self.user
         response = StatisticsView.as_view()(request)
         self.assertEqual(status.HTTP_200_OK, response.status_code)
         self.assertIn(str(secret.created.date()), response.data)
+
+    def test_statistics_output_format(self):
+        day = timezone.now() - timedelta(days=3)
+        for created, resource, number_of_accesses in [
+            (day, Resource.objects.create(url='https://www.google.com/'), 1),
+            (day, Resource.objects.create(url='https://www.google.com/'), 3),
+            (day, Resource.objects.create(file='sample.png'), 1),
+            (day, Resource.objects.create(file='sample.png'), 0),
+            (day + timedelta(days=1), Resource.objects.create(file='sample.png'), 2),
+            (day + timedelta(days=2), Resource.objects.create(url='https://www.google.com/'), 0),
+        ]:
+            secret = Secret.objects.create(resource=resource, number_of_accesses=number_of_accesses)
+            Secret.objects.filter(pk=secret.pk).update(created=created)
+        call_command('rebuild_statistics', stdout=io.StringIO())
+        request = self.factory.get('N/A')
+        request.user = self.user
+        response = StatisticsView.as_view()(request)
+        response.render()
+        expected = '{{"{0}":{{"files":1,"links":2}},"{1}":{{"files":1,"links":0}}}}'.format(
+            day.date(), (day + timedelta(days=1)).date()
+        )
+        self.assertEqual(expected.encode(), response.content)
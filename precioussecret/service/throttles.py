@@ -0,0 +1,93 @@
+"""Throttling of access code guessing.
+
+Wrong access codes are counted in ACCESS_THROTTLE_CACHE per access name and per client address, and unknown
+access names per client address. Counts approximate a sliding window of ACCESS_THROTTLE_WINDOW seconds by
+weighting the count of the previous fixed window with the part of it still inside the sliding one. Once a
+limit is reached, accesses are rejected with 429 before the secret is loaded, at the cost of one cache
+round trip. Throttling fails open when the cache is not available. Web client calling the service over HTTP
+authenticates with SECRET_SERVICE_TOKEN and forwards address of its user, see `forwarded_client_ip`.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare
+from django.utils.translation import ugettext as _
+
+from rest_framework.exceptions import Throttled
+from rest_framework.settings import api_settings
+
+from precioussecret.service import metrics
+
+KEY_PREFIX = 'access-throttle'
+
+
+def client_ip(request):
+    """Returns address of the client, taken from X-Forwarded-For only when NUM_PROXIES of REST framework is set.
+    """
+    forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if api_settings.NUM_PROXIES and forwarded_for:
+        addresses = [address.strip() for address in forwarded_for.split(',')]
+        return addresses[-min(api_settings.NUM_PROXIES, len(addresses))]
+    return request.META.get('REMOTE_ADDR')
+
+
+def forwarded_client_ip(request):
+    """Returns address of the user of web client sent in X-Client-IP, see SECRET_SERVICE_TOKEN, or of the client.
+    The header is trusted only from requests authenticated with that token, other users cannot spoof addresses.
+    """
+    forwarded = request.META.get('HTTP_X_CLIENT_IP')
+    token = getattr(request.auth, 'key', None)
+    trusted = token and settings.SECRET_SERVICE_TOKEN and constant_time_compare(token, settings.SECRET_SERVICE_TOKEN)
+    if forwarded and trusted:
+        return forwarded
+    return client_ip(request)
+
+
+class AccessThrottle:
+    """Counters of failed accesses of secret `access_name` and of accesses from `ip`.
+    """
+
+    def __init__(self, access_name, ip=None, now=None):
+        self.cache = caches[settings.ACCESS_THROTTLE_CACHE] if settings.ACCESS_THROTTLE_CACHE else None
+        self.now = time.time() if now is None else now
+        self.window = int(self.now // settings.ACCESS_THROTTLE_WINDOW)
+        self.scopes = {'name': access_name}
+        if ip:
+            self.scopes['ip'] = ip
+
+    def key(self, scope, window):
+        return '{0}:{1}:{2}:{3}'.format(KEY_PREFIX, scope, self.scopes[scope], window)
+
+    def check(self):
+        """Raises Throttled if there were too many failures in either scope.
+        """
+        if self.cache is None:
+            return
+        limits = {'name': settings.ACCESS_THROTTLE_NAME_LIMIT, 'ip': settings.ACCESS_THROTTLE_IP_LIMIT}
+        counts = self.cache.get_many([
+            self.key(scope, window) for scope in self.scopes for window in [self.window - 1, self.window]
+        ])
+        elapsed = self.now / settings.ACCESS_THROTTLE_WINDOW - self.window
+        for scope in self.scopes:
+            previous = counts.get(self.key(scope, self.window - 1), 0)
+            count = previous * (1 - elapsed) + counts.get(self.key(scope, self.window), 0)
+            if count >= limits[scope]:
+                metrics.increment('access_throttle.rejected.{0}'.format(scope))
+                wait = (self.window + 1) * settings.ACCESS_THROTTLE_WINDOW - self.now
+                raise Throttled(wait=wait, detail=_('Too many failed attempts, try again later'))
+
+    def failed(self, scopes=None):
+        """Counts failed access in given scopes, all by default.
+        """
+        if self.cache is None:
+            return
+        for scope in scopes or self.scopes:
+            if scope not in self.scopes:
+                continue
+            key = self.key(scope, self.window)
+            try:
+                self.cache.add(key, 0, timeout=2 * settings.ACCESS_THROTTLE_WINDOW)
+                self.cache.incr(key)
+            except ValueError:  # counter is missing, cache is not available
+                pass
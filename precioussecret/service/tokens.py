@@ -0,0 +1,23 @@
+"""Short-lived tokens letting a client download file of a secret it already accessed.
+"""
+from django.conf import settings
+from django.core.signing import BadSignature
+from django.core.signing import TimestampSigner
+
+signer = TimestampSigner(salt='precioussecret.service.download')
+
+
+def make_download_token(access_name):
+    """Returns signature of the access name and current time, valid for SECRET_DOWNLOAD_TOKEN_MAX_AGE seconds.
+    """
+    return signer.sign(access_name)[len(access_name) + 1:]
+
+
+def check_download_token(access_name, token):
+    """Returns True if `token` was made for the access name and did not expire.
+    """
+    try:
+        signer.unsign('{0}{1}{2}'.format(access_name, signer.sep, token), max_age=settings.SECRET_DOWNLOAD_TOKEN_MAX_AGE)
+    except BadSignature:
+        return False
+    return True
@@ -0,0 +1,102 @@
+"""Resumable uploads of file secrets.
+
+A client creates an upload session with the total size, sends the file in PATCH requests each starting at
+the current offset, asks for the offset after a failure and finalizes the session once all bytes arrived.
+Bytes received before a request broke are kept, so the upload resumes where it stopped. The file is
+validated and becomes a secret only on finalize, which keeps the session until the secret is created, sessions
+left idle are removed by `purge_upload_sessions`.
+"""
+import os
+import uuid
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import File
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.translation import ugettext as _
+
+from rest_framework.exceptions import ValidationError
+
+from precioussecret.service import api
+from precioussecret.service.exceptions import ConflictError
+from precioussecret.service.exceptions import RequestEntityTooLargeError
+from precioussecret.service.models import UploadSession
+
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadSessionFile(File):
+    """Assembled upload, storage moves it instead of copying as it does with temporary uploaded files.
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def create_upload(user, size):
+    """Creates upload session of a file with `size` bytes and its empty file.
+    """
+    session = UploadSession.objects.create(user=user, size=size)
+    os.makedirs(os.path.dirname(session.path), exist_ok=True)
+    open(session.path, 'wb').close()
+    return session
+
+
+def append_chunk(session, offset, stream, length):
+    """Writes `length` bytes read from `stream` at `offset` of the upload and returns the new offset.
+    The offset is claimed and moved with conditional updates, so no row is locked while the body is received.
+    """
+    if offset + length > session.size:
+        raise RequestEntityTooLargeError(_('Chunk exceeds size of the upload'))
+    writer = uuid.uuid4()
+    stale = timezone.now() - timedelta(seconds=settings.UPLOAD_CHUNK_TIMEOUT)
+    sessions = UploadSession.objects.filter(pk=session.pk, offset=offset)
+    if not sessions.filter(Q(writer__isnull=True) | Q(updated__lt=stale)).update(writer=writer, updated=timezone.now()):
+        offset = UploadSession.objects.filter(pk=session.pk).values_list('offset', flat=True).first()
+        raise ConflictError(_('Upload offset is {0}').format(offset))
+
+    written = 0
+    try:
+        with open(session.path, 'r+b') as file:
+            file.seek(offset)
+            while written < length:
+                try:
+                    chunk = stream.read(min(CHUNK_SIZE, length - written))
+                except OSError:  # request broken, keep what was received
+                    break
+                if not chunk:
+                    break
+                file.write(chunk)
+                written += len(chunk)
+            file.flush()
+            os.fsync(file.fileno())
+    except BaseException:  # e.g. disk full, nothing of the chunk counts as stored
+        sessions.filter(writer=writer).update(writer=None)
+        raise
+    if not sessions.filter(writer=writer).update(offset=offset + written, writer=None, updated=timezone.now()):
+        raise ConflictError(_('Chunk timed out'))
+    return offset + written
+
+
+def finalize_upload(session):
+    """Creates and returns 'Secret' from complete upload, the session is removed once the secret is created.
+    """
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        if session.offset != session.size:
+            raise ValidationError(_('Upload is not complete'))
+        with UploadSessionFile(open(session.path, 'rb')) as file:
+            secret = api.add_secret({'resource': {'file': file}})
+        session.delete()
+    remove_upload_file(session.path)
+    return secret
+
+
+def remove_upload_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:  # moved to storage
+        pass
@@ -3,13 +3,27 @@ from rest_framework.authtoken.views import obtain_auth_token
 
 from precioussecret.service.views import AccessSecretView
 from precioussecret.service.views import AddSecretView
+from precioussecret.service.views import BulkAddSecretView
+from precioussecret.service.views import DownloadSecretView
+from precioussecret.service.views import FinalizeUploadView
 from precioussecret.service.views import StatisticsView
+from precioussecret.service.views import UploadSessionCreateView
+from precioussecret.service.views import UploadSessionView
 
 app_name = 'service'
 
 urlpatterns = [
     url(r'^token/', obtain_auth_token),
     url(r'^secret/$', AddSecretView.as_view(), name='add-secret-endpoint'),
+    url(r'^secret/bulk/$', BulkAddSecretView.as_view(), name='bulk-add-secret-endpoint'),
+    url(r'^secret/uploads/$', UploadSessionCreateView.as_view(), name='upload-sessions-endpoint'),
+    url(r'^secret/uploads/(?P<pk>[0-9a-f-]+)/$', UploadSessionView.as_view(), name='upload-session-endpoint'),
+    url(
+        r'^secret/uploads/(?P<pk>[0-9a-f-]+)/finalize/$', FinalizeUploadView.as_view(), name='finalize-upload-endpoint'
+    ),
     url(r'^secret/(?P<access_name>[\w-]+)/$', AccessSecretView.as_view(), name='access-secret-endpoint'),
+    url(
+        r'^secret/(?P<access_name>[\w-]+)/download/$', DownloadSecretView.as_view(), name='download-secret-endpoint'
+    ),
     url(r'^statistics/$', StatisticsView.as_view(), name='statistics-endpoint'),
 ]
@@ -1,54 +1,197 @@
-from collections import defaultdict, Counter
+import io
+
+from urllib.parse import urlencode
+
+from django.urls import reverse
+from django.utils.translation import ugettext as _
 
 from rest_framework.authentication import BasicAuthentication
 from rest_framework.authentication import SessionAuthentication
-from rest_framework.authentication import TokenAuthentication
 from rest_framework import generics, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import AllowAny
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
+from precioussecret.service import api
+from precioussecret.service import uploads
+from precioussecret.service.authentication import CachedTokenAuthentication
+from precioussecret.service.models import DailyAccessStats
+from precioussecret.service.models import Resource
 from precioussecret.service.models import Secret
+from precioussecret.service.models import UploadSession
+from precioussecret.service.parsers import BoundedJSONParser
+from precioussecret.service.parsers import ResourceFileUploadParser
+from precioussecret.service.parsers import ResourceJSONParser
+from precioussecret.service.renderers import ResourceFileRenderer
+from precioussecret.service.responses import resource_file_response
 from precioussecret.service.serializers import AddSecretSerializer
 from precioussecret.service.serializers import AccessSecretSerializer
-from precioussecret.service.serializers import StatisticsSerializer
+from precioussecret.service.serializers import UploadSessionSerializer
+from precioussecret.service.throttles import forwarded_client_ip
+from precioussecret.service.tokens import make_download_token
 
 
 class AddSecretView(generics.CreateAPIView):
     """API endpoint that allows secret to be added.
+    File can be sent as base64 in JSON, as `resource.file` part of multipart form or as raw request body.
     """
-    authentication_classes = [BasicAuthentication, TokenAuthentication, SessionAuthentication]
+    authentication_classes = [BasicAuthentication, CachedTokenAuthentication, SessionAuthentication]
     permission_classes = [IsAuthenticated]
+    parser_classes = [ResourceJSONParser, MultiPartParser, ResourceFileUploadParser]
     serializer_class = AddSecretSerializer
 
+    def create(self, request, *args, **kwargs):
+        secret = api.add_secret(request.data)
+        return Response(self.get_serializer(secret).data, status=status.HTTP_201_CREATED)
+
+
+class BulkAddSecretView(generics.CreateAPIView):
+    """API endpoint that allows many secrets to be added at once.
+    Body is a list of items accepted by add secret endpoint, access data are returned in the same order.
+    """
+    authentication_classes = [BasicAuthentication, CachedTokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+    parser_classes = [BoundedJSONParser]
+    serializer_class = AddSecretSerializer
+
+    def create(self, request, *args, **kwargs):
+        secrets = api.add_secrets(request.data)
+        return Response(self.get_serializer(secrets, many=True).data, status=status.HTTP_201_CREATED)
+
 
 class AccessSecretView(generics.UpdateAPIView):
     """API endpoint that allows secret to be viewed.
+    File secrets are streamed as raw bytes when client accepts `application/octet-stream`.
     """
-    queryset = Secret.objects.all()
+    queryset = Secret.objects.select_related('resource')
     serializer_class = AccessSecretSerializer
     lookup_field = 'access_name'
+    renderer_classes = [JSONRenderer, ResourceFileRenderer]
 
     def patch(self, request, *args, **kwargs):
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
+    def update(self, request, *args, **kwargs):
+        secret = api.access_secret(self.kwargs[self.lookup_field], request.data, client_ip=forwarded_client_ip(request))
+        if secret.resource.file and isinstance(request.accepted_renderer, ResourceFileRenderer):
+            response = resource_file_response(secret, request)
+            response['Content-Location'] = '{0}?{1}'.format(
+                reverse('service:download-secret-endpoint', kwargs={'access_name': secret.access_name}),
+                urlencode({'token': make_download_token(secret.access_name)}),
+            )
+            return response
+        return Response(self.get_serializer(secret).data)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """Renders errors and url secrets as JSON even if raw file was requested.
+        """
+        if isinstance(response, Response) and isinstance(getattr(request, 'accepted_renderer', None), ResourceFileRenderer):
+            request.accepted_renderer, request.accepted_media_type = JSONRenderer(), JSONRenderer.media_type
+        return super(AccessSecretView, self).finalize_response(request, response, *args, **kwargs)
+
+
+class UploadSessionCreateView(generics.CreateAPIView):
+    """API endpoint that allows resumable upload of a file secret to be started.
+    """
+    authentication_classes = [BasicAuthentication, CachedTokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = UploadSessionSerializer
+
+    def perform_create(self, serializer):
+        serializer.instance = uploads.create_upload(self.request.user, serializer.validated_data['size'])
+
+    def get_success_headers(self, data):
+        return {'Location': reverse('service:upload-session-endpoint', kwargs={'pk': data['id']})}
+
+
+class UploadSessionView(generics.RetrieveDestroyAPIView):
+    """API endpoint that allows chunks of resumable upload to be sent and its offset to be checked.
+    PATCH writes raw request body at offset given in `Upload-Offset` header, HEAD returns current offset.
+    """
+    authentication_classes = [BasicAuthentication, CachedTokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = UploadSessionSerializer
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(user=self.request.user)
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super(UploadSessionView, self).retrieve(request, *args, **kwargs)
+        return self.__with_offset(response, response.data['offset'])
+
+    def patch(self, request, *args, **kwargs):
+        session = self.get_object()
+        try:
+            offset = int(request.META['HTTP_UPLOAD_OFFSET'])
+            length = int(request.META['CONTENT_LENGTH'])
+        except (KeyError, ValueError):
+            raise ValidationError(_('Upload-Offset and Content-Length headers are required'))
+        offset = uploads.append_chunk(session, offset, request.stream or io.BytesIO(), length)
+        return self.__with_offset(Response(status=status.HTTP_204_NO_CONTENT), offset)
+
+    def perform_destroy(self, instance):
+        path = instance.path
+        instance.delete()
+        uploads.remove_upload_file(path)
+
+    def __with_offset(self, response, offset):
+        response['Upload-Offset'] = offset
+        response['Cache-Control'] = 'no-store'
+        return response
+
+
+class FinalizeUploadView(generics.GenericAPIView):
+    """API endpoint that allows complete resumable upload to be turned into a secret.
+    """
+    authentication_classes = [BasicAuthentication, CachedTokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = AddSecretSerializer
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(user=self.request.user)
+
+    def post(self, request, *args, **kwargs):
+        secret = uploads.finalize_upload(self.get_object())
+        return Response(self.get_serializer(secret).data, status=status.HTTP_201_CREATED)
+
+
+class DownloadSecretView(generics.GenericAPIView):
+    """API endpoint that allows file of accessed secret to be downloaded, also in byte ranges.
+    Token given on access authorizes the download, so neither authentication nor access code is needed.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    renderer_classes = [JSONRenderer, ResourceFileRenderer]
+
+    def get(self, request, *args, **kwargs):
+        secret = api.download_secret(kwargs['access_name'], request.query_params.get('token', ''))
+        return resource_file_response(secret, request)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """Renders errors as JSON even if raw file was requested.
+        """
+        if isinstance(response, Response) and isinstance(getattr(request, 'accepted_renderer', None), ResourceFileRenderer):
+            request.accepted_renderer, request.accepted_media_type = JSONRenderer(), JSONRenderer.media_type
+        return super(DownloadSecretView, self).finalize_response(request, response, *args, **kwargs)
+
 
 class StatisticsView(generics.GenericAPIView):
     """API endpoint that allows statistics to be viewed.
     """
-    authentication_classes = [BasicAuthentication, TokenAuthentication, SessionAuthentication]
+    authentication_classes = [BasicAuthentication, CachedTokenAuthentication, SessionAuthentication]
     permission_classes = [IsAuthenticated]
-    queryset = Secret.objects.all()
-    serializer_class = StatisticsSerializer
+    queryset = DailyAccessStats.objects.filter(count__gt=0)
 
     def get(self, request, *args, **kwargs):
         """Gets statistics data and returns dict with it
+        Output format: {'2020-04-08': {'files': 1, 'links': 2}, ...}
         """
         queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(queryset, many=True)
-        statistics_data = defaultdict(lambda: Counter({'files': 0, 'links': 0}))
-        for element in serializer.data:
-            if element and element[1] == 'URL':
-                statistics_data[element[0]]['links'] += 1
-            elif element and element[1] == 'FILE':
-                statistics_data[element[0]]['files'] += 1
-        return Response({key: dict(value) for key, value in statistics_data.items()})
+        statistics_data = {}
+        for row in queryset.order_by('date', 'resource_type'):
+            counts = statistics_data.setdefault(str(row.date), {'files': 0, 'links': 0})
+            counts['links' if row.resource_type == Resource.URL else 'files'] += row.count
+        return Response(statistics_data)